@@ -0,0 +1,72 @@
+"""task full-text search
+
+Revision ID: 4e26f648e576
+Revises: f3c158bbb3bc
+Create Date: 2026-10-18 10:41:05.118204
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '4e26f648e576'
+down_revision: Union[str, None] = 'f3c158bbb3bc'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.drop_index('ix_tasks_description', table_name='tasks')
+
+    dialect = op.get_bind().dialect.name
+    if dialect == 'postgresql':
+        op.execute(
+            """ALTER TABLE tasks ADD COLUMN search_vector tsvector GENERATED ALWAYS AS (
+                to_tsvector('simple', coalesce(title, '') || ' ' || coalesce(description, ''))
+            ) STORED"""
+        )
+        op.execute('CREATE INDEX ix_tasks_search_vector ON tasks USING gin (search_vector)')
+    elif dialect == 'sqlite':
+        op.execute(
+            """CREATE VIRTUAL TABLE tasks_fts USING fts5(
+                title, description, content='tasks', content_rowid='id'
+            )"""
+        )
+        op.execute(
+            """CREATE TRIGGER tasks_fts_ai AFTER INSERT ON tasks BEGIN
+                INSERT INTO tasks_fts(rowid, title, description)
+                VALUES (new.id, new.title, new.description);
+            END"""
+        )
+        op.execute(
+            """CREATE TRIGGER tasks_fts_ad AFTER DELETE ON tasks BEGIN
+                INSERT INTO tasks_fts(tasks_fts, rowid, title, description)
+                VALUES ('delete', old.id, old.title, old.description);
+            END"""
+        )
+        op.execute(
+            """CREATE TRIGGER tasks_fts_au AFTER UPDATE ON tasks BEGIN
+                INSERT INTO tasks_fts(tasks_fts, rowid, title, description)
+                VALUES ('delete', old.id, old.title, old.description);
+                INSERT INTO tasks_fts(rowid, title, description)
+                VALUES (new.id, new.title, new.description);
+            END"""
+        )
+        op.execute("INSERT INTO tasks_fts(tasks_fts) VALUES ('rebuild')")
+
+
+def downgrade() -> None:
+    dialect = op.get_bind().dialect.name
+    if dialect == 'postgresql':
+        op.drop_index('ix_tasks_search_vector', table_name='tasks')
+        op.drop_column('tasks', 'search_vector')
+    elif dialect == 'sqlite':
+        op.execute('DROP TRIGGER tasks_fts_au')
+        op.execute('DROP TRIGGER tasks_fts_ad')
+        op.execute('DROP TRIGGER tasks_fts_ai')
+        op.execute('DROP TABLE tasks_fts')
+
+    op.create_index(op.f('ix_tasks_description'), 'tasks', ['description'], unique=False)
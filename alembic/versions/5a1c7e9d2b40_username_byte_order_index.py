@@ -0,0 +1,29 @@
+"""username byte-order index
+
+Revision ID: 5a1c7e9d2b40
+Revises: b57efadc7d9b
+Create Date: 2026-10-18 12:30:41.207316
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '5a1c7e9d2b40'
+down_revision: Union[str, None] = 'b57efadc7d9b'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # SQLite compares bytes by default and needs nothing.
+    if op.get_bind().dialect.name == 'postgresql':
+        op.execute('CREATE INDEX ix_users_username_c ON users (username COLLATE "C")')
+
+
+def downgrade() -> None:
+    if op.get_bind().dialect.name == 'postgresql':
+        op.execute('DROP INDEX ix_users_username_c')
@@ -0,0 +1,100 @@
+"""cascading deletes and operations
+
+Revision ID: b57efadc7d9b
+Revises: c41ceee3d5bd
+Create Date: 2026-10-18 10:55:17.384940
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b57efadc7d9b'
+down_revision: Union[str, None] = 'c41ceee3d5bd'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+# Foreign keys created by earlier revisions are unnamed: PostgreSQL named
+# them "<table>_<column>_fkey", while SQLite reflects them without a name,
+# which batch mode can only address through a naming convention.
+NAMING_CONVENTION = {"fk": "fk_%(table_name)s_%(column_0_name)s_%(referred_table_name)s"}
+
+FOREIGN_KEYS = [
+    ('tasks', 'owner_id', 'users'),
+    ('taskpermissions', 'task_id', 'tasks'),
+    ('taskpermissions', 'user_id', 'users'),
+    ('refreshtokens', 'user_id', 'users'),
+]
+
+# Recreating "tasks" in SQLite batch mode drops its triggers.
+SQLITE_SEARCH_TRIGGERS = [
+    """CREATE TRIGGER tasks_fts_ai AFTER INSERT ON tasks BEGIN
+        INSERT INTO tasks_fts(rowid, title, description)
+        VALUES (new.id, new.title, new.description);
+    END""",
+    """CREATE TRIGGER tasks_fts_ad AFTER DELETE ON tasks BEGIN
+        INSERT INTO tasks_fts(tasks_fts, rowid, title, description)
+        VALUES ('delete', old.id, old.title, old.description);
+    END""",
+    """CREATE TRIGGER tasks_fts_au AFTER UPDATE ON tasks BEGIN
+        INSERT INTO tasks_fts(tasks_fts, rowid, title, description)
+        VALUES ('delete', old.id, old.title, old.description);
+        INSERT INTO tasks_fts(rowid, title, description)
+        VALUES (new.id, new.title, new.description);
+    END""",
+]
+
+
+def _foreign_key_name(inspector, table: str, column: str, referred: str) -> str:
+    for fk in inspector.get_foreign_keys(table):
+        if fk['constrained_columns'] == [column]:
+            return fk['name'] or f'fk_{table}_{column}_{referred}'
+    raise LookupError(f'No foreign key on {table}.{column}')
+
+
+def _replace_foreign_keys(ondelete) -> None:
+    bind = op.get_bind()
+    dialect = bind.dialect.name
+    inspector = sa.inspect(bind)
+    names = {
+        (table, column): _foreign_key_name(inspector, table, column, referred)
+        for table, column, referred in FOREIGN_KEYS
+    }
+    for table, column, referred in FOREIGN_KEYS:
+        with op.batch_alter_table(table, naming_convention=NAMING_CONVENTION) as batch_op:
+            batch_op.drop_constraint(names[table, column], type_='foreignkey')
+            batch_op.create_foreign_key(
+                f'{table}_{column}_fkey', referred, [column], ['id'], ondelete=ondelete
+            )
+    if dialect == 'sqlite':
+        op.execute('DROP TRIGGER IF EXISTS tasks_fts_ai')
+        op.execute('DROP TRIGGER IF EXISTS tasks_fts_ad')
+        op.execute('DROP TRIGGER IF EXISTS tasks_fts_au')
+        for trigger in SQLITE_SEARCH_TRIGGERS:
+            op.execute(trigger)
+
+
+def upgrade() -> None:
+    op.create_table('operations',
+    sa.Column('user_id', sa.Integer(), nullable=False),
+    sa.Column('kind', sa.String(), nullable=False),
+    sa.Column('status', sa.String(), server_default='pending', nullable=False),
+    sa.Column('total', sa.Integer(), server_default='0', nullable=False),
+    sa.Column('done', sa.Integer(), server_default='0', nullable=False),
+    sa.Column('up_to_id', sa.Integer(), nullable=True),
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.ForeignKeyConstraint(['user_id'], ['users.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_operations_user_id'), 'operations', ['user_id'], unique=False)
+    _replace_foreign_keys('CASCADE')
+
+
+def downgrade() -> None:
+    _replace_foreign_keys(None)
+    op.drop_index(op.f('ix_operations_user_id'), table_name='operations')
+    op.drop_table('operations')
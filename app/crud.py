@@ -1,15 +1,57 @@
-from sqlalchemy import Result
+import secrets
+from collections import defaultdict
+from datetime import datetime, timedelta, timezone
+from uuid import uuid4
+
+from sqlalchemy import (
+    Result,
+    Select,
+    and_,
+    case,
+    column,
+    delete,
+    event,
+    exists,
+    func,
+    insert,
+    literal_column,
+    or_,
+    table,
+    text,
+    union,
+    union_all,
+    update,
+)
+from sqlalchemy.dialects import postgresql, sqlite
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.future import select
-from .models import User, Task, TaskPermission
+from sqlalchemy.orm import Session
+from .models import (
+    TASK_SEARCH_CONFIG,
+    Operation,
+    RefreshToken,
+    User,
+    Task,
+    TaskChange,
+    TaskPermission,
+)
 from .schemas import (
+    TaskBulkResult,
+    TaskBulkUpdateItem,
+    TaskChanges,
     TaskPermissionUpdate,
     TaskUpdate,
     UserCreate,
     TaskCreate,
     TaskPermissionCreate,
 )
-from app.utils.security import get_password_hash
+from app.jobs import job_handler
+from app.resources import Resources, get_resources
+from app.utils.security import (
+    hash_refresh_token,
+    invalidate_principal,
+    live_session_cutoff,
+)
 from fastapi import HTTPException
 
 
@@ -17,74 +59,634 @@ async def get_user_by_username(session: AsyncSession, username: str):
     result = await session.execute(select(User).filter(User.username == username))
     return result.scalars().first()
 
-async def get_users(session: AsyncSession):
-    result = await session.execute(select(User))
-    return result.scalars().all()
+def _prefix_upper_bound(prefix: str) -> str | None:
+    """Smallest string above every string that starts with ``prefix``, in
+    code point order (which is also UTF-8 byte order); None if there is none."""
+    while prefix:
+        code = ord(prefix[-1]) + 1
+        if code == 0xD800:
+            # Surrogates cannot be stored.
+            code = 0xE000
+        if code <= 0x10FFFF:
+            return prefix[:-1] + chr(code)
+        prefix = prefix[:-1]
+    return None
+
+
+async def get_users(
+    session: AsyncSession,
+    limit: int = 100,
+    after: str | None = None,
+    prefix: str | None = None,
+):
+    """A page of (id, username) rows in username byte order.
+
+    Both the cursor and the prefix are ranges on a username index, so a
+    page costs O(limit) however many users exist; password hashes are
+    never loaded.
+    """
+    username = User.username
+    if session.bind.dialect.name == "postgresql":
+        # A linguistic collation does not keep the strings that share a
+        # prefix together, so the range would be wrong; compare bytes, as
+        # SQLite does, on ix_users_username_c.
+        username = username.collate("C")
+    stmt = select(User.id, User.username).order_by(username).limit(limit)
+    if after is not None:
+        stmt = stmt.filter(username > after)
+    if prefix:
+        # In byte order exactly the names with the prefix fall in the range.
+        stmt = stmt.filter(username >= prefix)
+        upper = _prefix_upper_bound(prefix)
+        if upper is not None:
+            stmt = stmt.filter(username < upper)
+    result = await session.execute(stmt)
+    return result.all()
 
 async def create_user(session: AsyncSession, user_data: UserCreate):
-    hashed_password = get_password_hash(user_data.password)
+    hashed_password = await get_resources().password_hasher.hash(user_data.password)
     new_user = User(username=user_data.username, hashed_password=hashed_password)
     session.add(new_user)
     await session.commit()
     await session.refresh(new_user)
+    invalidate_principal(new_user.username)
     return new_user
 
 
+async def update_user_password_hash(
+    session: AsyncSession, user: User, hashed_password: str
+):
+    user.hashed_password = hashed_password
+    session.add(user)
+    await session.commit()
+    invalidate_principal(user.username)
+    return user
+
+
+async def create_refresh_token(
+    session: AsyncSession,
+    user_id: int,
+    expires_delta: timedelta,
+    family_id: str | None = None,
+) -> tuple[str, str]:
+    """Starts (or continues) a login session; returns the raw token, which
+    is never stored, and its family id."""
+    token = secrets.token_urlsafe(32)
+    family_id = family_id or uuid4().hex
+    session.add(
+        RefreshToken(
+            user_id=user_id,
+            family_id=family_id,
+            token_hash=hash_refresh_token(token),
+            expires_at=datetime.now(timezone.utc) + expires_delta,
+        )
+    )
+    await session.commit()
+    return token, family_id
+
+
+async def rotate_refresh_token(
+    session: AsyncSession, token: str, expires_delta: timedelta
+) -> tuple[User, str, str]:
+    """Swaps a refresh token for a new one in the same family.
+
+    A single conditional UPDATE both checks and consumes the token, so two
+    concurrent refreshes with the same token cannot both succeed.
+    """
+    token_hash = hash_refresh_token(token)
+    result = await session.execute(
+        update(RefreshToken)
+        .where(
+            RefreshToken.token_hash == token_hash,
+            RefreshToken.revoked == False,
+            RefreshToken.expires_at > datetime.now(timezone.utc),
+        )
+        .values(revoked=True)
+        .returning(RefreshToken.user_id, RefreshToken.family_id)
+    )
+    row = result.first()
+    if row is None:
+        reused_family = await session.scalar(
+            select(RefreshToken.family_id).where(
+                RefreshToken.token_hash == token_hash, RefreshToken.revoked == True
+            )
+        )
+        if reused_family is not None:
+            # Rotated tokens are never presented by their legitimate owner.
+            await revoke_refresh_family(session, reused_family)
+        else:
+            await session.rollback()
+        raise HTTPException(status_code=401, detail="Invalid refresh token")
+
+    user = await session.get(User, row.user_id)
+    new_token, family_id = await create_refresh_token(
+        session, row.user_id, expires_delta, family_id=row.family_id
+    )
+    return user, new_token, family_id
+
+
+async def revoke_refresh_family(session: AsyncSession, family_id: str):
+    """Revokes a login session: its refresh tokens here, its access tokens
+    on every worker once the revocation commits."""
+    resources = get_resources()
+    await session.execute(
+        update(RefreshToken)
+        .where(RefreshToken.family_id == family_id)
+        .values(revoked=True)
+    )
+    resources.event_bus.stage_revocation(session, [family_id])
+    await session.commit()
+    # Through postgres the broadcast reaches this worker only after a round trip.
+    resources.revoke_sessions([family_id])
+
+
+async def reload_revoked_sessions(resources: Resources) -> None:
+    """Lists again the revoked sessions that may still have valid access
+    tokens: at startup, and after the event bus reconnects, since
+    revocations broadcast while it was down never arrived.
+
+    Refresh rotation revokes every token but the newest, so a session is
+    revoked when none of its tokens is left unrevoked.
+    """
+    cutoff = live_session_cutoff(resources.settings, datetime.now(timezone.utc))
+    async with resources.session_factory() as session:
+        family_ids = await session.scalars(
+            select(RefreshToken.family_id)
+            .where(RefreshToken.expires_at >= cutoff)
+            .group_by(RefreshToken.family_id)
+            .having(func.sum(case((RefreshToken.revoked == False, 1), else_=0)) == 0)
+        )
+        resources.revoke_sessions(family_ids.all())
+
+
+async def revoke_refresh_token(session: AsyncSession, token: str) -> bool:
+    family_id = await session.scalar(
+        select(RefreshToken.family_id).where(
+            RefreshToken.token_hash == hash_refresh_token(token)
+        )
+    )
+    if family_id is None:
+        return False
+    await revoke_refresh_family(session, family_id)
+    return True
+
+
+async def get_task_audience(
+    session: AsyncSession,
+    task_ids: list[int],
+) -> dict[int, set[int]]:
+    """Maps each task id to the users who can read it (owner included)."""
+    result = await session.execute(
+        union_all(
+            select(Task.id, Task.owner_id).filter(Task.id.in_(task_ids)),
+            select(TaskPermission.task_id, TaskPermission.user_id).filter(
+                TaskPermission.task_id.in_(task_ids),
+                TaskPermission.can_read == True,
+            ),
+        )
+    )
+    audience = defaultdict(set)
+    for task_id, user_id in result:
+        audience[task_id].add(user_id)
+    return audience
+
+
+def task_key(task_id: int) -> str:
+    return f"task:{task_id}"
+
+
+def acl_key(task_id: int) -> str:
+    return f"acl:{task_id}"
+
+
+_STAGED_CHANGES = "task_changes"
+# Taken by every transaction that appends to the change log (any constant);
+# a global lock, see _commit for what it costs.
+CHANGE_LOG_LOCK = 7_341_127
+
+
+def _stage_changes(session: AsyncSession, rows: list[dict]) -> None:
+    session.info.setdefault(_STAGED_CHANGES, []).extend(rows)
+
+
+@event.listens_for(Session, "after_soft_rollback")
+def _discard_staged_changes(session: Session, previous_transaction) -> None:
+    session.info.pop(_STAGED_CHANGES, None)
+
+
+async def _commit(session: AsyncSession):
+    """Writes the staged change-feed entries and commits, then drops the
+    cache entries the transaction made stale. Use instead of
+    session.commit() after any task or ACL change.
+
+    The feed cursor is the entry id, so entries must commit in id order or
+    a reader could move past an id that is still in flight. The entries are
+    therefore the last write of the transaction, made under a lock held
+    until the commit; SQLite already serializes writers.
+
+    Trade-off: on PostgreSQL that lock is global, so every task or ACL
+    write serializes on the log INSERT plus its COMMIT (one round trip and
+    one WAL flush). Writes that log nothing, and everything before the
+    INSERT, still run concurrently, but write throughput is capped at
+    roughly one logging commit per flush latency. Dropping the lock means
+    ordering the feed by (writer xid, id) and serving only entries below
+    pg_snapshot_xmin(), i.e. a cursor format change; not worth it at the
+    write rates this service sees.
+    """
+    changes = session.info.pop(_STAGED_CHANGES, None)
+    if changes:
+        if session.bind.dialect.name == "postgresql":
+            await session.execute(select(func.pg_advisory_xact_lock(CHANGE_LOG_LOCK)))
+        await session.execute(insert(TaskChange), changes)
+    await session.commit()
+    await get_resources().response_cache.flush(session)
+
+
+async def log_task_changes(session: AsyncSession, task_ids, op: str):
+    """Stages change-feed entries and push events in the caller's
+    transaction; ``_commit`` writes them."""
+    task_ids = list(task_ids)
+    if not task_ids:
+        return
+    resources = get_resources()
+    _stage_changes(session, [{"task_id": task_id, "op": op} for task_id in task_ids])
+    resources.response_cache.stage(session, [task_key(task_id) for task_id in task_ids])
+    resources.job_queue.enqueue(session, "audit", {"op": op, "task_ids": task_ids})
+    if resources.event_bus.enabled:
+        audience = await get_task_audience(session, task_ids)
+        for task_id in task_ids:
+            resources.event_bus.stage(
+                session, {"op": op, "task_id": task_id}, audience[task_id]
+            )
+
+
+async def log_acl_changes(session: AsyncSession, task_id: int, user_ids):
+    """Like log_task_changes for permission changes of ``user_ids``."""
+    user_ids = list(user_ids)
+    if not user_ids:
+        return
+    resources = get_resources()
+    _stage_changes(
+        session,
+        [{"task_id": task_id, "op": "acl", "user_id": user_id} for user_id in user_ids],
+    )
+    resources.response_cache.stage(session, [acl_key(task_id)])
+    resources.job_queue.enqueue(
+        session, "audit", {"op": "acl", "task_id": task_id, "user_ids": user_ids}
+    )
+    if resources.event_bus.enabled:
+        audience = await get_task_audience(session, [task_id])
+        resources.event_bus.stage(
+            session, {"op": "acl", "task_id": task_id}, audience[task_id] | set(user_ids)
+        )
+
+
+async def log_task_deletions(session: AsyncSession, task_ids: Select):
+    """Addresses a tombstone to everyone who can still read the tasks.
+
+    Must run before the tasks and their permissions are deleted.
+    """
+    result = await session.execute(
+        union_all(
+            select(Task.id, Task.owner_id).filter(Task.id.in_(task_ids)),
+            select(TaskPermission.task_id, TaskPermission.user_id).filter(
+                TaskPermission.task_id.in_(task_ids),
+                TaskPermission.can_read == True,
+            ),
+        )
+    )
+    deleted = defaultdict(set)
+    tombstones = []
+    for task_id, user_id in result:
+        deleted[task_id].add(user_id)
+        tombstones.append({"task_id": task_id, "op": "delete", "user_id": user_id})
+    resources = get_resources()
+    _stage_changes(session, tombstones)
+    resources.response_cache.stage(
+        session,
+        [key for task_id in deleted for key in (task_key(task_id), acl_key(task_id))],
+    )
+    if deleted:
+        resources.job_queue.enqueue(
+            session, "audit", {"op": "delete", "task_ids": sorted(deleted)}
+        )
+    if resources.event_bus.enabled:
+        for task_id, users in deleted.items():
+            resources.event_bus.stage(session, {"op": "delete", "task_id": task_id}, users)
+
+
 async def create_task(session: AsyncSession, task: TaskCreate, user_id: int):
     new_task = Task(**task.model_dump(), owner_id=user_id)
     session.add(new_task)
-    await session.commit()
+    await session.flush()
+    await log_task_changes(session, [new_task.id], "create")
+    await _commit(session)
     await session.refresh(new_task)
     return new_task
 
 
-async def get_tasks(session: AsyncSession, user_id: int):
-    stmt = (
-        select(Task)
-        .filter(
-            or_(
-                Task.owner_id == user_id,
-                Task.id.in_(
-                    select(TaskPermission.task_id)
-                    .filter(
-                        TaskPermission.user_id == user_id,
-                        TaskPermission.can_read == True
-                    )
-                )
-            )
-        )
-        .order_by(Task.id)
+def visible_task_ids(user_id: int, after: int | None = None, limit: int | None = None):
+    """Ids of the tasks ``user_id`` owns or may read, as a subquery.
+
+    Each branch walks its own index in id order (ix_tasks_owner_id_id and
+    ix_taskpermissions_user_visible) and stops after ``limit`` rows, so a
+    page costs O(limit) however many tasks or permissions exist.
+    """
+    owned = select(Task.id.label("id")).filter(Task.owner_id == user_id)
+    shared = select(TaskPermission.task_id.label("id")).filter(
+        TaskPermission.user_id == user_id,
+        TaskPermission.can_read == True
     )
+    if after is not None:
+        owned = owned.filter(Task.id > after)
+        shared = shared.filter(TaskPermission.task_id > after)
+    if limit is not None:
+        owned = owned.order_by(Task.id).limit(limit)
+        shared = shared.order_by(TaskPermission.task_id).limit(limit)
+    # Wrapped in subqueries: SQLite rejects ORDER BY/LIMIT inside a UNION branch.
+    owned = owned.subquery()
+    shared = shared.subquery()
+    return union(select(owned.c.id), select(shared.c.id)).subquery()
+
+
+TASK_ROW_COLUMNS = (Task.id, Task.title, Task.description, Task.owner_id, Task.version)
+
+
+def visible_tasks_query(
+    user_id: int,
+    after: int | None = None,
+    limit: int | None = None,
+    columns=(Task,),
+) -> Select:
+    ids = visible_task_ids(user_id, after=after, limit=limit)
+    stmt = select(*columns).join(ids, Task.id == ids.c.id).order_by(Task.id)
+    if limit is not None:
+        stmt = stmt.limit(limit)
+    return stmt
+
+
+async def get_tasks(
+    session: AsyncSession,
+    user_id: int,
+    limit: int | None = None,
+    after: int | None = None,
+):
+    stmt = visible_tasks_query(user_id, after=after, limit=limit)
     result: Result = await session.execute(stmt)
     return result.scalars().all()
 
 
+async def get_task_rows(
+    session: AsyncSession,
+    user_id: int,
+    limit: int | None = None,
+    after: int | None = None,
+):
+    """Like get_tasks, but returns plain column rows instead of ORM objects,
+    which skips identity-map bookkeeping for large pages."""
+    stmt = visible_tasks_query(
+        user_id, after=after, limit=limit, columns=TASK_ROW_COLUMNS
+    )
+    result: Result = await session.execute(stmt)
+    return result.all()
+
+
+async def stream_tasks(session: AsyncSession, user_id: int, after: int | None = None):
+    # Server-side cursor: rows are fetched from the database in chunks while
+    # the caller consumes them, so memory does not grow with the result size.
+    stmt = visible_tasks_query(
+        user_id, after=after, columns=TASK_ROW_COLUMNS
+    ).execution_options(yield_per=500)
+    async with session.bind.connect() as conn:
+        result = await conn.stream(stmt)
+        async for row in result:
+            yield row
+
+
+def _fts5_query(query: str) -> str:
+    # Every word becomes a quoted phrase, so user input can't use FTS5 syntax.
+    return " ".join('"' + word.replace('"', '""') + '"' for word in query.split())
+
+
+async def search_tasks(
+    session: AsyncSession,
+    user_id: int,
+    query: str,
+    limit: int = 20,
+) -> list[Task]:
+    """Ranked keyword search over the tasks ``user_id`` can see."""
+    if not query.split():
+        return []
+    ids = visible_task_ids(user_id)
+    stmt = select(Task).join(ids, Task.id == ids.c.id)
+    if session.bind.dialect.name == "postgresql":
+        search_vector = literal_column("tasks.search_vector")
+        ts_query = func.websearch_to_tsquery(TASK_SEARCH_CONFIG, query)
+        stmt = stmt.filter(search_vector.op("@@")(ts_query)).order_by(
+            func.ts_rank_cd(search_vector, ts_query).desc(), Task.id
+        )
+    else:
+        tasks_fts = table("tasks_fts", column("rowid"))
+        stmt = (
+            stmt.join(tasks_fts, tasks_fts.c.rowid == Task.id)
+            .filter(text("tasks_fts MATCH :query").bindparams(query=_fts5_query(query)))
+            .order_by(func.bm25(literal_column("tasks_fts")), Task.id)
+        )
+    result = await session.execute(stmt.limit(limit))
+    return result.scalars().all()
+
+
 async def get_task(session: AsyncSession, task_id: int):
     result = await session.execute(select(Task).filter(Task.id == task_id))
     return result.scalars().first()
 
 
+TASK_CACHE_COLUMNS = ("id", "title", "description", "owner_id", "version")
+ACL_CACHE_COLUMNS = ("id", "task_id", "user_id", "can_read", "can_update", "version")
+
+
+def _task_row(row) -> dict:
+    return {name: getattr(row, name) for name in TASK_CACHE_COLUMNS}
+
+
+async def _load_task_row(session: AsyncSession, task_id: int) -> dict | None:
+    result = await session.execute(
+        select(*(getattr(Task, name) for name in TASK_CACHE_COLUMNS)).filter(
+            Task.id == task_id
+        )
+    )
+    row = result.first()
+    return _task_row(row) if row is not None else None
+
+
+async def _load_acl_rows(session: AsyncSession, task_id: int) -> list[dict]:
+    result = await session.execute(
+        select(*(getattr(TaskPermission, name) for name in ACL_CACHE_COLUMNS))
+        .filter(TaskPermission.task_id == task_id)
+        .order_by(TaskPermission.id)
+    )
+    return [row._asdict() for row in result]
+
+
+async def _load_task_and_acl(
+    session: AsyncSession,
+    task_id: int,
+) -> tuple[dict | None, list[dict]]:
+    """Task row and its ACL in one round trip: the task outer-joined with
+    every permission on it."""
+    result = await session.execute(
+        select(
+            *(getattr(Task, name) for name in TASK_CACHE_COLUMNS),
+            *(
+                getattr(TaskPermission, name).label(f"acl_{name}")
+                for name in ACL_CACHE_COLUMNS
+            ),
+        )
+        .outerjoin(TaskPermission, TaskPermission.task_id == Task.id)
+        .filter(Task.id == task_id)
+        .order_by(TaskPermission.id)
+    )
+    rows = result.all()
+    if not rows:
+        return None, []
+    acl = [
+        {name: getattr(row, f"acl_{name}") for name in ACL_CACHE_COLUMNS}
+        for row in rows
+        if row.acl_id is not None
+    ]
+    return _task_row(rows[0]), acl
+
+
+async def _get_cached(session: AsyncSession, task_id: int, keys: list[str]) -> dict:
+    """Task row and/or ACL of a task as plain dicts, from the response cache
+    when possible. A miss costs one query whichever keys are missing."""
+    resources = get_resources()
+    response_cache = resources.response_cache
+    values = await response_cache.get_many(keys)
+    missing = [key for key in keys if key not in values]
+    if not missing:
+        return values
+    # A replica may lag the invalidation; only the primary fills the cache.
+    fill = session.bind is not resources.replica_engine
+    generations = await response_cache.reserve(missing) if fill else {}
+    if len(missing) == 2:
+        values[task_key(task_id)], values[acl_key(task_id)] = await _load_task_and_acl(
+            session, task_id
+        )
+    elif missing[0] == task_key(task_id):
+        values[missing[0]] = await _load_task_row(session, task_id)
+    else:
+        values[missing[0]] = await _load_acl_rows(session, task_id)
+    await response_cache.set_many({key: values[key] for key in missing}, generations)
+    return values
+
+
+async def _load_task_access(
+    session: AsyncSession,
+    task_id: int,
+    user_id: int,
+) -> tuple[Task | None, bool, bool]:
+    """Like get_task_access, but always read from the database in one query:
+    the task outer-joined with the caller's permission row."""
+    result = await session.execute(
+        select(Task, TaskPermission.can_read, TaskPermission.can_update)
+        .outerjoin(
+            TaskPermission,
+            and_(
+                TaskPermission.task_id == Task.id,
+                TaskPermission.user_id == user_id,
+            ),
+        )
+        .filter(Task.id == task_id)
+    )
+    row = result.first()
+    if row is None:
+        return None, False, False
+    task, can_read, can_update = row
+    if task.owner_id == user_id:
+        return task, True, True
+    return task, bool(can_read), bool(can_update)
+
+
+async def get_task_access(
+    session: AsyncSession,
+    task_id: int,
+    user_id: int,
+) -> tuple[Task | None, bool, bool]:
+    """Loads a task together with the caller's rights, both served from the
+    response cache when possible.
+
+    Returns (task, can_read, can_update); the owner has every right. The
+    task is a detached instance, fine for reading only.
+    """
+    values = await _get_cached(session, task_id, [task_key(task_id), acl_key(task_id)])
+    row = values[task_key(task_id)]
+    if row is None:
+        return None, False, False
+    task = Task(**row)
+    if task.owner_id == user_id:
+        return task, True, True
+    for permission in values[acl_key(task_id)]:
+        if permission["user_id"] == user_id:
+            return task, permission["can_read"], permission["can_update"]
+    return task, False, False
+
+
+def can_update_task(user_id: int):
+    return or_(
+        Task.owner_id == user_id,
+        exists().where(
+            TaskPermission.task_id == Task.id,
+            TaskPermission.user_id == user_id,
+            TaskPermission.can_update == True,
+        ),
+    )
+
+
+def task_update_values(task: TaskCreate | TaskUpdate, partial: bool = False) -> dict:
+    if not partial:
+        return {"title": task.title, "description": task.description}
+    return task.model_dump(include={"title", "description"}, exclude_none=True)
+
+
 async def check_permissions_and_update_task(
     session: AsyncSession,
     task_id: int,
     task_data: TaskCreate | TaskUpdate,
     current_user: User,
     is_partial_update: bool = False,
+    expected_version: int | None = None,
 ):
-    db_task = await session.get(Task, task_id)
-    if not db_task:
-        raise HTTPException(status_code=404, detail="Task not found")
-
-    if db_task.owner_id != current_user.id:
-        permission = await get_user_task_permissions(
-            session=session, task_id=task_id, user_id=current_user.id
+    """Updates the task if the caller may; with ``expected_version`` the
+    update only applies to that version of the task (optimistic locking)."""
+    values = task_update_values(task_data, partial=is_partial_update)
+    if values:
+        # The permission and version checks are part of the UPDATE itself,
+        # so the happy path is a single round trip.
+        stmt = update(Task).where(Task.id == task_id, can_update_task(current_user.id))
+        if expected_version is not None:
+            stmt = stmt.where(Task.version == expected_version)
+        result = await session.execute(
+            stmt.values(**values, version=Task.version + 1)
+            .returning(Task)
+            .execution_options(populate_existing=True)
         )
-        if not permission or not permission.can_update:
-            raise HTTPException(status_code=403, detail="Not enough permissions")
+        db_task = result.scalars().first()
+        if db_task is not None:
+            await log_task_changes(session, [db_task.id], "update")
+            await _commit(session)
+            return db_task
+        await session.rollback()
 
-    return await update_task(
-        session=session, task_id=task_id, task=task_data, partial=is_partial_update
-    )
+    # The UPDATE saw the committed rights; a cached ACL may be older.
+    db_task, _, can_update = await _load_task_access(session, task_id, current_user.id)
+    if not db_task:
+        raise HTTPException(status_code=404, detail="Task not found")
+    if not can_update:
+        raise HTTPException(status_code=403, detail="Not enough permissions")
+    if expected_version is not None and db_task.version != expected_version:
+        raise HTTPException(status_code=412, detail="Task has been modified")
+    return db_task
 
 
 async def update_task(
@@ -93,19 +695,23 @@ async def update_task(
     task: TaskCreate | TaskUpdate,
     partial: bool = False,
 ):
-    task_db = await session.get(Task, task_id)
+    values = task_update_values(task, partial=partial)
+    if not values:
+        task_db = await get_task(session, task_id)
+    else:
+        result = await session.execute(
+            update(Task)
+            .where(Task.id == task_id)
+            .values(**values, version=Task.version + 1)
+            .returning(Task)
+            .execution_options(populate_existing=True)
+        )
+        task_db = result.scalars().first()
+        if task_db:
+            await log_task_changes(session, [task_db.id], "update")
     if not task_db:
         raise HTTPException(status_code=404, detail="Task not found")
-    if not partial:
-        task_db.title = task.title
-        task_db.description = task.description
-    else:
-        if task.title is not None:
-            task_db.title = task.title
-        if task.description is not None:
-            task_db.description = task.description
-    await session.commit()
-    await session.refresh(task_db)
+    await _commit(session)
     return task_db
 
 
@@ -113,18 +719,261 @@ async def delete_task(
     session: AsyncSession,
     task_id: int,
 ):
-    db_task = await session.get(Task, task_id)
-    if db_task:
-        await session.delete(db_task)
-        await session.commit()
+    # Permissions go with the task through ON DELETE CASCADE.
+    await log_task_deletions(session, select(Task.id).filter(Task.id == task_id))
+    await session.execute(delete(Task).where(Task.id == task_id))
+    await _commit(session)
     return None
 
 
+async def delete_owned_task(
+    session: AsyncSession,
+    task_id: int,
+    user_id: int,
+) -> bool:
+    """Deletes the task if ``user_id`` owns it; returns whether it did."""
+    owned = select(Task.id).where(Task.id == task_id, Task.owner_id == user_id)
+    await log_task_deletions(session, owned)
+    result = await session.execute(
+        delete(Task)
+        .where(Task.id == task_id, Task.owner_id == user_id)
+        .returning(Task.id)
+    )
+    deleted = result.first() is not None
+    await _commit(session)
+    return deleted
+
+
+async def create_tasks(
+    session: AsyncSession,
+    tasks: list[TaskCreate],
+    user_id: int,
+) -> list[Task]:
+    result = await session.scalars(
+        insert(Task).returning(Task, sort_by_parameter_order=True),
+        [{**task.model_dump(), "owner_id": user_id} for task in tasks],
+    )
+    new_tasks = result.all()
+    await log_task_changes(session, [task.id for task in new_tasks], "create")
+    await _commit(session)
+    return new_tasks
+
+
+async def get_tasks_access(
+    session: AsyncSession,
+    task_ids: list[int],
+    user_id: int,
+) -> dict[int, tuple[int, bool]]:
+    """Maps each existing task id to (owner_id, can_update) for ``user_id``."""
+    result = await session.execute(
+        select(Task.id, Task.owner_id, TaskPermission.can_update)
+        .outerjoin(
+            TaskPermission,
+            and_(
+                TaskPermission.task_id == Task.id,
+                TaskPermission.user_id == user_id,
+            ),
+        )
+        .filter(Task.id.in_(task_ids))
+    )
+    return {
+        task_id: (owner_id, owner_id == user_id or bool(can_update))
+        for task_id, owner_id, can_update in result
+    }
+
+
+async def update_tasks(
+    session: AsyncSession,
+    items: list[TaskBulkUpdateItem],
+    user_id: int,
+) -> list[TaskBulkResult]:
+    # Later items for the same task win, column by column.
+    changes: dict[int, dict] = {}
+    for item in items:
+        values = task_update_values(item, partial=True)
+        if values:
+            changes.setdefault(item.id, {}).update(values)
+
+    tasks = {}
+    if changes:
+        # One UPDATE with a CASE per column. The permission check is part of
+        # its WHERE clause, like in check_permissions_and_update_task, so a
+        # right revoked concurrently is never bypassed.
+        columns = {name for values in changes.values() for name in values}
+        assignments = {
+            name: case(
+                {
+                    task_id: values[name]
+                    for task_id, values in changes.items()
+                    if name in values
+                },
+                value=Task.id,
+                else_=getattr(Task, name),
+            )
+            for name in columns
+        }
+        result = await session.execute(
+            update(Task)
+            .where(Task.id.in_(changes), can_update_task(user_id))
+            .values(**assignments, version=Task.version + 1)
+            .returning(Task)
+            .execution_options(populate_existing=True, synchronize_session=False)
+        )
+        tasks = {task.id: task for task in result.scalars()}
+        await log_task_changes(session, list(tasks), "update")
+
+    # Only what the UPDATE did not return needs telling apart.
+    rest = list({item.id: None for item in items if item.id not in tasks})
+    access = await get_tasks_access(session, rest, user_id) if rest else {}
+    unchanged = [
+        task_id
+        for task_id, (_, can_update) in access.items()
+        if can_update and task_id not in changes
+    ]
+    if unchanged:
+        result = await session.execute(select(Task).filter(Task.id.in_(unchanged)))
+        tasks.update((task.id, task) for task in result.scalars())
+    await _commit(session)
+
+    results = []
+    for item in items:
+        if item.id in tasks:
+            results.append(TaskBulkResult(id=item.id, status=200, task=tasks[item.id]))
+        elif item.id not in access:
+            results.append(TaskBulkResult(id=item.id, status=404, detail="Task not found"))
+        else:
+            results.append(
+                TaskBulkResult(id=item.id, status=403, detail="Not enough permissions")
+            )
+    return results
+
+
+async def delete_tasks(
+    session: AsyncSession,
+    task_ids: list[int],
+    user_id: int,
+) -> list[TaskBulkResult]:
+    access = await get_tasks_access(session, task_ids, user_id)
+    owned = [task_id for task_id, (owner_id, _) in access.items() if owner_id == user_id]
+    if owned:
+        await log_task_deletions(session, select(Task.id).filter(Task.id.in_(owned)))
+        await session.execute(delete(Task).where(Task.id.in_(owned)))
+    await _commit(session)
+
+    results = []
+    for task_id in task_ids:
+        if task_id not in access:
+            results.append(TaskBulkResult(id=task_id, status=404, detail="Task not found"))
+        elif access[task_id][0] != user_id:
+            results.append(
+                TaskBulkResult(id=task_id, status=403, detail="Not enough permissions")
+            )
+        else:
+            results.append(TaskBulkResult(id=task_id, status=204))
+    return results
+
+
+TASK_DELETE_CHUNK_SIZE = 1000
+
+
+async def start_task_deletion(session: AsyncSession, user_id: int) -> Operation:
+    """Schedules the deletion of every task ``user_id`` owns now; tasks
+    created afterwards are kept. Runs as the "delete_tasks" job."""
+    result = await session.execute(
+        select(func.count(Task.id), func.max(Task.id)).filter(Task.owner_id == user_id)
+    )
+    total, up_to_id = result.one()
+    operation = Operation(
+        user_id=user_id, kind="delete_tasks", total=total, done=0, up_to_id=up_to_id
+    )
+    if not total:
+        operation.status = "done"
+    session.add(operation)
+    await session.flush()
+    if total:
+        get_resources().job_queue.enqueue(
+            session, "delete_tasks", {"operation_id": operation.id}
+        )
+    await _commit(session)
+    return operation
+
+
+async def get_operation(session: AsyncSession, operation_id: int, user_id: int) -> Operation:
+    operation = await session.get(Operation, operation_id)
+    if operation is None or operation.user_id != user_id:
+        raise HTTPException(status_code=404, detail="Operation not found")
+    return operation
+
+
+async def delete_tasks_chunk(
+    session: AsyncSession, user_id: int, up_to_id: int, limit: int
+) -> int:
+    """Deletes up to ``limit`` of the user's tasks with id <= ``up_to_id``
+    in the session's transaction; returns how many were deleted."""
+    ids = (
+        await session.scalars(
+            select(Task.id)
+            .filter(Task.owner_id == user_id, Task.id <= up_to_id)
+            .order_by(Task.id)
+            .limit(limit)
+        )
+    ).all()
+    if not ids:
+        return 0
+    await log_task_deletions(session, select(Task.id).filter(Task.id.in_(ids)))
+    result = await session.execute(
+        delete(Task).where(Task.id.in_(ids)).returning(Task.id)
+    )
+    # Counted from RETURNING: a concurrent run cannot delete a row twice.
+    return len(result.all())
+
+
+@job_handler("delete_tasks")
+async def run_task_deletion(payload: dict, session: AsyncSession) -> None:
+    """One transaction per chunk, so locks stay short and progress is
+    visible; safe to resume after a crash."""
+    operation = await session.get(Operation, payload["operation_id"])
+    if operation is None or operation.status == "done":
+        return
+    user_id, up_to_id = operation.user_id, operation.up_to_id
+    await session.execute(
+        update(Operation).where(Operation.id == operation.id).values(status="running")
+    )
+    await session.commit()
+    while True:
+        # Each chunk extends the job's lease in its own transaction, so a
+        # long deletion is never claimed and run twice.
+        await get_resources().job_queue.renew(session)
+        deleted = await delete_tasks_chunk(session, user_id, up_to_id, TASK_DELETE_CHUNK_SIZE)
+        values = {"done": Operation.done + deleted}
+        if deleted < TASK_DELETE_CHUNK_SIZE:
+            values["status"] = "done"
+        await session.execute(
+            update(Operation).where(Operation.id == payload["operation_id"]).values(**values)
+        )
+        await _commit(session)
+        if deleted < TASK_DELETE_CHUNK_SIZE:
+            return
+
+
+async def check_users_exist(session: AsyncSession, user_ids) -> None:
+    """Raises 404 naming the ``user_ids`` that match no user, with one
+    query; call before granting permissions to them."""
+    user_ids = set(user_ids)
+    if not user_ids:
+        return
+    found = await session.scalars(select(User.id).filter(User.id.in_(user_ids)))
+    unknown = sorted(user_ids - set(found.all()))
+    if unknown:
+        raise HTTPException(status_code=404, detail=f"Users not found: {unknown}")
+
+
 async def create_task_permission(
     session: AsyncSession,
     permission: TaskPermissionCreate,
     task_id: int,
 ):
+    await check_users_exist(session, [permission.user_id])
     existing_permission = await session.execute(
         select(TaskPermission)
         .where(TaskPermission.task_id == task_id)
@@ -137,7 +986,8 @@ async def create_task_permission(
         )
     db_permission = TaskPermission(**permission.model_dump(), task_id=task_id)
     session.add(db_permission)
-    await session.commit()
+    await log_acl_changes(session, task_id, [permission.user_id])
+    await _commit(session)
     await session.refresh(db_permission)
     return db_permission
 
@@ -146,11 +996,9 @@ async def get_task_permissions(
     session: AsyncSession,
     task_id: int,
 ) -> list[TaskPermission]:
-    result = await session.execute(
-        select(TaskPermission).filter(TaskPermission.task_id == task_id)
-    )
-    permissions = result.scalars().all()
-    
+    values = await _get_cached(session, task_id, [acl_key(task_id)])
+    permissions = [TaskPermission(**row) for row in values[acl_key(task_id)]]
+
     if not permissions:
         raise HTTPException(status_code=404, detail="No permissions found for this task.")
     
@@ -183,8 +1031,10 @@ async def update_task_permission(
         db_permission.can_read = permission_update.can_read
     if permission_update.can_update is not None:
         db_permission.can_update = permission_update.can_update
+    db_permission.version = TaskPermission.version + 1
     session.add(db_permission)
-    await session.commit()
+    await log_acl_changes(session, task_id, [user_id])
+    await _commit(session)
     await session.refresh(db_permission)
     return db_permission
 
@@ -202,5 +1052,128 @@ async def delete_task_permission(
     db_permission = result.scalars().first()
     if db_permission:
         await session.delete(db_permission)
-        await session.commit()
+        await log_acl_changes(session, task_id, [user_id])
+        await _commit(session)
     return None
+
+
+def _upsert(session: AsyncSession, model):
+    if session.bind.dialect.name == "postgresql":
+        return postgresql.insert(model)
+    return sqlite.insert(model)
+
+
+async def upsert_task_permissions(
+    session: AsyncSession,
+    task_id: int,
+    grants: list[TaskPermissionCreate],
+    revoke: list[int] | None = None,
+    replace: bool = False,
+) -> list[TaskPermission]:
+    """Grants/updates many permissions with one INSERT ... ON CONFLICT and
+    removes others with one DELETE, in a single transaction.
+
+    With ``replace`` every permission not listed in ``grants`` is revoked.
+    """
+    # ON CONFLICT cannot touch the same row twice: the last grant wins.
+    rows = {
+        grant.user_id: {**grant.model_dump(), "task_id": task_id} for grant in grants
+    }
+    await check_users_exist(session, rows)
+    permissions = []
+    if rows:
+        stmt = _upsert(session, TaskPermission).values(list(rows.values()))
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[TaskPermission.task_id, TaskPermission.user_id],
+            set_={
+                "can_read": stmt.excluded.can_read,
+                "can_update": stmt.excluded.can_update,
+                "version": TaskPermission.version + 1,
+            },
+        ).returning(TaskPermission)
+        result = await session.execute(
+            stmt, execution_options={"populate_existing": True}
+        )
+        permissions = sorted(result.scalars().all(), key=lambda p: p.user_id)
+
+    revoke_stmt = None
+    if replace:
+        revoke_stmt = delete(TaskPermission).where(
+            TaskPermission.task_id == task_id,
+            TaskPermission.user_id.not_in(list(rows)),
+        )
+    elif revoke:
+        revoke_stmt = delete(TaskPermission).where(
+            TaskPermission.task_id == task_id,
+            TaskPermission.user_id.in_(set(revoke) - set(rows)),
+        )
+    changed_users = list(rows)
+    if revoke_stmt is not None:
+        result = await session.execute(revoke_stmt.returning(TaskPermission.user_id))
+        changed_users.extend(result.scalars().all())
+    await log_acl_changes(session, task_id, changed_users)
+    await _commit(session)
+    return permissions
+
+
+async def get_task_changes(
+    session: AsyncSession,
+    user_id: int,
+    since: int,
+    limit: int = 500,
+) -> TaskChanges:
+    """Tasks touched after the ``since`` cursor, as seen by ``user_id`` now.
+
+    A touched task the user can still read is returned in full; one that was
+    deleted or whose read access was revoked comes back as a tombstone.
+    """
+    visible = visible_task_ids(user_id)
+    result = await session.execute(
+        select(TaskChange.id, TaskChange.task_id)
+        .filter(
+            TaskChange.id > since,
+            or_(
+                TaskChange.user_id == user_id,
+                and_(
+                    TaskChange.user_id.is_(None),
+                    TaskChange.task_id.in_(select(visible.c.id)),
+                ),
+            ),
+        )
+        .order_by(TaskChange.id)
+        .limit(limit)
+    )
+    changes = result.all()
+    if not changes:
+        return TaskChanges(upserts=[], deleted=[], cursor=since, has_more=False)
+
+    touched = list({task_id: None for _, task_id in changes})
+    result = await session.execute(
+        select(Task)
+        .join(visible, Task.id == visible.c.id)
+        .filter(Task.id.in_(touched))
+        .order_by(Task.id)
+    )
+    upserts = result.scalars().all()
+    readable = {task.id for task in upserts}
+    return TaskChanges(
+        upserts=upserts,
+        deleted=[task_id for task_id in touched if task_id not in readable],
+        cursor=changes[-1].id,
+        has_more=len(changes) == limit,
+    )
+
+
+async def get_latest_change_cursor(session: AsyncSession) -> int:
+    result = await session.execute(select(func.max(TaskChange.id)))
+    return result.scalar() or 0
+
+
+async def warm_up(session: AsyncSession) -> None:
+    """Runs the statements behind the hottest endpoints once, with ids that
+    match nothing, so they are compiled and prepared before real traffic."""
+    await get_user_by_username(session, "")
+    await get_task_rows(session, user_id=0, limit=1)
+    await get_task_rows(session, user_id=0, limit=1, after=0)
+    await _load_task_row(session, 0)
+    await _load_acl_rows(session, 0)
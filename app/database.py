@@ -1,25 +1,226 @@
-from sqlalchemy.ext.asyncio import create_async_engine, AsyncEngine, async_sessionmaker
+from sqlalchemy import event, exc, text
+from sqlalchemy.engine import Engine, make_url
+from sqlalchemy.ext.asyncio import create_async_engine, AsyncEngine, AsyncSession, async_sessionmaker
+from sqlalchemy.pool import AsyncAdaptedQueuePool
 
 from sqlalchemy.orm import DeclarativeBase, Mapped, mapped_column, declared_attr
 
-from dotenv import load_dotenv
-import os
+from app.instrumentation import record_pool_wait
+from app.resources import get_resources
+from app.settings import Settings
+from functools import cache
+from pathlib import Path
+from typing import Awaitable, Callable
+from uuid import uuid4
+import ast
+import time
 
-load_dotenv()
+ALEMBIC_DIR = Path(__file__).resolve().parent.parent / "alembic"
 
-SQLALCHEMY_DATABASE_URL = os.getenv("DATABASE_URL")
 
-engine: AsyncEngine = create_async_engine(SQLALCHEMY_DATABASE_URL, echo=False)
-SessionLocal = async_sessionmaker(
-    bind=engine,
-    autoflush=False,
-    autocommit=False,
-    expire_on_commit=False,
-)
+@event.listens_for(Engine, "connect")
+def _enable_sqlite_foreign_keys(dbapi_connection, connection_record):
+    # SQLite ignores foreign keys, and so ON DELETE CASCADE, unless asked.
+    # Covers both the sqlite3 and the aiosqlite adapter connections.
+    if "sqlite" in type(dbapi_connection).__module__:
+        cursor = dbapi_connection.cursor()
+        cursor.execute("PRAGMA foreign_keys=ON")
+        cursor.close()
+
+
+class InstrumentedQueuePool(AsyncAdaptedQueuePool):
+    """Queue pool that records how long checkouts wait for a connection."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.waits = 0
+        self.wait_time_total = 0.0
+        self.wait_time_max = 0.0
+        self.timeouts = 0
+
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            return super()._do_get()
+        except exc.TimeoutError:
+            self.timeouts += 1
+            raise
+        finally:
+            elapsed = time.perf_counter() - start
+            self.waits += 1
+            self.wait_time_total += elapsed
+            self.wait_time_max = max(self.wait_time_max, elapsed)
+            record_pool_wait(elapsed)
+
+
+def create_engine(
+    url: str,
+    pool_size: int = Settings.db_pool_size,
+    max_overflow: int = Settings.db_max_overflow,
+    pool_timeout: float = Settings.db_pool_timeout,
+    pool_recycle: int = Settings.db_pool_recycle,
+    pool_pre_ping: bool = Settings.db_pool_pre_ping,
+    statement_cache_size: int = Settings.db_statement_cache_size,
+    pgbouncer: bool = Settings.db_pgbouncer,
+    echo: bool = Settings.db_echo,
+    slow_query_ms: float = Settings.slow_query_ms,
+) -> AsyncEngine:
+    url = make_url(url)
+    kwargs = {
+        "echo": echo,
+        "pool_pre_ping": pool_pre_ping,
+        # Read by the slow-query log in app.instrumentation; 0 turns it off.
+        "execution_options": {"slow_query_ms": slow_query_ms},
+    }
+    if url.get_backend_name() != "sqlite" or url.database not in (None, "", ":memory:"):
+        kwargs.update(
+            poolclass=InstrumentedQueuePool,
+            pool_size=pool_size,
+            max_overflow=max_overflow,
+            pool_timeout=pool_timeout,
+            pool_recycle=pool_recycle,
+        )
+    if url.get_driver_name() == "asyncpg":
+        if pgbouncer:
+            statement_cache_size = 0
+            kwargs["connect_args"] = {
+                # Unique names so a statement never collides with one left
+                # on the server connection by another client.
+                "prepared_statement_name_func": lambda: f"__asyncpg_{uuid4()}__",
+            }
+        kwargs.setdefault("connect_args", {})["statement_cache_size"] = statement_cache_size
+        url = url.update_query_dict(
+            {"prepared_statement_cache_size": str(statement_cache_size)}
+        )
+    return create_async_engine(url, **kwargs)
+
+
+def get_pool_stats(engine: AsyncEngine) -> dict:
+    pool = engine.pool
+    stats = {"pool": type(pool).__name__, "status": pool.status()}
+    if isinstance(pool, AsyncAdaptedQueuePool):
+        stats.update(
+            size=pool.size(),
+            checked_in=pool.checkedin(),
+            checked_out=pool.checkedout(),
+            overflow=pool.overflow(),
+        )
+    if isinstance(pool, InstrumentedQueuePool):
+        stats.update(
+            waits=pool.waits,
+            wait_time_total=pool.wait_time_total,
+            wait_time_max=pool.wait_time_max,
+            timeouts=pool.timeouts,
+        )
+    return stats
+
+
+def _sessionmaker(bind: AsyncEngine) -> async_sessionmaker:
+    return async_sessionmaker(
+        bind=bind,
+        autoflush=False,
+        autocommit=False,
+        expire_on_commit=False,
+    )
+
+
+# The engines and session factories of the current app's resources, under
+# their old module-level names for scripts such as benchmarks/loadtest.py.
+_RESOURCE_ATTRIBUTES = {
+    "engine": "engine",
+    "SessionLocal": "session_factory",
+    "replica_engine": "replica_engine",
+    "ReadSessionLocal": "read_session_factory",
+}
+
+
+def __getattr__(name: str):
+    if name not in _RESOURCE_ATTRIBUTES:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    return getattr(get_resources(), _RESOURCE_ATTRIBUTES[name])
+
+
+def get_sessionmaker() -> async_sessionmaker:
+    return get_resources().session_factory
+
+
+def _revision_ids(path: Path) -> tuple[str, tuple[str, ...]]:
+    """``revision`` and ``down_revision`` of a migration script, read from
+    its source without importing it."""
+    values = {}
+    for node in ast.parse(path.read_text()).body:
+        if isinstance(node, ast.AnnAssign):
+            target, value = node.target, node.value
+        elif isinstance(node, ast.Assign) and len(node.targets) == 1:
+            target, value = node.targets[0], node.value
+        else:
+            continue
+        if isinstance(target, ast.Name) and target.id in ("revision", "down_revision"):
+            values[target.id] = ast.literal_eval(value)
+    down = values.get("down_revision") or ()
+    return values["revision"], (down,) if isinstance(down, str) else tuple(down)
+
+
+@cache
+def expected_schema_heads() -> frozenset[str]:
+    """Migration heads shipped with this code. Found by reading the scripts
+    rather than through alembic, whose import alone costs more than the
+    whole check."""
+    parents = dict(_revision_ids(path) for path in (ALEMBIC_DIR / "versions").glob("*.py"))
+    referenced = {parent for ids in parents.values() for parent in ids}
+    return frozenset(parents.keys() - referenced)
+
+
+async def get_schema_heads(engine: AsyncEngine) -> frozenset[str]:
+    """Revisions recorded in the database's alembic_version table."""
+    async with engine.connect() as conn:
+        try:
+            result = await conn.execute(text("SELECT version_num FROM alembic_version"))
+        except exc.DBAPIError:
+            # Never migrated: the table does not exist.
+            return frozenset()
+        return frozenset(result.scalars())
+
+
+async def check_schema_version(engine: AsyncEngine) -> None:
+    """Fails fast when the schema is not at the expected migration head.
+
+    A single-row read, unlike ``create_all``, which inspects every table and
+    lets concurrently starting workers race on DDL. Migrations are applied
+    once per release with ``alembic upgrade head``.
+    """
+    current, expected = await get_schema_heads(engine), expected_schema_heads()
+    if current != expected:
+        raise RuntimeError(
+            f"Database schema is at {sorted(current) or 'no revision'}, "
+            f"expected {sorted(expected)}; run `alembic upgrade head`"
+        )
+
+
+async def warm_up(
+    engine: AsyncEngine,
+    run: Callable[[AsyncSession], Awaitable[None]],
+    connections: int | None = None,
+) -> None:
+    """Opens ``connections`` connections (the pool size by default) and calls
+    ``run`` with a session on each, so that the first requests find them
+    established, their statements compiled and, with asyncpg, prepared."""
+    if connections is None:
+        pool = engine.pool
+        connections = pool.size() if isinstance(pool, AsyncAdaptedQueuePool) else 1
+    # Held all at once, otherwise the pool would hand out the same one again.
+    opened = [await engine.connect() for _ in range(connections)]
+    try:
+        for conn in opened:
+            async with AsyncSession(bind=conn) as session:
+                await run(session)
+    finally:
+        for conn in opened:
+            await conn.close()
 
 
 async def get_db():
-    async with SessionLocal() as session:
+    async with get_sessionmaker()() as session:
         yield session
 
 
@@ -1,33 +1,86 @@
-from fastapi import Depends, HTTPException, status
+from fastapi import Depends, HTTPException, Request, status
 from fastapi.security import OAuth2PasswordBearer
 from sqlalchemy.ext.asyncio import AsyncSession
 import jwt
 from .crud import get_user_by_username
 from .database import get_db
-from dotenv import load_dotenv
-import os
-
-load_dotenv() 
+from .models import User
+from .resources import get_resources
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="token")
 
-SECRET_KEY =  os.getenv("SECRET_KEY")
-ALGORITHM =  os.getenv("ALGORITHM")
+SAFE_METHODS = {"GET", "HEAD", "OPTIONS"}
+
+
+def _principal(user_id: int, username: str) -> User:
+    # A fresh, session-less instance: safe to hand out to any request.
+    return User(id=user_id, username=username)
+
 
-async def get_current_user(token: str = Depends(oauth2_scheme), session: AsyncSession = Depends(get_db)):
+async def get_current_user(request: Request, token: str = Depends(oauth2_scheme), session: AsyncSession = Depends(get_db)):
+    user = await authenticate_token(token, session)
+    if request.method not in SAFE_METHODS:
+        # Kept per worker: reads go to the primary for a while after a write.
+        get_resources().recent_writers.set(user.id, True)
+    return user
+
+
+async def authenticate_token(token: str, session: AsyncSession) -> User:
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
         headers={"WWW-Authenticate": "Bearer"},
     )
+    resources = get_resources()
     try:
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+        payload = resources.token_service.verify(token)
         username: str = payload.get("sub")
         if username is None:
             raise credentials_exception
+        sid = payload.get("sid")
+        if sid is not None and sid in resources.revoked_sessions:
+            raise credentials_exception
     except jwt.InvalidTokenError:
         raise credentials_exception
+
+    user_id = payload.get("uid")
+    # When enabled, a token carrying a "uid" claim is trusted as is and no
+    # user lookup is made. Deleted users keep access until their token expires.
+    if resources.settings.token_trust_user_id and isinstance(user_id, int):
+        return _principal(user_id, username)
+
+    principal_cache = resources.principal_cache
+    user_id = principal_cache.get(username)
+    if user_id is not None:
+        return _principal(user_id, username)
+
     user = await get_user_by_username(session, username)
     if user is None:
         raise credentials_exception
-    return user
+    principal_cache.set(username, user.id)
+    return _principal(user.id, username)
+
+
+async def get_read_db(session: AsyncSession = Depends(get_db)):
+    """Session for safe reads: a replica when one is configured."""
+    read_session_factory = get_resources().read_session_factory
+    if read_session_factory is None:
+        yield session
+        return
+    async with read_session_factory() as read_session:
+        yield read_session
+
+
+async def get_user_read_db(
+    current_user: User = Depends(get_current_user),
+    session: AsyncSession = Depends(get_db),
+):
+    """Like get_read_db, but stays on the primary right after the same
+    user wrote something (read-your-writes)."""
+    resources = get_resources()
+    read_session_factory = resources.read_session_factory
+    if read_session_factory is None or current_user.id in resources.recent_writers:
+        yield session
+        return
+    async with read_session_factory() as read_session:
+        yield read_session
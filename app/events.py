@@ -0,0 +1,250 @@
+import asyncio
+import json
+import logging
+from collections import defaultdict
+
+from sqlalchemy import ARRAY, String, bindparam, event, func, select
+from sqlalchemy.engine import URL
+from sqlalchemy.orm import Session
+
+logger = logging.getLogger(__name__)
+
+EVENTS_CHANNEL = "task_events"
+
+_PENDING = "task_events"
+# The bus the pending messages were staged on.
+_BUS = "event_bus"
+# NOTIFY payloads are limited to 8000 bytes; keep audiences well below it.
+_USERS_PER_MESSAGE = 500
+_KEYS_PER_MESSAGE = 200
+# Backoff between attempts to re-open a lost LISTEN connection.
+_RECONNECT_DELAY = 0.5
+_RECONNECT_MAX_DELAY = 30.0
+
+
+class Subscription:
+    """One push connection. Events are buffered in a bounded queue; if the
+    client falls behind, further events are dropped and ``overflowed`` is
+    set so the connection can tell the client to resync."""
+
+    def __init__(self, user_id: int, maxsize: int):
+        self.user_id = user_id
+        self.queue: asyncio.Queue[dict] = asyncio.Queue(maxsize)
+        self.overflowed = False
+
+    def put(self, message: dict) -> None:
+        try:
+            self.queue.put_nowait(message)
+        except asyncio.QueueFull:
+            self.overflowed = True
+
+    async def get(self, timeout: float) -> dict | None:
+        try:
+            return await asyncio.wait_for(self.queue.get(), timeout)
+        except asyncio.TimeoutError:
+            return None
+
+
+class EventBus:
+    """In-process fan-out of task events to the connections of their
+    audience. With the ``postgres`` backend events travel through
+    LISTEN/NOTIFY so every worker delivers to its own connections;
+    ``none`` turns push off entirely.
+
+    The postgres backend also carries cache invalidations between workers,
+    see ``stage_invalidation`` and ``on_invalidate``, and every backend
+    carries session revocations, see ``stage_revocation``. A lost LISTEN
+    connection is re-opened with backoff; what was sent meanwhile is gone,
+    so subscribers are told to resync and ``on_reconnect`` handlers run."""
+
+    def __init__(self, backend: str = "local", queue_size: int = 100):
+        if backend not in ("local", "postgres", "none"):
+            raise ValueError(f"Unknown events backend: {backend}")
+        self.backend = backend
+        self.queue_size = queue_size
+        self._subscribers: dict[int, set[Subscription]] = defaultdict(set)
+        self._listener = None
+        self._dsn = None
+        self._reconnecting: asyncio.Task | None = None
+        self._invalidation_handlers = []
+        self._revocation_handlers = []
+        self._reconnect_handlers = []
+        self._invalidations: set[asyncio.Task] = set()
+
+    def subscribe(self, user_id: int) -> Subscription:
+        subscription = Subscription(user_id, self.queue_size)
+        self._subscribers[user_id].add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription) -> None:
+        subscriptions = self._subscribers.get(subscription.user_id)
+        if subscriptions is not None:
+            subscriptions.discard(subscription)
+            if not subscriptions:
+                del self._subscribers[subscription.user_id]
+
+    @property
+    def enabled(self) -> bool:
+        return self.backend != "none"
+
+    @property
+    def connections(self) -> int:
+        return sum(len(subscriptions) for subscriptions in self._subscribers.values())
+
+    def on_invalidate(self, handler) -> None:
+        """Registers ``async handler(keys)``, called with the cache keys
+        every worker's transactions invalidate."""
+        self._invalidation_handlers.append(handler)
+
+    def on_revoke(self, handler) -> None:
+        """Registers ``handler(family_ids)``, called with the login sessions
+        any worker revoked."""
+        self._revocation_handlers.append(handler)
+
+    def on_reconnect(self, handler) -> None:
+        """Registers ``async handler()``, called once the LISTEN connection
+        is back after a loss; messages sent while it was down never
+        arrive."""
+        self._reconnect_handlers.append(handler)
+
+    def deliver(self, message: dict) -> None:
+        if "invalidate" in message:
+            for handler in self._invalidation_handlers:
+                task = asyncio.ensure_future(handler(message["invalidate"]))
+                self._invalidations.add(task)
+                task.add_done_callback(self._invalidations.discard)
+            return
+        if "revoke" in message:
+            for handler in self._revocation_handlers:
+                handler(message["revoke"])
+            return
+        event = message["event"]
+        for user_id in message["users"]:
+            for subscription in self._subscribers.get(user_id, ()):
+                subscription.put(event)
+
+    def _pending(self, session) -> list[dict]:
+        session.info[_BUS] = self
+        return session.info.setdefault(_PENDING, [])
+
+    def stage(self, session, event: dict, users) -> None:
+        """Queues an event on the session; it is sent only if and when the
+        session's transaction commits."""
+        users = sorted(users)
+        pending = self._pending(session)
+        for start in range(0, len(users), _USERS_PER_MESSAGE):
+            pending.append(
+                {"event": event, "users": users[start:start + _USERS_PER_MESSAGE]}
+            )
+
+    def stage_invalidation(self, session, keys) -> None:
+        """Queues cache keys for every worker to drop once the session's
+        transaction commits. Only the postgres backend reaches other
+        workers, so the others have nothing to do."""
+        if self.backend != "postgres":
+            return
+        keys = sorted(keys)
+        pending = self._pending(session)
+        for start in range(0, len(keys), _KEYS_PER_MESSAGE):
+            pending.append({"invalidate": keys[start:start + _KEYS_PER_MESSAGE]})
+
+    def stage_revocation(self, session, family_ids) -> None:
+        """Queues revoked login sessions for every worker to reject once the
+        session's transaction commits. Unlike events this is not optional:
+        the "local" and "none" backends still deliver to this worker."""
+        family_ids = sorted(family_ids)
+        pending = self._pending(session)
+        for start in range(0, len(family_ids), _KEYS_PER_MESSAGE):
+            pending.append({"revoke": family_ids[start:start + _KEYS_PER_MESSAGE]})
+
+    async def start(self, url: URL) -> None:
+        if self.backend != "postgres":
+            return
+        # A dedicated connection outside the pool: it sits in LISTEN forever.
+        self._dsn = url.set(drivername="postgresql", query={}).render_as_string(
+            hide_password=False
+        )
+        await self._listen()
+
+    async def stop(self) -> None:
+        self._dsn = None
+        if self._reconnecting is not None:
+            self._reconnecting.cancel()
+            self._reconnecting = None
+        listener, self._listener = self._listener, None
+        if listener is not None:
+            await listener.close()
+
+    async def _listen(self) -> None:
+        import asyncpg
+
+        listener = await asyncpg.connect(self._dsn)
+        listener.add_termination_listener(self._on_terminated)
+        await listener.add_listener(EVENTS_CHANNEL, self._on_notify)
+        self._listener = listener
+
+    def _on_terminated(self, connection) -> None:
+        # Also called by stop()'s close, after it cleared _listener.
+        if connection is not self._listener or self._dsn is None:
+            return
+        logger.warning("Lost the %s LISTEN connection, reconnecting", EVENTS_CHANNEL)
+        self._listener = None
+        self._reconnecting = asyncio.ensure_future(self._reconnect())
+
+    async def _reconnect(self) -> None:
+        delay = _RECONNECT_DELAY
+        while True:
+            try:
+                await self._listen()
+                break
+            except Exception:
+                logger.warning("Reconnecting LISTEN failed, retrying in %.1fs", delay, exc_info=True)
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, _RECONNECT_MAX_DELAY)
+        self._reconnecting = None
+        logger.info("LISTEN connection restored")
+        for subscriptions in self._subscribers.values():
+            for subscription in subscriptions:
+                subscription.overflowed = True
+        for handler in self._reconnect_handlers:
+            try:
+                await handler()
+            except Exception:
+                logger.exception("Reconnect handler %r failed", handler)
+
+    def _on_notify(self, connection, pid, channel, payload) -> None:
+        try:
+            self.deliver(json.loads(payload))
+        except (ValueError, KeyError):
+            logger.warning("Ignoring malformed task event: %r", payload)
+
+
+@event.listens_for(Session, "before_commit")
+def _notify_task_events(session: Session) -> None:
+    # NOTIFY is transactional: sent in the same transaction as the change,
+    # delivered by PostgreSQL on commit, discarded on rollback.
+    bus = session.info.get(_BUS)
+    if bus is None or bus.backend != "postgres" or not session.info.get(_PENDING):
+        return
+    payloads = [json.dumps(message) for message in session.info.pop(_PENDING)]
+    session.execute(
+        select(
+            func.pg_notify(
+                EVENTS_CHANNEL,
+                func.unnest(bindparam("payloads", payloads, type_=ARRAY(String))),
+            )
+        )
+    )
+
+
+@event.listens_for(Session, "after_commit")
+def _deliver_task_events(session: Session) -> None:
+    bus = session.info.pop(_BUS, None)
+    for message in session.info.pop(_PENDING, ()):
+        bus.deliver(message)
+
+
+@event.listens_for(Session, "after_soft_rollback")
+def _discard_task_events(session: Session, previous_transaction) -> None:
+    session.info.pop(_BUS, None)
+    session.info.pop(_PENDING, None)
@@ -0,0 +1,210 @@
+import logging
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+logger = logging.getLogger(__name__)
+slow_query_logger = logging.getLogger("app.sql.slow")
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100)
+
+
+@dataclass
+class RequestStats:
+    queries: int = 0
+    db_time: float = 0.0
+    pool_wait: float = 0.0
+
+
+_request_stats: ContextVar[RequestStats | None] = ContextVar("request_stats", default=None)
+# Counters opened by count_queries(); nested blocks all see the same queries.
+_query_counters: ContextVar[tuple[RequestStats, ...]] = ContextVar("query_counters", default=())
+
+
+def _active_stats() -> list[RequestStats]:
+    stats = list(_query_counters.get())
+    current = _request_stats.get()
+    if current is not None:
+        stats.append(current)
+    return stats
+
+
+def record_pool_wait(seconds: float) -> None:
+    for stats in _active_stats():
+        stats.pool_wait += seconds
+
+
+@event.listens_for(Engine, "before_cursor_execute")
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("query_start", []).append(time.perf_counter())
+
+
+@event.listens_for(Engine, "after_cursor_execute")
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    elapsed = time.perf_counter() - conn.info["query_start"].pop()
+    for stats in _active_stats():
+        stats.queries += 1
+        stats.db_time += elapsed
+    # Queries slower than the "slow_query_ms" execution option are logged;
+    # database.create_engine sets it on the engine.
+    slow_query_ms = context.execution_options.get("slow_query_ms") if context else None
+    if slow_query_ms and elapsed * 1000 >= slow_query_ms:
+        slow_query_logger.warning(
+            "Slow query (%.1f ms): %s [parameters: %s]",
+            elapsed * 1000,
+            " ".join(statement.split()),
+            redact_parameters(parameters, executemany),
+        )
+
+
+def redact_parameters(parameters, executemany: bool = False) -> str:
+    """Shape of the bound parameters without their values, which may hold
+    passwords, tokens or personal data."""
+    if executemany:
+        return f"<{len(parameters)} rows redacted>"
+    if isinstance(parameters, dict):
+        return "{" + ", ".join(f"{key}=?" for key in parameters) + "}"
+    if parameters:
+        return f"<{len(parameters)} redacted>"
+    return "<none>"
+
+
+@contextmanager
+def count_queries():
+    """Counts the queries issued inside the block, on any engine."""
+    stats = RequestStats()
+    token = _query_counters.set(_query_counters.get() + (stats,))
+    try:
+        yield stats
+    finally:
+        _query_counters.reset(token)
+
+
+@contextmanager
+def assert_max_queries(limit: int):
+    """Test helper that fails when the block issues more than ``limit``
+    queries, to catch N+1 regressions."""
+    with count_queries() as stats:
+        yield stats
+    assert stats.queries <= limit, (
+        f"Expected at most {limit} queries, {stats.queries} were issued"
+    )
+
+
+class Histogram:
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value: float) -> None:
+        self.count += 1
+        self.sum += value
+        for index, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[index] += 1
+
+
+class RequestMetrics:
+    """Per-route aggregates, rendered in the Prometheus text format.
+
+    Routes are keyed by their template (``/tasks/{task_id}``), never by the
+    concrete path, so the number of series stays bounded.
+    """
+
+    def __init__(self):
+        self.requests: dict[tuple[str, str, int], int] = {}
+        self.duration: dict[tuple[str, str], Histogram] = {}
+        self.queries: dict[tuple[str, str], Histogram] = {}
+        self.db_time: dict[tuple[str, str], float] = {}
+        self.pool_wait: dict[tuple[str, str], float] = {}
+
+    def observe(self, method: str, route: str, status: int, duration: float, stats: RequestStats) -> None:
+        key = (method, route)
+        self.requests[(method, route, status)] = self.requests.get((method, route, status), 0) + 1
+        self.duration.setdefault(key, Histogram(LATENCY_BUCKETS)).observe(duration)
+        self.queries.setdefault(key, Histogram(QUERY_COUNT_BUCKETS)).observe(stats.queries)
+        self.db_time[key] = self.db_time.get(key, 0.0) + stats.db_time
+        self.pool_wait[key] = self.pool_wait.get(key, 0.0) + stats.pool_wait
+
+    def clear(self) -> None:
+        self.__init__()
+
+    def render(self) -> str:
+        lines: list[str] = []
+
+        def header(name, kind, help_text):
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {kind}")
+
+        header("http_requests_total", "counter", "Requests by route template and status.")
+        for (method, route, status), value in sorted(self.requests.items()):
+            lines.append(
+                f'http_requests_total{{method="{method}",route="{_escape(route)}",status="{status}"}} {value}'
+            )
+        for name, help_text, histograms in (
+            ("http_request_duration_seconds", "Total handler time.", self.duration),
+            ("http_request_db_queries", "SQL statements per request.", self.queries),
+        ):
+            header(name, "histogram", help_text)
+            for (method, route), histogram in sorted(histograms.items()):
+                labels = f'method="{method}",route="{_escape(route)}"'
+                for bound, count in zip(histogram.buckets, histogram.counts):
+                    lines.append(f'{name}_bucket{{{labels},le="{bound}"}} {count}')
+                lines.append(f'{name}_bucket{{{labels},le="+Inf"}} {histogram.count}')
+                lines.append(f"{name}_sum{{{labels}}} {histogram.sum}")
+                lines.append(f"{name}_count{{{labels}}} {histogram.count}")
+        for name, help_text, totals in (
+            ("http_request_db_seconds_total", "Time spent executing SQL.", self.db_time),
+            ("http_request_pool_wait_seconds_total", "Time spent waiting for a pooled connection.", self.pool_wait),
+        ):
+            header(name, "counter", help_text)
+            for (method, route), value in sorted(totals.items()):
+                lines.append(f'{name}{{method="{method}",route="{_escape(route)}"}} {value}')
+        return "\n".join(lines) + "\n"
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"')
+
+
+class InstrumentationMiddleware:
+    """ASGI middleware recording query count, DB time, pool wait and total
+    time of every HTTP request. Streaming bodies are included, as the
+    request is only recorded once the response has been sent."""
+
+    def __init__(self, app, metrics: RequestMetrics):
+        self.app = app
+        self.metrics = metrics
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        stats = RequestStats()
+        token = _request_stats.set(stats)
+        status = 500
+
+        async def send_wrapper(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            duration = time.perf_counter() - start
+            _request_stats.reset(token)
+            route = scope.get("route")
+            # Unmatched paths (404s) are pooled so scanners cannot add series.
+            template = getattr(route, "path_format", None) or "<unmatched>"
+            self.metrics.observe(scope["method"], template, status, duration, stats)
@@ -0,0 +1,339 @@
+import asyncio
+import logging
+import time
+from contextvars import ContextVar
+from datetime import datetime, timedelta, timezone
+from typing import Awaitable, Callable
+
+from sqlalchemy import case, delete, event, func, or_, select, update
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+from sqlalchemy.orm import Session
+
+from app.models import OutboxJob, RefreshToken
+from app.resources import get_resources
+from app.settings import Settings
+from app.utils.security import live_session_cutoff
+
+logger = logging.getLogger(__name__)
+audit_logger = logging.getLogger("app.audit")
+
+_ENQUEUED = "jobs_enqueued"
+# The claimed job whose handler runs in the current task.
+_current_job: ContextVar = ContextVar("current_job", default=None)
+
+Handler = Callable[[dict, AsyncSession], Awaitable[None]]
+
+# Handlers registered with @job_handler, run by every JobQueue.
+HANDLERS: dict[str, Handler] = {}
+
+
+def job_handler(kind: str):
+    """Registers the coroutine that runs jobs of ``kind`` on every queue."""
+
+    def register(fn: Handler) -> Handler:
+        HANDLERS[kind] = fn
+        return fn
+
+    return register
+
+
+def _now() -> datetime:
+    return datetime.now(timezone.utc)
+
+
+class LeaseLost(Exception):
+    """The running job's lease expired and another run claimed it."""
+
+
+class JobQueue:
+    """In-process worker for the outbox table.
+
+    Jobs are enqueued inside the caller's transaction, so they exist if and
+    only if the change that caused them was committed. A dispatcher claims
+    due jobs and runs at most ``concurrency`` handlers at once; a failing
+    job is retried with exponential backoff and marked ``failed`` after
+    ``max_attempts``. With several workers every one of them dispatches;
+    claims use SKIP LOCKED on PostgreSQL. Delivery is at least once (a job
+    whose lease expires mid-run is claimed again), so handlers must be
+    idempotent.
+
+    A claim is a lease of ``lease_seconds`` owned by that attempt. Handlers
+    that may outlive it call ``renew`` as they make progress; only the
+    owner of the lease can renew, complete or fail the job.
+
+    Housekeeping jobs registered with ``every`` are enqueued by the
+    dispatcher itself, once at start and then at their interval.
+    """
+
+    def __init__(
+        self,
+        concurrency: int = Settings.jobs_concurrency,
+        max_attempts: int = Settings.jobs_max_attempts,
+        retry_backoff: float = Settings.jobs_retry_backoff,
+        poll_interval: float = Settings.jobs_poll_interval,
+        lease_seconds: float = Settings.jobs_lease_seconds,
+    ):
+        self.concurrency = concurrency
+        self.max_attempts = max_attempts
+        self.retry_backoff = retry_backoff
+        self.poll_interval = poll_interval
+        self.lease_seconds = lease_seconds
+        self.handlers: dict[str, Handler] = {}
+        self.intervals: dict[str, float] = {}
+        self._next_run: dict[str, float] = {}
+        self.session_factory: async_sessionmaker | None = None
+        self._wakeup = asyncio.Event()
+        self._dispatcher: asyncio.Task | None = None
+        self._running: set[asyncio.Task] = set()
+        self.succeeded = 0
+        self.retried = 0
+        self.failed = 0
+
+    def handler(self, kind: str):
+        """Registers the coroutine that runs jobs of ``kind`` on this queue
+        only, in addition to the ``job_handler`` ones."""
+
+        def register(fn: Handler) -> Handler:
+            self.handlers[kind] = fn
+            return fn
+
+        return register
+
+    def every(self, kind: str, seconds: float) -> None:
+        """Runs ``kind`` jobs (with an empty payload) every ``seconds``; 0
+        turns them off. Every worker schedules its own, so such handlers
+        must not mind running more often."""
+        if seconds > 0:
+            self.intervals[kind] = seconds
+        else:
+            self.intervals.pop(kind, None)
+
+    def enqueue(self, session: AsyncSession, kind: str, payload: dict) -> None:
+        """Adds a job to the session's transaction; nothing is written for
+        kinds without a handler."""
+        if self._handler(kind) is None:
+            return
+        session.add(OutboxJob(kind=kind, payload=payload, available_at=_now()))
+        session.info[_ENQUEUED] = self
+
+    def _handler(self, kind: str) -> Handler | None:
+        return self.handlers.get(kind) or HANDLERS.get(kind)
+
+    def wake(self) -> None:
+        self._wakeup.set()
+
+    async def start(self, session_factory: async_sessionmaker) -> None:
+        self.session_factory = session_factory
+        self._dispatcher = asyncio.create_task(self._dispatch())
+
+    async def drain(self, timeout: float = Settings.jobs_drain_timeout) -> None:
+        """Stops claiming new jobs and waits for the running ones. Jobs
+        still pending stay in the outbox for the next start."""
+        if self._dispatcher is not None:
+            self._dispatcher.cancel()
+            try:
+                await self._dispatcher
+            except asyncio.CancelledError:
+                pass
+            self._dispatcher = None
+        if self._running:
+            done, pending = await asyncio.wait(self._running, timeout=timeout)
+            for task in pending:
+                task.cancel()
+            if pending:
+                logger.warning("%d jobs did not finish before shutdown", len(pending))
+
+    async def _dispatch(self) -> None:
+        while True:
+            self._wakeup.clear()
+            try:
+                await self.enqueue_periodic()
+                claimed = await self.run_pending()
+            except Exception:
+                logger.exception("Claiming outbox jobs failed")
+                claimed = 0
+            if claimed and len(self._running) < self.concurrency:
+                continue
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), self.poll_interval)
+            except asyncio.TimeoutError:
+                pass
+
+    async def enqueue_periodic(self) -> None:
+        """Enqueues the ``every`` jobs that are due."""
+        now = time.monotonic()
+        due = [kind for kind in self.intervals if self._next_run.get(kind, 0) <= now]
+        if not due:
+            return
+        async with self.session_factory() as session:
+            for kind in due:
+                self.enqueue(session, kind, {})
+            await session.commit()
+        for kind in due:
+            self._next_run[kind] = now + self.intervals[kind]
+
+    async def run_pending(self, wait: bool = False) -> int:
+        """Claims as many due jobs as there are free slots and starts them.
+        Returns how many were claimed; with ``wait`` they are awaited."""
+        free = self.concurrency - len(self._running)
+        if free <= 0:
+            return 0
+        jobs = await self._claim(free)
+        tasks = [asyncio.create_task(self._run(job)) for job in jobs]
+        for task in tasks:
+            self._running.add(task)
+            task.add_done_callback(self._finished)
+        if wait and tasks:
+            await asyncio.gather(*tasks)
+        return len(jobs)
+
+    def _finished(self, task: asyncio.Task) -> None:
+        self._running.discard(task)
+        # A slot is free again.
+        self.wake()
+
+    async def _claim(self, limit: int) -> list:
+        now = _now()
+        async with self.session_factory() as session:
+            due = (
+                select(OutboxJob.id)
+                .where(
+                    or_(OutboxJob.status == "pending", OutboxJob.status == "running"),
+                    OutboxJob.available_at <= now,
+                )
+                .order_by(OutboxJob.available_at, OutboxJob.id)
+                .limit(limit)
+                .with_for_update(skip_locked=True)
+            )
+            ids = (await session.scalars(due)).all()
+            if not ids:
+                return []
+            result = await session.execute(
+                update(OutboxJob)
+                .where(OutboxJob.id.in_(ids))
+                .values(
+                    status="running",
+                    attempts=OutboxJob.attempts + 1,
+                    available_at=now + timedelta(seconds=self.lease_seconds),
+                )
+                .returning(
+                    OutboxJob.id, OutboxJob.kind, OutboxJob.payload, OutboxJob.attempts
+                )
+            )
+            jobs = result.all()
+            await session.commit()
+            return jobs
+
+    def _owned(self, job):
+        # Every claim increments attempts, so it identifies the lease.
+        return (
+            OutboxJob.id == job.id,
+            OutboxJob.status == "running",
+            OutboxJob.attempts == job.attempts,
+        )
+
+    async def renew(self, session: AsyncSession) -> None:
+        """Extends the lease of the job being run, in the session's
+        transaction; commit it with the progress it covers. Raises
+        LeaseLost when another run has taken the job over. Does nothing
+        outside a job."""
+        job = _current_job.get()
+        if job is None:
+            return
+        result = await session.execute(
+            update(OutboxJob)
+            .where(*self._owned(job))
+            .values(available_at=_now() + timedelta(seconds=self.lease_seconds))
+        )
+        if result.rowcount == 0:
+            raise LeaseLost(f"Job {job.id} ({job.kind}) was claimed again")
+
+    async def _run(self, job) -> None:
+        _current_job.set(job)
+        async with self.session_factory() as session:
+            try:
+                await self._handler(job.kind)(job.payload, session)
+            except LeaseLost:
+                await session.rollback()
+                logger.warning("Job %s (%s) lost its lease, stopping", job.id, job.kind)
+                return
+            except Exception as exc:
+                await session.rollback()
+                await self._fail(session, job, exc)
+                return
+            result = await session.execute(delete(OutboxJob).where(*self._owned(job)))
+            await session.commit()
+            if result.rowcount == 0:
+                logger.warning("Job %s (%s) finished after losing its lease", job.id, job.kind)
+                return
+            self.succeeded += 1
+
+    async def _fail(self, session: AsyncSession, job, exc: Exception) -> None:
+        if job.attempts >= self.max_attempts:
+            status, available_at = "failed", _now()
+            self.failed += 1
+            logger.error("Job %s (%s) failed for good: %r", job.id, job.kind, exc)
+        else:
+            delay = self.retry_backoff * 2 ** (job.attempts - 1)
+            status, available_at = "pending", _now() + timedelta(seconds=delay)
+            self.retried += 1
+            logger.warning("Job %s (%s) failed, retrying in %.1fs: %r", job.id, job.kind, delay, exc)
+        await session.execute(
+            update(OutboxJob)
+            .where(*self._owned(job))
+            .values(status=status, available_at=available_at, last_error=repr(exc))
+        )
+        await session.commit()
+
+    def stats(self) -> dict:
+        return {
+            "concurrency": self.concurrency,
+            "running": len(self._running),
+            "succeeded": self.succeeded,
+            "retried": self.retried,
+            "failed": self.failed,
+        }
+
+
+@event.listens_for(Session, "after_commit")
+def _wake_job_queue(session: Session) -> None:
+    # Committed jobs run right away instead of at the next poll.
+    queue = session.info.pop(_ENQUEUED, None)
+    if queue is not None:
+        queue.wake()
+
+
+@event.listens_for(Session, "after_soft_rollback")
+def _discard_enqueued(session: Session, previous_transaction) -> None:
+    session.info.pop(_ENQUEUED, None)
+
+
+@job_handler("audit")
+async def write_audit_record(payload: dict, session: AsyncSession) -> None:
+    """Audit trail of task and permission changes, off the request path."""
+    audit_logger.info("%s", payload)
+
+
+@job_handler("purge_refresh_tokens")
+async def purge_refresh_tokens(payload: dict, session: AsyncSession) -> None:
+    """Deletes the refresh tokens nothing needs any more: expired ones, and
+    revoked sessions without a valid access token left. Tokens rotated out
+    of a live session stay until they expire; presenting one is how reuse
+    is detected."""
+    now = _now()
+    cutoff = live_session_cutoff(get_resources().settings, now)
+    dead_sessions = (
+        select(RefreshToken.family_id)
+        .group_by(RefreshToken.family_id)
+        .having(
+            func.sum(case((RefreshToken.revoked == False, 1), else_=0)) == 0,
+            func.max(RefreshToken.expires_at) < cutoff,
+        )
+    )
+    result = await session.execute(
+        delete(RefreshToken).where(
+            or_(RefreshToken.expires_at <= now, RefreshToken.family_id.in_(dead_sessions))
+        )
+    )
+    await session.commit()
+    logger.info("Purged %d refresh tokens", result.rowcount)
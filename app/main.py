@@ -1,17 +1,79 @@
 from contextlib import asynccontextmanager
-from fastapi import FastAPI
-from app.database import Base, engine
-from app.routers import auth, tasks, task_permissions
+from typing import TYPE_CHECKING
 
+from app.settings import Settings
 
-@asynccontextmanager
-async def lifespan(app: FastAPI):
-    async with engine.begin() as conn:
-        await conn.run_sync(Base.metadata.create_all)
-    yield
+if TYPE_CHECKING:
+    from fastapi import FastAPI
 
-app = FastAPI(lifespan=lifespan)
 
-app.include_router(auth.router)
-app.include_router(tasks.router)
-app.include_router(task_permissions.router)
+def create_app(settings: Settings | None = None) -> "FastAPI":
+    """Builds an application for ``settings``.
+
+    FastAPI, the routers and everything they use are imported here rather
+    than with this module. The app gets its own resources (caches, rate
+    limit store, job queue, event bus; engines and signing keys on first
+    use) on ``app.state.resources``. Without ``settings`` it uses the
+    process settings and shares the process default resources, which is
+    what scripts and ``app.main:app`` see.
+    """
+    from fastapi import FastAPI
+
+    from app import crud, database
+    from app.instrumentation import InstrumentationMiddleware
+    from app.ratelimit import Limit, RateLimitMiddleware
+    from app.resources import Resources, ResourcesMiddleware, default_resources
+    from app.routers import auth, events, monitoring, tasks, task_permissions
+
+    resources = default_resources() if settings is None else Resources(settings)
+    settings = resources.settings
+
+    @asynccontextmanager
+    async def lifespan(app: FastAPI):
+        engine = resources.engine
+        # The schema is owned by the Alembic migrations, not created here.
+        if settings.db_schema_check:
+            await database.check_schema_version(engine)
+        if settings.db_warmup:
+            await database.warm_up(engine, crud.warm_up)
+        await crud.reload_revoked_sessions(resources)
+        await resources.event_bus.start(engine.url)
+        await resources.job_queue.start(resources.session_factory)
+        yield
+        # Let running follow-up jobs finish before connections go away.
+        await resources.job_queue.drain(settings.jobs_drain_timeout)
+        await resources.event_bus.stop()
+        await resources.dispose()
+
+    app = FastAPI(lifespan=lifespan)
+    app.state.resources = resources
+    auth_limit = Limit.parse(settings.rate_limit_auth)
+    app.add_middleware(
+        RateLimitMiddleware,
+        store=resources.rate_limit_store,
+        default=Limit.parse(settings.rate_limit_default),
+        budgets={"/token": auth_limit, "/register": auth_limit},
+        enabled=settings.rate_limit_enabled,
+        trust_forwarded=settings.rate_limit_trust_forwarded,
+    )
+    # Added after the rate limit so it also records rate-limited requests.
+    app.add_middleware(InstrumentationMiddleware, metrics=resources.request_metrics)
+    # Outermost: everything below, the lifespan included, runs with the
+    # app's resources.
+    app.add_middleware(ResourcesMiddleware, resources=resources)
+
+    app.include_router(auth.router)
+    app.include_router(tasks.router)
+    app.include_router(task_permissions.router)
+    app.include_router(events.router)
+    app.include_router(monitoring.router)
+    return app
+
+
+def __getattr__(name: str):
+    # "uvicorn app.main:app" and "from app.main import app" keep working;
+    # the default app is only built when first asked for.
+    if name != "app":
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    app = globals()["app"] = create_app()
+    return app
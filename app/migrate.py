@@ -0,0 +1,47 @@
+"""Brings the database to the migration head: ``python -m app.migrate``.
+
+Run it before starting the app, e.g. as part of the container's start
+command. Databases created by ``create_all`` before the schema moved to
+migrations have the initial tables but no ``alembic_version``; they are
+stamped at the initial revision first, so the later migrations apply on
+top of them instead of failing on "table users already exists".
+"""
+import asyncio
+import logging
+
+from alembic import command
+from alembic.config import Config
+from sqlalchemy import inspect
+
+from app.database import ALEMBIC_DIR, create_engine
+from app.settings import get_settings
+
+logger = logging.getLogger(__name__)
+
+# The schema the old create_all produced.
+INITIAL_REVISION = "442fbf96fcd6"
+
+
+async def _tables(url: str) -> list[str]:
+    engine = create_engine(url)
+    try:
+        async with engine.connect() as conn:
+            return await conn.run_sync(lambda sync_conn: inspect(sync_conn).get_table_names())
+    finally:
+        await engine.dispose()
+
+
+def migrate(url: str) -> None:
+    config = Config()
+    config.set_main_option("script_location", str(ALEMBIC_DIR))
+    config.set_main_option("sqlalchemy.url", url)
+    tables = asyncio.run(_tables(url))
+    if "users" in tables and "alembic_version" not in tables:
+        logger.warning("Unversioned database, stamping it at %s", INITIAL_REVISION)
+        command.stamp(config, INITIAL_REVISION)
+    command.upgrade(config, "head")
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    migrate(get_settings().database_url)
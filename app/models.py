@@ -1,5 +1,6 @@
 from sqlalchemy.orm import Mapped, mapped_column, relationship
-from sqlalchemy import Boolean, ForeignKey, Integer, String, UniqueConstraint
+from datetime import datetime
+from sqlalchemy import DDL, JSON, Boolean, DateTime, ForeignKey, Index, Integer, String, UniqueConstraint, event
 from .database import Base
 
 class User(Base):
@@ -7,27 +8,158 @@ class User(Base):
     username: Mapped[str] = mapped_column(String, unique=True, index=True)
     hashed_password: Mapped[str] = mapped_column(String)
 
-    tasks: Mapped[list['Task']] = relationship('Task', back_populates='owner', cascade='all, delete-orphan')
+    # passive_deletes: the database cascades, children are never loaded.
+    tasks: Mapped[list['Task']] = relationship('Task', back_populates='owner', cascade='all, delete-orphan', passive_deletes=True)
 
 class Task(Base):
 
+    __table_args__ = (
+        # Keyset walk over a user's own tasks (owner_id = ? AND id > ?).
+        Index('ix_tasks_owner_id_id', 'owner_id', 'id'),
+    )
+
     title: Mapped[str] = mapped_column(String, index=True)
-    description: Mapped[str] = mapped_column(String, index=True)
-    owner_id: Mapped[int] = mapped_column(Integer, ForeignKey('users.id'))
+    description: Mapped[str] = mapped_column(String)
+    owner_id: Mapped[int] = mapped_column(Integer, ForeignKey('users.id', ondelete='CASCADE'))
+    version: Mapped[int] = mapped_column(Integer, default=1, server_default='1')
 
     owner: Mapped[User] = relationship('User', back_populates='tasks')
-    permissions: Mapped[list['TaskPermission']] = relationship('TaskPermission', back_populates='task', cascade='all, delete-orphan')
+    permissions: Mapped[list['TaskPermission']] = relationship('TaskPermission', back_populates='task', cascade='all, delete-orphan', passive_deletes=True)
 
 class TaskPermission(Base):
 
     __table_args__ = (
         UniqueConstraint('task_id', 'user_id'),
+        # Covering index for "tasks shared with user": the unique constraint
+        # leads with task_id and cannot serve lookups by user.
+        Index('ix_taskpermissions_user_visible', 'user_id', 'can_read', 'task_id'),
     )
 
-    task_id: Mapped[int] = mapped_column(Integer, ForeignKey('tasks.id'))
-    user_id: Mapped[int] = mapped_column(Integer, ForeignKey('users.id'))
+    task_id: Mapped[int] = mapped_column(Integer, ForeignKey('tasks.id', ondelete='CASCADE'))
+    user_id: Mapped[int] = mapped_column(Integer, ForeignKey('users.id', ondelete='CASCADE'))
     can_read: Mapped[bool] = mapped_column(Boolean, default=False)
     can_update: Mapped[bool] = mapped_column(Boolean, default=False)
+    version: Mapped[int] = mapped_column(Integer, default=1, server_default='1')
 
     task: Mapped[Task] = relationship('Task', back_populates='permissions')
-    user: Mapped[User] = relationship('User')
\ No newline at end of file
+    user: Mapped[User] = relationship('User')
+
+
+class TaskChange(Base):
+    """Append-only log of task and permission mutations; its id is the
+    cursor of the change feed.
+
+    ``user_id`` is NULL for changes relevant to everyone who can see the
+    task, or names the single user a change is addressed to (a grant or
+    revocation, or the tombstone of a deleted task).
+    """
+
+    __table_args__ = (
+        Index('ix_taskchanges_user_id_id', 'user_id', 'id'),
+    )
+
+    # No foreign key: entries must outlive the task they describe.
+    task_id: Mapped[int] = mapped_column(Integer, index=True)
+    user_id: Mapped[int | None] = mapped_column(Integer, nullable=True)
+    op: Mapped[str] = mapped_column(String)
+
+
+class RefreshToken(Base):
+    """Server side of a refresh token; only its SHA-256 is stored.
+
+    Every refresh rotates the token within its ``family_id`` (one login
+    session). Presenting an already rotated token means it was stolen, and
+    revokes the whole family.
+    """
+
+    user_id: Mapped[int] = mapped_column(Integer, ForeignKey('users.id', ondelete='CASCADE'), index=True)
+    family_id: Mapped[str] = mapped_column(String, index=True)
+    token_hash: Mapped[str] = mapped_column(String, unique=True)
+    expires_at: Mapped[datetime] = mapped_column(DateTime(timezone=True))
+    revoked: Mapped[bool] = mapped_column(Boolean, default=False, server_default='0')
+
+
+class OutboxJob(Base):
+    """Follow-up work written in the same transaction as the change that
+    caused it, and run afterwards by app.jobs.JobQueue.
+
+    ``available_at`` is when the job may next be claimed: the retry time of
+    a pending job, or the lease expiry of a running one, after which a job
+    whose worker died is picked up again. Finished jobs are deleted.
+    """
+
+    __table_args__ = (
+        Index('ix_outboxjobs_status_available_at', 'status', 'available_at'),
+    )
+
+    kind: Mapped[str] = mapped_column(String)
+    payload: Mapped[dict] = mapped_column(JSON)
+    status: Mapped[str] = mapped_column(String, default='pending', server_default='pending')
+    attempts: Mapped[int] = mapped_column(Integer, default=0, server_default='0')
+    available_at: Mapped[datetime] = mapped_column(DateTime(timezone=True))
+    last_error: Mapped[str | None] = mapped_column(String, nullable=True)
+
+
+class Operation(Base):
+    """Progress of a long-running background operation, polled by the
+    client that started it."""
+
+    user_id: Mapped[int] = mapped_column(Integer, ForeignKey('users.id', ondelete='CASCADE'), index=True)
+    kind: Mapped[str] = mapped_column(String)
+    status: Mapped[str] = mapped_column(String, default='pending', server_default='pending')
+    total: Mapped[int] = mapped_column(Integer, default=0, server_default='0')
+    done: Mapped[int] = mapped_column(Integer, default=0, server_default='0')
+    # Largest task id the operation covers: later tasks are left alone.
+    up_to_id: Mapped[int | None] = mapped_column(Integer, nullable=True)
+
+# Full-text search over title and description. The index lives outside the
+# mapped columns because it is dialect specific: a generated tsvector column
+# with a GIN index on PostgreSQL, an FTS5 table kept in sync by triggers on
+# SQLite. The same DDL is shipped as an Alembic migration.
+TASK_SEARCH_CONFIG = 'simple'
+
+_postgresql_search_ddl = [
+    f"""ALTER TABLE tasks ADD COLUMN search_vector tsvector GENERATED ALWAYS AS (
+        to_tsvector('{TASK_SEARCH_CONFIG}', coalesce(title, '') || ' ' || coalesce(description, ''))
+    ) STORED""",
+    "CREATE INDEX ix_tasks_search_vector ON tasks USING gin (search_vector)",
+]
+
+_sqlite_search_ddl = [
+    """CREATE VIRTUAL TABLE IF NOT EXISTS tasks_fts USING fts5(
+        title, description, content='tasks', content_rowid='id'
+    )""",
+    """CREATE TRIGGER tasks_fts_ai AFTER INSERT ON tasks BEGIN
+        INSERT INTO tasks_fts(rowid, title, description)
+        VALUES (new.id, new.title, new.description);
+    END""",
+    """CREATE TRIGGER tasks_fts_ad AFTER DELETE ON tasks BEGIN
+        INSERT INTO tasks_fts(tasks_fts, rowid, title, description)
+        VALUES ('delete', old.id, old.title, old.description);
+    END""",
+    """CREATE TRIGGER tasks_fts_au AFTER UPDATE ON tasks BEGIN
+        INSERT INTO tasks_fts(tasks_fts, rowid, title, description)
+        VALUES ('delete', old.id, old.title, old.description);
+        INSERT INTO tasks_fts(rowid, title, description)
+        VALUES (new.id, new.title, new.description);
+    END""",
+]
+
+for statement in _postgresql_search_ddl:
+    event.listen(Task.__table__, 'after_create', DDL(statement).execute_if(dialect='postgresql'))
+for statement in _sqlite_search_ddl:
+    event.listen(Task.__table__, 'after_create', DDL(statement).execute_if(dialect='sqlite'))
+event.listen(
+    Task.__table__, 'before_drop', DDL('DROP TABLE IF EXISTS tasks_fts').execute_if(dialect='sqlite')
+)
+
+# Username prefix search and paging compare bytes (crud.get_users). SQLite's
+# default collation already does, so its plain index serves; PostgreSQL needs
+# an index in the "C" collation. Also shipped as an Alembic migration.
+event.listen(
+    User.__table__,
+    'after_create',
+    DDL('CREATE INDEX ix_users_username_c ON users (username COLLATE "C")').execute_if(
+        dialect='postgresql'
+    ),
+)
@@ -0,0 +1,188 @@
+import json
+import math
+import time
+from dataclasses import dataclass
+
+import jwt
+
+from app.settings import Settings
+from app.utils.tokens import get_token_service
+
+_PERIODS = {"second": 1, "minute": 60, "hour": 3600, "day": 86400}
+
+
+@dataclass(frozen=True)
+class Limit:
+    """Token bucket of ``capacity`` requests refilled at ``rate`` per second."""
+
+    capacity: int
+    rate: float
+
+    @classmethod
+    def parse(cls, value: str) -> "Limit":
+        """Parses ``"<requests>/<second|minute|hour|day>"``."""
+        count, period = value.split("/")
+        return cls(capacity=int(count), rate=int(count) / _PERIODS[period.strip()])
+
+
+class MemoryStore:
+    """Buckets of a single worker; each worker enforces its own budget."""
+
+    def __init__(self, maxsize: int = 100_000):
+        self.maxsize = maxsize
+        self._buckets: dict[str, tuple[float, float]] = {}
+
+    async def acquire(self, key: str, limit: Limit) -> float:
+        """Takes a token; returns 0 when allowed, else seconds to wait."""
+        now = time.monotonic()
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            if len(self._buckets) >= self.maxsize:
+                self._prune()
+            tokens = limit.capacity
+        else:
+            tokens, last = bucket
+            tokens = min(limit.capacity, tokens + (now - last) * limit.rate)
+        if tokens >= 1:
+            self._buckets[key] = (tokens - 1, now)
+            return 0.0
+        self._buckets[key] = (tokens, now)
+        return (1 - tokens) / limit.rate
+
+    def _prune(self) -> None:
+        # Insertion order approximates age: drop the oldest tenth.
+        for key in list(self._buckets)[: max(1, self.maxsize // 10)]:
+            del self._buckets[key]
+
+    def clear(self) -> None:
+        self._buckets.clear()
+
+
+class RedisStore:
+    """Buckets shared by all workers, kept in Redis and updated atomically
+    by a Lua script."""
+
+    _SCRIPT = """
+    local capacity = tonumber(ARGV[1])
+    local rate = tonumber(ARGV[2])
+    local now = tonumber(ARGV[3])
+    local bucket = redis.call('HMGET', KEYS[1], 'tokens', 'last')
+    local tokens = tonumber(bucket[1]) or capacity
+    local last = tonumber(bucket[2]) or now
+    tokens = math.min(capacity, tokens + math.max(0, now - last) * rate)
+    local wait = 0
+    if tokens >= 1 then
+        tokens = tokens - 1
+    else
+        wait = (1 - tokens) / rate
+    end
+    redis.call('HSET', KEYS[1], 'tokens', tokens, 'last', now)
+    redis.call('PEXPIRE', KEYS[1], math.ceil(capacity / rate * 1000))
+    return tostring(wait)
+    """
+
+    def __init__(self, url: str, prefix: str = "ratelimit:"):
+        import redis.asyncio as redis
+
+        self.prefix = prefix
+        self._redis = redis.from_url(url)
+        self._script = self._redis.register_script(self._SCRIPT)
+
+    async def acquire(self, key: str, limit: Limit) -> float:
+        wait = await self._script(
+            keys=[self.prefix + key], args=[limit.capacity, limit.rate, time.time()]
+        )
+        return float(wait)
+
+
+def create_store(settings: Settings):
+    backend = settings.rate_limit_backend
+    if backend == "memory":
+        return MemoryStore()
+    if backend == "redis":
+        return RedisStore(settings.rate_limit_redis_url)
+    raise ValueError(f"Unknown rate limit backend: {backend}")
+
+
+class RateLimitMiddleware:
+    """Token-bucket rate limiting per user (by access token) or, for
+    anonymous requests, per client IP. Rejected requests get a 429 with
+    Retry-After.
+
+    ``budgets`` maps exact paths to their own limit and bucket; every other
+    path shares the default one. Paths starting with an ``exempt`` prefix
+    are never limited.
+    """
+
+    def __init__(
+        self,
+        app,
+        store,
+        default: Limit | None = None,
+        budgets: dict[str, Limit] | None = None,
+        exempt: tuple[str, ...] = ("/metrics",),
+        enabled: bool = True,
+        trust_forwarded: bool = False,
+    ):
+        self.app = app
+        self.store = store
+        self.default = default or Limit.parse(Settings.rate_limit_default)
+        if budgets is None:
+            auth = Limit.parse(Settings.rate_limit_auth)
+            budgets = {"/token": auth, "/register": auth}
+        self.budgets = budgets
+        self.exempt = exempt
+        self.enabled = enabled
+        self.trust_forwarded = trust_forwarded
+
+    async def __call__(self, scope, receive, send):
+        if not self.enabled or scope["type"] != "http" or scope["path"].startswith(self.exempt):
+            await self.app(scope, receive, send)
+            return
+
+        path = scope["path"]
+        limit = self.budgets.get(path)
+        budget = path if limit is not None else "default"
+        wait = await self.store.acquire(
+            f"{budget}:{self._identity(scope)}", limit or self.default
+        )
+        if wait:
+            await self._reject(send, wait)
+            return
+        await self.app(scope, receive, send)
+
+    def _identity(self, scope) -> str:
+        authorization = None
+        forwarded = None
+        for name, value in scope["headers"]:
+            if name == b"authorization":
+                authorization = value
+            elif name == b"x-forwarded-for":
+                forwarded = value
+        if authorization is not None and authorization[:7].lower() == b"bearer ":
+            try:
+                # Served from the verified-token cache after the first request.
+                subject = get_token_service().verify(authorization[7:].decode()).get("sub")
+            except (jwt.InvalidTokenError, UnicodeDecodeError):
+                subject = None
+            if subject is not None:
+                return f"user:{subject}"
+        if forwarded is not None and self.trust_forwarded:
+            return "ip:" + forwarded.decode("latin-1").split(",")[0].strip()
+        client = scope.get("client")
+        return f"ip:{client[0] if client else 'unknown'}"
+
+    async def _reject(self, send, wait: float) -> None:
+        body = json.dumps({"detail": "Too many requests"}).encode()
+        await send(
+            {
+                "type": "http.response.start",
+                "status": 429,
+                "headers": [
+                    (b"content-type", b"application/json"),
+                    (b"content-length", str(len(body)).encode()),
+                    (b"retry-after", str(math.ceil(wait)).encode()),
+                ],
+            }
+        )
+        await send({"type": "http.response.body", "body": body})
@@ -0,0 +1,168 @@
+"""Everything an application builds from its settings.
+
+``create_app(settings)`` builds one ``Resources`` and keeps it on
+``app.state.resources``; ``ResourcesMiddleware`` makes it the current one
+for every request, websocket and the lifespan (and so for the tasks they
+start), and code below the routers reaches it with ``get_resources()``.
+Outside an app, e.g. in scripts and tests calling crud directly, that is
+the process default built from ``get_settings()``.
+
+The builders are imported where they are used: most of them import this
+module for ``get_resources()``.
+"""
+from contextvars import ContextVar
+from functools import cache, cached_property
+
+from app.settings import Settings, get_settings
+
+_current: ContextVar["Resources | None"] = ContextVar("resources", default=None)
+
+
+class Resources:
+    """Per-app state: caches, stores, queues and the event bus are created
+    with the app; database engines and signing keys on first use, so
+    building an app opens no pool and reads no key file."""
+
+    def __init__(self, settings: Settings):
+        from app.events import EventBus
+        from app.instrumentation import RequestMetrics
+        from app.jobs import JobQueue
+        from app.ratelimit import MemoryStore, create_store
+        from app.utils.cache import TTLCache, create_response_cache
+        from app.utils.security import PasswordHasher
+
+        self.settings = settings
+        self.request_metrics = RequestMetrics()
+        self.password_hasher = PasswordHasher(
+            executor=settings.password_hash_executor,
+            max_workers=settings.password_hash_workers,
+            max_concurrency=settings.password_hash_concurrency,
+            rounds=settings.bcrypt_rounds,
+        )
+        # username -> user id for authenticated principals, so get_current_user
+        # does not query the users table on every request.
+        self.principal_cache = TTLCache(
+            maxsize=settings.principal_cache_size, ttl=settings.principal_cache_ttl
+        )
+        # Login sessions (refresh token families) revoked by any worker.
+        # Access tokens name their session in the "sid" claim and are rejected
+        # while it is listed here, which only needs to last as long as an
+        # access token does.
+        self.revoked_sessions = TTLCache(
+            maxsize=100_000, ttl=settings.access_token_expire_minutes * 60
+        )
+        # Users that sent a mutating request recently keep reading from the
+        # primary so they see their own writes despite replica lag.
+        self.recent_writers = TTLCache(maxsize=100_000, ttl=settings.read_your_writes_seconds)
+        self.event_bus = EventBus(settings.events_backend, settings.events_queue_size)
+        # Task rows and per-task ACLs, keyed "task:<id>" and "acl:<id>"; crud
+        # invalidates both precisely on every mutation.
+        self.response_cache = create_response_cache(settings, self.event_bus)
+        self.job_queue = JobQueue(
+            concurrency=settings.jobs_concurrency,
+            max_attempts=settings.jobs_max_attempts,
+            retry_backoff=settings.jobs_retry_backoff,
+            poll_interval=settings.jobs_poll_interval,
+            lease_seconds=settings.jobs_lease_seconds,
+        )
+        self.job_queue.every("purge_refresh_tokens", settings.refresh_token_purge_interval)
+        self.rate_limit_store = (
+            create_store(settings) if settings.rate_limit_enabled else MemoryStore()
+        )
+        # Revocations reach every worker through the bus; what it missed
+        # while disconnected is read back from the database.
+        self.event_bus.on_revoke(self.revoke_sessions)
+        self.event_bus.on_reconnect(self.reload_revoked_sessions)
+
+    @cached_property
+    def token_service(self):
+        from app.utils.tokens import create_token_service
+
+        return create_token_service(self.settings)
+
+    @cached_property
+    def engine(self):
+        return self._create_engine(self.settings.database_url)
+
+    @cached_property
+    def session_factory(self):
+        from app.database import _sessionmaker
+
+        return _sessionmaker(self.engine)
+
+    @cached_property
+    def replica_engine(self):
+        """Engine of the read replica; None when reads go to the primary."""
+        if not self.settings.database_replica_url:
+            return None
+        return self._create_engine(self.settings.database_replica_url)
+
+    @cached_property
+    def read_session_factory(self):
+        from app.database import _sessionmaker
+
+        if self.replica_engine is None:
+            return None
+        return _sessionmaker(self.replica_engine)
+
+    def _create_engine(self, url: str):
+        from app.database import create_engine
+
+        settings = self.settings
+        return create_engine(
+            url,
+            pool_size=settings.db_pool_size,
+            max_overflow=settings.db_max_overflow,
+            pool_timeout=settings.db_pool_timeout,
+            pool_recycle=settings.db_pool_recycle,
+            pool_pre_ping=settings.db_pool_pre_ping,
+            statement_cache_size=settings.db_statement_cache_size,
+            pgbouncer=settings.db_pgbouncer,
+            echo=settings.db_echo,
+            slow_query_ms=settings.slow_query_ms,
+        )
+
+    def revoke_sessions(self, family_ids) -> None:
+        for family_id in family_ids:
+            self.revoked_sessions.set(family_id, True)
+
+    async def reload_revoked_sessions(self) -> None:
+        from app import crud
+
+        await crud.reload_revoked_sessions(self)
+
+    async def dispose(self) -> None:
+        """Releases what was built; engines never used are not created."""
+        self.password_hasher.shutdown()
+        for name in ("engine", "replica_engine"):
+            engine = self.__dict__.get(name)
+            if engine is not None:
+                await engine.dispose()
+
+
+@cache
+def default_resources() -> Resources:
+    """Resources of the process settings, shared by ``create_app()`` without
+    arguments and by code running outside any app."""
+    return Resources(get_settings())
+
+
+def get_resources() -> Resources:
+    """Resources of the app handling the current request or task."""
+    return _current.get() or default_resources()
+
+
+class ResourcesMiddleware:
+    """Makes the app's resources current for everything it runs. Must be
+    the outermost middleware."""
+
+    def __init__(self, app, resources: Resources):
+        self.app = app
+        self.resources = resources
+
+    async def __call__(self, scope, receive, send):
+        token = _current.set(self.resources)
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            _current.reset(token)
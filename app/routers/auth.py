@@ -1,42 +1,33 @@
 from typing import Annotated
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Query, Response, status
 from fastapi.security import OAuth2PasswordRequestForm
-import jwt
 from sqlalchemy.ext.asyncio import AsyncSession
 from app import crud, schemas
-from app.depenndencies import get_db
-from app.utils.security import verify_password
-from datetime import datetime, timedelta, timezone
-from dotenv import load_dotenv
-import os
+from app.depenndencies import get_db, get_read_db
+from app.resources import get_resources
+from app.utils.tokens import get_token_service
+from datetime import timedelta
+from urllib.parse import quote, unquote
 from app.schemas import User
 
-load_dotenv()
-
 router = APIRouter(tags=["User"])
 
-SECRET_KEY = os.getenv("SECRET_KEY")
-ALGORITHM = os.getenv("ALGORITHM")
-ACCESS_TOKEN_EXPIRE_MINUTES = int(os.getenv("ACCESS_TOKEN_EXPIRE_MINUTES"))
-
 
 def create_access_token(data: dict, expires_delta: timedelta = None):
-    to_encode = data.copy()
-    if expires_delta:
-        expire = datetime.now(timezone.utc) + expires_delta
-    else:
-        expire = datetime.now(timezone.utc) + timedelta(minutes=15)
-    to_encode.update({"exp": expire})
-    encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
-    return encoded_jwt
-
-
-def authenticate_user(session: AsyncSession, username: str, password: str):
-    user = crud.get_user_by_username(session, username)
+    return get_token_service().issue(data, expires_delta or timedelta(minutes=15))
+
+
+async def authenticate_user(session: AsyncSession, username: str, password: str):
+    user = await crud.get_user_by_username(session, username)
     if not user:
         return False
-    if not verify_password(password, user.hashed_password):
+    is_valid, new_hash = await get_resources().password_hasher.verify_and_update(
+        password, user.hashed_password
+    )
+    if not is_valid:
         return False
+    if new_hash:
+        await crud.update_user_password_hash(session, user, new_hash)
     return user
 
 
@@ -58,27 +49,86 @@ async def login_for_access_token(
     session: Annotated[AsyncSession, Depends(get_db)],
     form_data: Annotated[OAuth2PasswordRequestForm, Depends()],
 ):
-    user = await crud.get_user_by_username(session, username=form_data.username)
-    if not user or not verify_password(form_data.password, user.hashed_password):
+    user = await authenticate_user(session, form_data.username, form_data.password)
+    if not user:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Incorrect username or password",
             headers={"WWW-Authenticate": "Bearer"},
         )
-    access_token_expires = timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
+    refresh_token, family_id = await crud.create_refresh_token(
+        session, user.id, _refresh_token_lifetime()
+    )
+    return _token_response(user, refresh_token, family_id)
+
+
+def _refresh_token_lifetime() -> timedelta:
+    return timedelta(days=get_resources().settings.refresh_token_expire_days)
+
+
+def _token_response(user, refresh_token: str, family_id: str) -> dict:
+    access_token_expires = timedelta(
+        minutes=get_resources().settings.access_token_expire_minutes
+    )
     access_token = create_access_token(
-        data={"sub": user.username}, expires_delta=access_token_expires
+        data={"sub": user.username, "uid": user.id, "sid": family_id},
+        expires_delta=access_token_expires,
+    )
+    return {
+        "access_token": access_token,
+        "token_type": "bearer",
+        "refresh_token": refresh_token,
+    }
+
+
+@router.post("/token/refresh", response_model=schemas.Token)
+async def refresh_access_token(
+    payload: schemas.RefreshTokenRequest,
+    session: Annotated[AsyncSession, Depends(get_db)],
+):
+    """Issues a new access token without checking the password again; the
+    refresh token is rotated on every call."""
+    user, refresh_token, family_id = await crud.rotate_refresh_token(
+        session, payload.refresh_token, _refresh_token_lifetime()
     )
-    return {"access_token": access_token, "token_type": "bearer"}
+    return _token_response(user, refresh_token, family_id)
+
+
+@router.post("/token/revoke", status_code=status.HTTP_204_NO_CONTENT)
+async def revoke_refresh_token(
+    payload: schemas.RefreshTokenRequest,
+    session: Annotated[AsyncSession, Depends(get_db)],
+):
+    """Logs the session out: its refresh tokens stop working and its access
+    tokens are rejected by every worker."""
+    await crud.revoke_refresh_token(session, payload.refresh_token)
+
+@router.get("/.well-known/jwks.json")
+async def get_jwks() -> dict:
+    """Public keys for verifying access tokens without the shared secret."""
+    return get_token_service().jwks()
+
 
-@router.get('/users/<username>')
-async def get_user(session: Annotated[AsyncSession, Depends(get_db)], username: str) -> User:
+@router.get('/users/{username}')
+async def get_user(session: Annotated[AsyncSession, Depends(get_read_db)], username: str) -> User:
     user = await crud.get_user_by_username(session, username)
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
     return user
 
 @router.get('/users')
-async def get_users(session: Annotated[AsyncSession, Depends(get_db)]) -> list[User]:
-    users = await crud.get_users(session)
+async def get_users(
+    session: Annotated[AsyncSession, Depends(get_read_db)],
+    response: Response,
+    limit: Annotated[int, Query(ge=1, le=1000)] = 100,
+    after: Annotated[str | None, Query(description="Cursor: X-Next-Cursor of the previous page")] = None,
+    prefix: Annotated[str | None, Query(description="Only usernames starting with this")] = None,
+) -> list[User]:
+    # The cursor is the last username, percent-encoded: headers are latin-1.
+    if after is not None:
+        after = unquote(after)
+    users = await crud.get_users(session, limit=limit + 1, after=after, prefix=prefix)
+    if len(users) > limit:
+        users = users[:limit]
+        response.headers["X-Next-Cursor"] = quote(users[-1].username, safe="")
     return users
\ No newline at end of file
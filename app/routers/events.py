@@ -0,0 +1,85 @@
+import json
+from typing import Annotated
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, WebSocket, WebSocketDisconnect, status
+from fastapi.responses import StreamingResponse
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.depenndencies import authenticate_token, get_current_user, get_db
+from app.events import Subscription
+from app.models import User
+from app.resources import get_resources
+
+router = APIRouter(tags=["Events"], prefix="/events")
+
+HEARTBEAT_SECONDS = 15.0
+RESYNC_EVENT = {"op": "resync"}
+
+
+async def _next_event(subscription: Subscription) -> dict | None:
+    """Next event for the connection, a resync notice if events were
+    dropped, or None when nothing happened within the heartbeat period."""
+    if subscription.overflowed and subscription.queue.empty():
+        subscription.overflowed = False
+        return RESYNC_EVENT
+    return await subscription.get(timeout=HEARTBEAT_SECONDS)
+
+
+@router.get("/stream")
+async def stream_events(
+    request: Request,
+    current_user: Annotated[User, Depends(get_current_user)],
+):
+    """Server-Sent Events with task and ACL changes the caller can see.
+
+    After a ``resync`` event the client should catch up via /tasks/changes.
+    """
+    event_bus = get_resources().event_bus
+    subscription = event_bus.subscribe(current_user.id)
+
+    async def events():
+        try:
+            while not await request.is_disconnected():
+                event = await _next_event(subscription)
+                if event is None:
+                    yield ": keepalive\n\n"
+                else:
+                    yield f"event: {event['op']}\ndata: {json.dumps(event)}\n\n"
+        finally:
+            event_bus.unsubscribe(subscription)
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+@router.websocket("/ws")
+async def websocket_events(
+    websocket: WebSocket,
+    session: Annotated[AsyncSession, Depends(get_db)],
+    token: Annotated[str, Query()],
+):
+    """WebSocket variant of /events/stream; browsers cannot set headers on
+    a WebSocket, so the access token is passed as a query parameter."""
+    try:
+        current_user = await authenticate_token(token, session)
+    except HTTPException:
+        await websocket.close(code=status.WS_1008_POLICY_VIOLATION)
+        return
+    finally:
+        await session.close()
+
+    await websocket.accept()
+    event_bus = get_resources().event_bus
+    subscription = event_bus.subscribe(current_user.id)
+    try:
+        while True:
+            event = await _next_event(subscription)
+            if event is None:
+                await websocket.send_json({"op": "ping"})
+            else:
+                await websocket.send_json(event)
+    except WebSocketDisconnect:
+        pass
+    finally:
+        event_bus.unsubscribe(subscription)
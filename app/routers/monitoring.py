@@ -0,0 +1,30 @@
+from fastapi import APIRouter
+from fastapi.responses import PlainTextResponse
+from app.database import get_pool_stats
+from app.resources import get_resources
+
+router = APIRouter(tags=["Monitoring"], prefix="/metrics")
+
+
+@router.get("", response_class=PlainTextResponse)
+async def get_metrics() -> str:
+    """Per-route request metrics in the Prometheus text format."""
+    return get_resources().request_metrics.render()
+
+
+@router.get("/pools")
+async def get_pools_stats() -> dict:
+    resources = get_resources()
+    event_bus = resources.event_bus
+    return {
+        "database": get_pool_stats(resources.engine),
+        "replica": (
+            get_pool_stats(resources.replica_engine)
+            if resources.replica_engine is not None
+            else None
+        ),
+        "password_hasher": resources.password_hasher.stats(),
+        "response_cache": resources.response_cache.stats(),
+        "jobs": resources.job_queue.stats(),
+        "events": {"backend": event_bus.backend, "connections": event_bus.connections},
+    }
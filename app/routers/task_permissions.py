@@ -1,18 +1,29 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Body, Depends, Header, HTTPException, Response, status
+from fastapi.responses import ORJSONResponse
 from sqlalchemy.ext.asyncio import AsyncSession
 from app import crud, schemas
-from app.depenndencies import get_db, get_current_user
+from app.depenndencies import get_db, get_current_user, get_read_db
 from typing import Annotated
 from app.models import User
+from app.utils.etags import collection_etag, etag_matches
 
-router = APIRouter(tags=["Permissions"], prefix="/tasks/{task_id}")
+router = APIRouter(
+    tags=["Permissions"], prefix="/tasks/{task_id}", default_response_class=ORJSONResponse
+)
 
 
 @router.get("/permissions", response_model=list[schemas.TaskPermission])
 async def get_task_permissions(
-    task_id: int, session: Annotated[AsyncSession, Depends(get_db)]
+    task_id: int,
+    response: Response,
+    session: Annotated[AsyncSession, Depends(get_read_db)],
+    if_none_match: Annotated[str | None, Header()] = None,
 ):
     permissions = await crud.get_task_permissions(session=session, task_id=task_id)
+    etag = collection_etag(permissions)
+    if etag_matches(if_none_match, etag):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers={"ETag": etag})
+    response.headers["ETag"] = etag
     return permissions
 
 
@@ -37,6 +48,43 @@ async def create_task_permission(
     )
 
 
+@router.post("/permissions/bulk", response_model=list[schemas.TaskPermission])
+async def bulk_update_task_permissions(
+    task_id: int,
+    payload: schemas.TaskPermissionBulk,
+    session: Annotated[AsyncSession, Depends(get_db)],
+    current_user: Annotated[User, Depends(get_current_user)],
+):
+    db_task = await crud.get_task(session=session, task_id=task_id)
+    if not db_task:
+        raise HTTPException(status_code=404, detail="Task not found")
+    if db_task.owner_id != current_user.id:
+        raise HTTPException(status_code=403, detail="Not enough permissions")
+    return await crud.upsert_task_permissions(
+        session=session, task_id=task_id, grants=payload.grants, revoke=payload.revoke
+    )
+
+
+@router.put("/permissions", response_model=list[schemas.TaskPermission])
+async def replace_task_permissions(
+    task_id: int,
+    permissions: Annotated[
+        list[schemas.TaskPermissionCreate],
+        Body(max_length=schemas.BULK_MAX_ITEMS),
+    ],
+    session: Annotated[AsyncSession, Depends(get_db)],
+    current_user: Annotated[User, Depends(get_current_user)],
+):
+    db_task = await crud.get_task(session=session, task_id=task_id)
+    if not db_task:
+        raise HTTPException(status_code=404, detail="Task not found")
+    if db_task.owner_id != current_user.id:
+        raise HTTPException(status_code=403, detail="Not enough permissions")
+    return await crud.upsert_task_permissions(
+        session=session, task_id=task_id, grants=permissions, replace=True
+    )
+
+
 @router.patch("/permissions/{user_id}", response_model=schemas.TaskPermission)
 async def update_task_permission(
     task_id: int,
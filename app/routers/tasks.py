@@ -1,11 +1,16 @@
 from typing import Annotated
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Body, Depends, Header, HTTPException, Query, Response, status
+from fastapi.responses import ORJSONResponse, StreamingResponse
 from sqlalchemy.ext.asyncio import AsyncSession
 from app import crud, schemas
-from app.depenndencies import get_db, get_current_user
+from app.depenndencies import get_db, get_current_user, get_user_read_db
 from app.models import User
+from app.utils.etags import collection_etag, etag_matches, expected_version, task_etag
+from app.utils.serialization import dump_task_row, dump_task_rows
 
-router = APIRouter(tags=["Tasks"], prefix="/tasks")
+router = APIRouter(
+    tags=["Tasks"], prefix="/tasks", default_response_class=ORJSONResponse
+)
 
 
 @router.post("/", response_model=schemas.Task, status_code=status.HTTP_201_CREATED)
@@ -17,29 +22,205 @@ async def create_task(
     return await crud.create_task(session=session, task=task, user_id=current_user.id)
 
 
-@router.get("/", response_model=list[schemas.Task])
+@router.get(
+    "/",
+    response_model=list[schemas.Task],
+    responses={
+        200: {
+            "headers": {
+                "X-Next-Cursor": {
+                    "description": "Pass as `after` for the next page; absent on the last one",
+                    "schema": {"type": "string"},
+                }
+            }
+        }
+    },
+)
 async def read_tasks(
+    session: Annotated[AsyncSession, Depends(get_user_read_db)],
+    current_user: Annotated[User, Depends(get_current_user)],
+    limit: Annotated[int, Query(ge=1, le=1000)] = 100,
+    after: Annotated[int | None, Query(description="Cursor: id of the last task seen")] = None,
+    stream: Annotated[bool, Query(description="Stream every visible task as NDJSON")] = False,
+    if_none_match: Annotated[str | None, Header()] = None,
+):
+    """Tasks the caller can read, in id order, at most ``limit`` (100 by
+    default) per page. While more remain, the response carries the
+    ``X-Next-Cursor`` header; request the next page with ``after`` set to
+    it. ``stream=true`` returns every task as NDJSON instead."""
+    if stream:
+        return StreamingResponse(
+            _ndjson_tasks(session, current_user.id, after),
+            media_type="application/x-ndjson",
+        )
+
+    rows = await crud.get_task_rows(
+        session=session, user_id=current_user.id, limit=limit + 1, after=after
+    )
+    # Computed over the extra row as well, so the tag also covers the cursor.
+    etag = collection_etag(rows)
+    if etag_matches(if_none_match, etag):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers={"ETag": etag})
+    headers = {"ETag": etag}
+    if len(rows) > limit:
+        rows = rows[:limit]
+        headers["X-Next-Cursor"] = str(rows[-1].id)
+    # Rows are dumped directly: no ORM objects, no response_model validation.
+    return Response(
+        content=dump_task_rows(rows), media_type="application/json", headers=headers
+    )
+
+
+async def _ndjson_tasks(session: AsyncSession, user_id: int, after: int | None):
+    async for row in crud.stream_tasks(session=session, user_id=user_id, after=after):
+        yield dump_task_row(row) + b"\n"
+
+
+@router.get("/changes", response_model=schemas.TaskChanges)
+async def read_task_changes(
+    session: Annotated[AsyncSession, Depends(get_user_read_db)],
+    current_user: Annotated[User, Depends(get_current_user)],
+    since: Annotated[
+        int | None,
+        Query(description="Cursor from the previous call; omit to get the current one"),
+    ] = None,
+    limit: Annotated[int, Query(ge=1, le=1000)] = 500,
+):
+    if since is None:
+        cursor = await crud.get_latest_change_cursor(session=session)
+        return schemas.TaskChanges(upserts=[], deleted=[], cursor=cursor, has_more=False)
+    return await crud.get_task_changes(
+        session=session, user_id=current_user.id, since=since, limit=limit
+    )
+
+
+@router.get("/search", response_model=list[schemas.Task])
+async def search_tasks(
+    q: Annotated[str, Query(min_length=1, max_length=200)],
+    session: Annotated[AsyncSession, Depends(get_user_read_db)],
+    current_user: Annotated[User, Depends(get_current_user)],
+    limit: Annotated[int, Query(ge=1, le=100)] = 20,
+):
+    return await crud.search_tasks(
+        session=session, user_id=current_user.id, query=q, limit=limit
+    )
+
+
+@router.post(
+    "/bulk",
+    response_model=list[schemas.TaskBulkResult],
+    status_code=status.HTTP_201_CREATED,
+)
+async def create_tasks(
+    tasks: Annotated[
+        list[schemas.TaskCreate],
+        Body(min_length=1, max_length=schemas.BULK_MAX_ITEMS),
+    ],
+    session: Annotated[AsyncSession, Depends(get_db)],
+    current_user: Annotated[User, Depends(get_current_user)],
+):
+    new_tasks = await crud.create_tasks(
+        session=session, tasks=tasks, user_id=current_user.id
+    )
+    return [
+        schemas.TaskBulkResult(id=task.id, status=status.HTTP_201_CREATED, task=task)
+        for task in new_tasks
+    ]
+
+
+@router.patch("/bulk", response_model=list[schemas.TaskBulkResult])
+async def update_tasks(
+    items: Annotated[
+        list[schemas.TaskBulkUpdateItem],
+        Body(min_length=1, max_length=schemas.BULK_MAX_ITEMS),
+    ],
+    session: Annotated[AsyncSession, Depends(get_db)],
+    current_user: Annotated[User, Depends(get_current_user)],
+):
+    return await crud.update_tasks(session=session, items=items, user_id=current_user.id)
+
+
+@router.delete("/bulk", response_model=list[schemas.TaskBulkResult])
+async def delete_tasks(
+    payload: schemas.TaskBulkDelete,
+    session: Annotated[AsyncSession, Depends(get_db)],
+    current_user: Annotated[User, Depends(get_current_user)],
+):
+    return await crud.delete_tasks(
+        session=session, task_ids=payload.ids, user_id=current_user.id
+    )
+
+
+@router.delete("/", status_code=status.HTTP_202_ACCEPTED, response_model=schemas.Operation)
+async def delete_all_tasks(
+    response: Response,
     session: Annotated[AsyncSession, Depends(get_db)],
     current_user: Annotated[User, Depends(get_current_user)],
 ):
-    return await crud.get_tasks(session=session, user_id=current_user.id)
+    """Deletes every task of the caller in the background, in chunks; poll
+    the returned operation for progress."""
+    operation = await crud.start_task_deletion(session=session, user_id=current_user.id)
+    response.headers["Location"] = f"/tasks/operations/{operation.id}"
+    return operation
+
+
+@router.get("/operations/{operation_id}", response_model=schemas.Operation)
+async def read_operation(
+    operation_id: int,
+    session: Annotated[AsyncSession, Depends(get_db)],
+    current_user: Annotated[User, Depends(get_current_user)],
+):
+    return await crud.get_operation(
+        session=session, operation_id=operation_id, user_id=current_user.id
+    )
 
 
 @router.get("/{task_id}", response_model=schemas.Task)
 async def read_task(
     task_id: int,
-    session: Annotated[AsyncSession, Depends(get_db)],
+    response: Response,
+    session: Annotated[AsyncSession, Depends(get_user_read_db)],
     current_user: Annotated[User, Depends(get_current_user)],
+    if_none_match: Annotated[str | None, Header()] = None,
 ):
-    db_task = await crud.get_task(session=session, task_id=task_id)
+    db_task, can_read, _ = await crud.get_task_access(
+        session=session, task_id=task_id, user_id=current_user.id
+    )
     if not db_task:
         raise HTTPException(status_code=404, detail="Task not found")
-    if db_task.owner_id != current_user.id:
-        permission = await crud.get_user_task_permissions(
-            session=session, task_id=task_id, user_id=current_user.id
-        )
-        if not permission or not permission.can_read:
-            raise HTTPException(status_code=403, detail="Not enough permissions")
+    if not can_read:
+        raise HTTPException(status_code=403, detail="Not enough permissions")
+    etag = task_etag(db_task)
+    if etag_matches(if_none_match, etag):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers={"ETag": etag})
+    response.headers["ETag"] = etag
+    return db_task
+
+
+async def _update_task(
+    task_id: int,
+    task: schemas.TaskCreate | schemas.TaskUpdate,
+    response: Response,
+    session: AsyncSession,
+    current_user: User,
+    if_match: str | None,
+    is_partial_update: bool,
+):
+    version = None
+    if if_match is not None:
+        try:
+            version = expected_version(if_match, task_id)
+        except ValueError:
+            raise HTTPException(status_code=412, detail="Task has been modified")
+    db_task = await crud.check_permissions_and_update_task(
+        session=session,
+        task_id=task_id,
+        task_data=task,
+        current_user=current_user,
+        is_partial_update=is_partial_update,
+        expected_version=version,
+    )
+    response.headers["ETag"] = task_etag(db_task)
     return db_task
 
 
@@ -47,15 +228,13 @@ async def read_task(
 async def update_task(
     task_id: int,
     task: schemas.TaskCreate,
+    response: Response,
     session: Annotated[AsyncSession, Depends(get_db)],
     current_user: Annotated[User, Depends(get_current_user)],
+    if_match: Annotated[str | None, Header()] = None,
 ):
-    return await crud.check_permissions_and_update_task(
-        session=session,
-        task_id=task_id,
-        task_data=task,
-        current_user=current_user,
-        is_partial_update=False,
+    return await _update_task(
+        task_id, task, response, session, current_user, if_match, is_partial_update=False
     )
 
 
@@ -63,15 +242,13 @@ async def update_task(
 async def partial_update_task(
     task_id: int,
     task: schemas.TaskUpdate,
+    response: Response,
     session: Annotated[AsyncSession, Depends(get_db)],
     current_user: Annotated[User, Depends(get_current_user)],
+    if_match: Annotated[str | None, Header()] = None,
 ):
-    return await crud.check_permissions_and_update_task(
-        session=session,
-        task_id=task_id,
-        task_data=task,
-        current_user=current_user,
-        is_partial_update=True,
+    return await _update_task(
+        task_id, task, response, session, current_user, if_match, is_partial_update=True
     )
 
 
@@ -81,10 +258,12 @@ async def delete_task(
     session: Annotated[AsyncSession, Depends(get_db)],
     current_user: Annotated[User, Depends(get_current_user)],
 ):
-    db_task = await crud.get_task(session=session, task_id=task_id)
-    if not db_task:
-        raise HTTPException(status_code=404, detail="Task not found")
-    if db_task.owner_id != current_user.id:
+    deleted = await crud.delete_owned_task(
+        session=session, task_id=task_id, user_id=current_user.id
+    )
+    if not deleted:
+        db_task = await crud.get_task(session=session, task_id=task_id)
+        if not db_task:
+            raise HTTPException(status_code=404, detail="Task not found")
         raise HTTPException(status_code=403, detail="Not enough permissions")
-    await crud.delete_task(session=session, task_id=task_id)
     return None
@@ -1,4 +1,6 @@
-from pydantic import BaseModel, ConfigDict
+from pydantic import BaseModel, ConfigDict, Field
+
+BULK_MAX_ITEMS = 1000
 
 class UserCreate(BaseModel):
     username: str
@@ -31,8 +33,39 @@ class Task(TaskBase):
     id: int
     owner_id: int
 
+
+class TaskChanges(BaseModel):
+    upserts: list[Task]
+    deleted: list[int]
+    cursor: int
+    has_more: bool
+
+
+class TaskBulkUpdateItem(TaskUpdate):
+    id: int
+
+
+class TaskBulkDelete(BaseModel):
+    ids: list[int] = Field(min_length=1, max_length=BULK_MAX_ITEMS)
+
+
+class TaskBulkResult(BaseModel):
+    id: int
+    status: int
+    detail: str | None = None
+    task: Task | None = None
     
 
+class Operation(BaseModel):
+    model_config = ConfigDict(from_attributes=True)
+
+    id: int
+    kind: str
+    status: str
+    total: int
+    done: int
+
+
 class TaskPermissionBase(BaseModel):
     user_id: int
     can_read: bool
@@ -54,9 +87,21 @@ class TaskPermissionUpdate(BaseModel):
     model_config = ConfigDict(from_attributes=True)
 
 
+class TaskPermissionBulk(BaseModel):
+    grants: list[TaskPermissionCreate] = Field(
+        default_factory=list, max_length=BULK_MAX_ITEMS
+    )
+    revoke: list[int] = Field(default_factory=list, max_length=BULK_MAX_ITEMS)
+
+
 class Token(BaseModel):
     access_token: str
     token_type: str
+    refresh_token: str | None = None
+
+
+class RefreshTokenRequest(BaseModel):
+    refresh_token: str
 
 
 class TokenData(BaseModel):
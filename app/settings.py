@@ -0,0 +1,110 @@
+import os
+import types
+from dataclasses import dataclass, fields
+from functools import cache
+from typing import Mapping
+
+from dotenv import load_dotenv
+
+
+def parse_bool(value: str) -> bool:
+    return value.lower() in ("1", "true", "yes")
+
+
+_PARSERS = {bool: parse_bool, int: int, float: float, str: str}
+
+
+@dataclass(frozen=True)
+class Settings:
+    """Configuration of the application. Every field is read from the
+    environment variable of the same name in upper case."""
+
+    database_url: str | None = None
+    # Optional read-only replica for safe reads; unset means "read from primary".
+    database_replica_url: str | None = None
+
+    secret_key: str | None = None
+    algorithm: str = "HS256"
+    access_token_expire_minutes: int = 15
+    refresh_token_expire_days: int = 30
+    # Seconds between deletions of expired and revoked refresh tokens; 0 = never.
+    refresh_token_purge_interval: float = 3600
+    jwt_keys_file: str | None = None
+    token_cache_size: int = 10_000
+    token_trust_user_id: bool = False
+
+    bcrypt_rounds: int = 12
+    password_hash_executor: str = "thread"
+    password_hash_workers: int | None = None
+    password_hash_concurrency: int | None = None
+    principal_cache_size: int = 10_000
+    principal_cache_ttl: float = 60
+    read_your_writes_seconds: float = 5
+
+    db_pool_size: int = 5
+    db_max_overflow: int = 10
+    db_pool_timeout: float = 30
+    db_pool_recycle: int = -1
+    db_pool_pre_ping: bool = False
+    db_statement_cache_size: int = 100
+    # PgBouncer in transaction mode hands every transaction a different server
+    # connection, so prepared statements must not be cached or reused by name.
+    db_pgbouncer: bool = False
+    db_echo: bool = False
+    # Refuse to start unless the database is at the migration head of this code.
+    db_schema_check: bool = True
+    # Open the whole pool and run the hot queries once before serving traffic.
+    db_warmup: bool = False
+
+    events_backend: str = "local"
+    events_queue_size: int = 100
+
+    slow_query_ms: float = 200
+
+    rate_limit_enabled: bool = True
+    rate_limit_backend: str = "memory"
+    rate_limit_redis_url: str = "redis://localhost:6379/0"
+    rate_limit_default: str = "600/minute"
+    # Login and registration pay for a bcrypt hash on every attempt.
+    rate_limit_auth: str = "10/minute"
+    # Only enable behind a proxy that overwrites X-Forwarded-For.
+    rate_limit_trust_forwarded: bool = False
+
+    # Worker processes, as uvicorn and gunicorn read it; the memory response
+    # cache refuses to run in several workers without a way to invalidate them.
+    web_concurrency: int = 1
+
+    response_cache_backend: str = "memory"
+    response_cache_ttl: float = 60
+    response_cache_size: int = 10_000
+    response_cache_redis_url: str = "redis://localhost:6379/0"
+
+    jobs_concurrency: int = 4
+    jobs_max_attempts: int = 5
+    jobs_retry_backoff: float = 2
+    jobs_poll_interval: float = 5
+    jobs_lease_seconds: float = 60
+    jobs_drain_timeout: float = 10
+
+    @classmethod
+    def from_env(cls, environ: Mapping[str, str]) -> "Settings":
+        """Builds settings from ``environ``; empty values count as unset."""
+        values = {}
+        for field in fields(cls):
+            raw = environ.get(field.name.upper())
+            if not raw:
+                continue
+            kind = field.type
+            if isinstance(kind, types.UnionType):
+                # "X | None": parse as X.
+                kind = next(arg for arg in kind.__args__ if arg is not type(None))
+            values[field.name] = _PARSERS[kind](raw)
+        return cls(**values)
+
+
+@cache
+def get_settings() -> Settings:
+    """Settings of this process, read from the environment and ``.env`` on
+    first use."""
+    load_dotenv()
+    return Settings.from_env(os.environ)
@@ -10,7 +10,7 @@ TEST_DATABASE_URL = "sqlite+aiosqlite:///./test.db"
 
 test_engine = create_async_engine(TEST_DATABASE_URL, echo=False)
 TestSessionLocal = async_sessionmaker(
-    autocommit=False, autoflush=False, bind=test_engine
+    autocommit=False, autoflush=False, expire_on_commit=False, bind=test_engine
 )
 
 
@@ -34,6 +34,10 @@ async def client(session: AsyncSession):
             await session.close()
 
     app.dependency_overrides[get_db] = override_get_db
+    resources = app.state.resources
+    resources.principal_cache.clear()
+    resources.rate_limit_store.clear()
+    await resources.response_cache.clear()
 
     async with AsyncClient(app=app, base_url="http://test") as ac:
         yield ac
@@ -0,0 +1,88 @@
+import subprocess
+import sys
+
+import pytest
+from httpx import AsyncClient
+
+from app.main import create_app
+from app.models import Base
+from app.settings import Settings
+
+
+def test_settings_from_env():
+    settings = Settings.from_env(
+        {
+            "DATABASE_URL": "sqlite+aiosqlite://",
+            "DB_POOL_SIZE": "20",
+            "DB_WARMUP": "true",
+            "RATE_LIMIT_ENABLED": "false",
+            "PRINCIPAL_CACHE_TTL": "2.5",
+            "PASSWORD_HASH_WORKERS": "3",
+            "PASSWORD_HASH_CONCURRENCY": "",
+        }
+    )
+    assert settings.database_url == "sqlite+aiosqlite://"
+    assert settings.db_pool_size == 20
+    assert settings.db_warmup is True
+    assert settings.rate_limit_enabled is False
+    assert settings.principal_cache_ttl == 2.5
+    assert settings.password_hash_workers == 3
+    assert settings.password_hash_concurrency is None
+    assert settings.db_schema_check is True
+
+
+def test_importing_main_is_cheap():
+    # A fresh interpreter: this one has imported everything already.
+    result = subprocess.run(
+        [
+            sys.executable,
+            "-c",
+            "import sys, app.main; "
+            "print([m for m in ('fastapi', 'sqlalchemy', 'passlib', 'aiosqlite') if m in sys.modules])",
+        ],
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    assert result.stdout.strip() == "[]"
+
+
+
+@pytest.mark.asyncio
+async def test_apps_with_own_settings_are_isolated(tmp_path):
+    apps = [
+        create_app(
+            Settings(
+                database_url=f"sqlite+aiosqlite:///{tmp_path}/{name}.db",
+                secret_key=name,
+                bcrypt_rounds=4,
+                rate_limit_auth="1/minute",
+            )
+        )
+        for name in ("first", "second")
+    ]
+    first, second = (app.state.resources for app in apps)
+    try:
+        for resources in (first, second):
+            async with resources.engine.begin() as conn:
+                await conn.run_sync(Base.metadata.create_all)
+
+        user_data = {"username": "testuser", "password": "testpassword"}
+        async with AsyncClient(app=apps[0], base_url="http://test") as client:
+            await client.post("/register", json=user_data)
+            token = (await client.post("/token", data=user_data)).json()["access_token"]
+            headers = {"Authorization": f"Bearer {token}"}
+            assert (await client.get("/tasks/", headers=headers)).status_code == 200
+            # Its own auth budget, already spent by the first login.
+            assert (await client.post("/token", data=user_data)).status_code == 429
+
+        async with AsyncClient(app=apps[1], base_url="http://test") as client:
+            # Signed with the other app's key, for a user only its database has.
+            assert (await client.get("/tasks/", headers=headers)).status_code == 401
+            assert (await client.post("/register", json=user_data)).status_code == 201
+
+        assert "testuser" in first.principal_cache
+        assert "testuser" not in second.principal_cache
+    finally:
+        for resources in (first, second):
+            await resources.dispose()
@@ -0,0 +1,56 @@
+import json
+import os
+import subprocess
+import sys
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[2]
+
+
+def _loadtest(tmp_path, *args, check=True):
+    env = {
+        key: value
+        for key, value in os.environ.items()
+        if not key.startswith("RATE_LIMIT_")
+    }
+    env.update(
+        DATABASE_URL=f"sqlite+aiosqlite:///{tmp_path / 'bench.db'}",
+        BCRYPT_ROUNDS="4",
+    )
+    return subprocess.run(
+        [
+            sys.executable, "-m", "benchmarks.loadtest",
+            "--users", "3", "--tasks", "30", "--permissions", "5",
+            "--requests", "10", "--login-requests", "15", "--concurrency", "2",
+            *args,
+        ],
+        cwd=ROOT,
+        env=env,
+        capture_output=True,
+        text=True,
+        check=check,
+    )
+
+
+def test_loadtest_smoke(tmp_path):
+    output = tmp_path / "results.json"
+    _loadtest(tmp_path, "--output", str(output))
+    results = json.loads(output.read_text())["results"]
+    assert [item["endpoint"] for item in results] == [
+        "POST /token",
+        "GET /tasks/",
+        "PATCH /tasks/{id}",
+        "POST /tasks/{id}/permissions/bulk",
+    ]
+    # More logins than the default /token budget allows.
+    assert all(item["errors"] == 0 for item in results)
+
+
+def test_loadtest_seeds_existing_data_only_with_reset(tmp_path):
+    _loadtest(tmp_path, "--requests", "1", "--login-requests", "1")
+
+    result = _loadtest(tmp_path, check=False)
+    assert result.returncode != 0
+    assert "--reset" in result.stderr
+
+    _loadtest(tmp_path, "--reset", "--requests", "1", "--login-requests", "1")
@@ -0,0 +1,245 @@
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+from httpx import AsyncClient
+from sqlalchemy import update
+
+from app import crud
+from app.events import EventBus
+from app.instrumentation import assert_max_queries
+from app.models import TaskPermission
+from app.resources import get_resources
+from app.settings import Settings
+from app.utils.cache import (
+    GenerationalCache,
+    MemoryBackend,
+    SharedBackend,
+    create_response_cache,
+)
+
+
+class FakePipeline:
+    def __init__(self, client):
+        self.client = client
+        self.commands = []
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        return False
+
+    def set(self, key, value, ex=None):
+        self.commands.append((key, value))
+
+    async def execute(self):
+        self.client.round_trips += 1
+        for key, value in self.commands:
+            self.client.data[key] = value
+
+
+class FakeRedis:
+    """Just enough of redis.asyncio for SharedBackend."""
+
+    def __init__(self):
+        self.data = {}
+        self.round_trips = 0
+
+    def pipeline(self, transaction=True):
+        return FakePipeline(self)
+
+    async def mget(self, keys):
+        return [self.data.get(key) for key in keys]
+
+    async def delete(self, *keys):
+        for key in keys:
+            self.data.pop(key, None)
+
+    async def incr(self, key):
+        self.data[key] = int(self.data.get(key, 0)) + 1
+        return self.data[key]
+
+    async def scan_iter(self, match):
+        prefix = match.rstrip("*")
+        for key in list(self.data):
+            if key.startswith(prefix):
+                yield key
+
+
+@pytest.fixture(params=["memory", "shared"])
+def cache(request):
+    if request.param == "memory":
+        return GenerationalCache(MemoryBackend())
+    return GenerationalCache(SharedBackend(FakeRedis()))
+
+
+@pytest.mark.asyncio
+async def test_generational_cache_hit_and_invalidate(cache):
+    generations = await cache.reserve(["task:1"])
+    await cache.set_many({"task:1": {"title": "Задача"}}, generations)
+    assert await cache.get_many(["task:1", "task:2"]) == {"task:1": {"title": "Задача"}}
+
+    await cache.invalidate(["task:1"])
+    assert await cache.get_many(["task:1"]) == {}
+
+
+@pytest.mark.asyncio
+async def test_generational_cache_ignores_fill_older_than_invalidation(cache):
+    # A reader loads the old value, a writer commits and invalidates, and
+    # only then does the reader store what it loaded.
+    generations = await cache.reserve(["acl:1"])
+    await cache.invalidate(["acl:1"])
+    await cache.set_many({"acl:1": [{"user_id": 2, "can_read": True}]}, generations)
+
+    assert await cache.get_many(["acl:1"]) == {}
+
+
+@pytest.mark.asyncio
+async def test_shared_backend_fills_in_one_round_trip():
+    client = FakeRedis()
+    cache = GenerationalCache(SharedBackend(client))
+    generations = await cache.reserve(["task:1", "acl:1"])
+    client.round_trips = 0
+    await cache.set_many({"task:1": {"title": "Задача"}, "acl:1": []}, generations)
+    assert client.round_trips == 1
+    assert await cache.get_many(["task:1", "acl:1"]) == {
+        "task:1": {"title": "Задача"},
+        "acl:1": [],
+    }
+
+
+@pytest.mark.asyncio
+async def test_generational_cache_clear(cache):
+    generations = await cache.reserve(["task:1"])
+    await cache.set_many({"task:1": {"title": "Задача"}}, generations)
+    await cache.clear()
+    assert await cache.get_many(["task:1"]) == {}
+
+    generations = await cache.reserve(["task:1"])
+    await cache.set_many({"task:1": {"title": "Задача"}}, generations)
+    assert await cache.get_many(["task:1"]) == {"task:1": {"title": "Задача"}}
+
+
+@pytest.mark.asyncio
+async def test_invalidations_reach_other_workers():
+    # Two workers with their own memory cache, joined by LISTEN/NOTIFY.
+    writer_bus, reader_bus = EventBus("postgres"), EventBus("postgres")
+    writer = GenerationalCache(MemoryBackend(), bus=writer_bus)
+    reader = GenerationalCache(MemoryBackend(), bus=reader_bus)
+    generations = await reader.reserve(["task:1"])
+    await reader.set_many({"task:1": {"title": "Задача"}}, generations)
+
+    session = SimpleNamespace(info={})
+    writer.stage(session, ["task:1"])
+    # What the writer's commit NOTIFYs, as the reader's listener receives it.
+    for message in session.info["task_events"]:
+        reader_bus.deliver(message)
+    await asyncio.sleep(0)
+
+    assert await reader.get_many(["task:1"]) == {}
+
+
+def test_memory_cache_needs_a_bus_with_several_workers():
+    with pytest.raises(ValueError, match="EVENTS_BACKEND=postgres"):
+        create_response_cache(Settings(web_concurrency=2))
+
+    bus = EventBus("postgres")
+    cache = create_response_cache(Settings(web_concurrency=2, events_backend="postgres"), bus)
+    assert cache.bus is bus
+    assert create_response_cache(Settings(web_concurrency=2, response_cache_backend="none"))
+
+
+@pytest.mark.asyncio
+async def test_task_access_miss_is_one_query(
+    client: AsyncClient, create_users_and_get_token: str, session
+):
+    headers = {"Authorization": f"Bearer {create_users_and_get_token}"}
+    response = await client.post(
+        "/tasks/", json={"title": "Задача", "description": "Описание"}, headers=headers
+    )
+    task_id = response.json()["id"]
+    await client.post(
+        f"/tasks/{task_id}/permissions",
+        json={"user_id": 2, "can_read": True, "can_update": False},
+        headers=headers,
+    )
+    await get_resources().response_cache.clear()
+
+    with assert_max_queries(1):
+        task, can_read, can_update = await crud.get_task_access(session, task_id, 2)
+    assert (task.title, can_read, can_update) == ("Задача", True, False)
+    with assert_max_queries(0):
+        task, can_read, can_update = await crud.get_task_access(session, task_id, 2)
+    assert (task.title, can_read, can_update) == ("Задача", True, False)
+
+
+@pytest.mark.asyncio
+async def test_failed_update_checks_rights_without_cache(
+    client: AsyncClient, create_users_and_get_token: str, session
+):
+    headers = {"Authorization": f"Bearer {create_users_and_get_token}"}
+    response = await client.post(
+        "/token", data={"username": "testuser2", "password": "testpassword2"}
+    )
+    other_headers = {"Authorization": f"Bearer {response.json()['access_token']}"}
+    response = await client.post(
+        "/tasks/", json={"title": "Задача", "description": "Описание"}, headers=headers
+    )
+    task_id = response.json()["id"]
+    await client.post(
+        f"/tasks/{task_id}/permissions",
+        json={"user_id": 2, "can_read": True, "can_update": True},
+        headers=headers,
+    )
+    assert (await client.get(f"/tasks/{task_id}", headers=other_headers)).status_code == 200
+
+    # Revoked behind the cache's back, e.g. by another worker.
+    await session.execute(update(TaskPermission).values(can_update=False))
+    await session.commit()
+
+    response = await client.patch(
+        f"/tasks/{task_id}", json={"title": "Чужое название"}, headers=other_headers
+    )
+    assert response.status_code == 403
+
+
+@pytest.mark.asyncio
+async def test_revoked_permission_is_not_served_from_cache(
+    client: AsyncClient, create_users_and_get_token: str
+):
+    headers = {"Authorization": f"Bearer {create_users_and_get_token}"}
+    response = await client.post(
+        "/token", data={"username": "testuser2", "password": "testpassword2"}
+    )
+    other_headers = {"Authorization": f"Bearer {response.json()['access_token']}"}
+
+    response = await client.post(
+        "/tasks/", json={"title": "Задача", "description": "Описание"}, headers=headers
+    )
+    task_id = response.json()["id"]
+    await client.post(
+        f"/tasks/{task_id}/permissions",
+        json={"user_id": 2, "can_read": True, "can_update": False},
+        headers=headers,
+    )
+
+    response_cache = get_resources().response_cache
+    hits = response_cache.hits
+    for _ in range(2):
+        response = await client.get(f"/tasks/{task_id}", headers=other_headers)
+        assert response.status_code == 200
+    assert response_cache.hits > hits
+
+    response = await client.delete(f"/tasks/{task_id}/permissions/2", headers=headers)
+    assert response.status_code == 204
+    response = await client.get(f"/tasks/{task_id}", headers=other_headers)
+    assert response.status_code == 403
+
+    await client.put(
+        f"/tasks/{task_id}",
+        json={"title": "Новое название", "description": "Описание"},
+        headers=headers,
+    )
+    response = await client.get(f"/tasks/{task_id}", headers=headers)
+    assert response.json()["title"] == "Новое название"
@@ -0,0 +1,94 @@
+import sqlite3
+
+import pytest
+from alembic import command
+from alembic.config import Config
+from alembic.runtime.migration import MigrationContext
+from alembic.script import ScriptDirectory
+
+from app import crud
+from app.database import (
+    ALEMBIC_DIR,
+    check_schema_version,
+    create_engine,
+    expected_schema_heads,
+    warm_up,
+)
+from app.instrumentation import count_queries
+from app.migrate import INITIAL_REVISION, migrate
+from app.tests.conftest import TEST_DATABASE_URL, test_engine
+
+
+def test_migrations_match_models(tmp_path, monkeypatch):
+    url = f"sqlite+aiosqlite:///{tmp_path / 'migrations.db'}"
+    # alembic/env.py takes the URL from the environment.
+    monkeypatch.setenv("DATABASE_URL", url)
+    config = Config()
+    config.set_main_option("script_location", str(ALEMBIC_DIR))
+    config.set_main_option("sqlalchemy.url", url)
+
+    command.upgrade(config, "head")
+    # Raises when autogenerate finds a difference between models and schema.
+    command.check(config)
+    command.downgrade(config, "base")
+
+
+def test_migrate_stamps_pre_migration_database(tmp_path, monkeypatch):
+    path = tmp_path / "old.db"
+    url = f"sqlite+aiosqlite:///{path}"
+    monkeypatch.setenv("DATABASE_URL", url)
+    config = Config()
+    config.set_main_option("script_location", str(ALEMBIC_DIR))
+    config.set_main_option("sqlalchemy.url", url)
+    # What create_all used to leave: the initial tables, no alembic_version.
+    command.upgrade(config, INITIAL_REVISION)
+    with sqlite3.connect(path) as conn:
+        conn.execute("INSERT INTO users (username, hashed_password) VALUES ('старый', 'x')")
+        conn.execute("DROP TABLE alembic_version")
+
+    migrate(url)
+    migrate(url)
+
+    with sqlite3.connect(path) as conn:
+        assert conn.execute("SELECT version_num FROM alembic_version").fetchall() == [
+            (head,) for head in ScriptDirectory(str(ALEMBIC_DIR)).get_heads()
+        ]
+        assert conn.execute("SELECT username FROM users").fetchall() == [("старый",)]
+
+
+@pytest.mark.asyncio
+async def test_schema_version_check(session):
+    with pytest.raises(RuntimeError, match="alembic upgrade head"):
+        await check_schema_version(test_engine)
+
+    script = ScriptDirectory(str(ALEMBIC_DIR))
+
+    def stamp(sync_conn, revision):
+        MigrationContext.configure(sync_conn).stamp(script, revision)
+
+    try:
+        async with test_engine.begin() as conn:
+            await conn.run_sync(stamp, "head")
+        await check_schema_version(test_engine)
+        assert expected_schema_heads() == frozenset(script.get_heads())
+
+        async with test_engine.begin() as conn:
+            await conn.run_sync(stamp, script.get_revision("head").down_revision)
+        with pytest.raises(RuntimeError):
+            await check_schema_version(test_engine)
+    finally:
+        # drop_all only knows the mapped tables.
+        async with test_engine.begin() as conn:
+            await conn.exec_driver_sql("DROP TABLE IF EXISTS alembic_version")
+
+
+@pytest.mark.asyncio
+async def test_warm_up_opens_whole_pool(session):
+    engine = create_engine(TEST_DATABASE_URL, pool_size=3)
+    try:
+        with count_queries() as stats:
+            await warm_up(engine, crud.warm_up)
+        assert engine.pool.checkedin() == 3
+        assert stats.queries >= 3 * 5
+    finally:
+        await engine.dispose()
@@ -0,0 +1,51 @@
+import pytest
+
+from app.depenndencies import get_read_db, get_user_read_db
+from app.models import User
+from app.resources import get_resources
+
+
+class FakeReplicaSession:
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        return False
+
+
+async def _resolve(dependency, **kwargs):
+    generator = dependency(**kwargs)
+    session = await generator.__anext__()
+    await generator.aclose()
+    return session
+
+
+@pytest.mark.asyncio
+async def test_reads_use_primary_without_replica(monkeypatch):
+    monkeypatch.setattr(get_resources(), "read_session_factory", None)
+    primary = object()
+
+    assert await _resolve(get_read_db, session=primary) is primary
+    assert (
+        await _resolve(get_user_read_db, current_user=User(id=1), session=primary)
+        is primary
+    )
+
+
+@pytest.mark.asyncio
+async def test_reads_go_to_replica_except_after_own_write(monkeypatch):
+    monkeypatch.setattr(get_resources(), "read_session_factory", FakeReplicaSession)
+    recent_writers = get_resources().recent_writers
+    recent_writers.clear()
+    primary = object()
+
+    assert isinstance(await _resolve(get_read_db, session=primary), FakeReplicaSession)
+    session = await _resolve(get_user_read_db, current_user=User(id=1), session=primary)
+    assert isinstance(session, FakeReplicaSession)
+
+    recent_writers.set(1, True)
+    session = await _resolve(get_user_read_db, current_user=User(id=1), session=primary)
+    assert session is primary
+    session = await _resolve(get_user_read_db, current_user=User(id=2), session=primary)
+    assert isinstance(session, FakeReplicaSession)
+    recent_writers.clear()
@@ -0,0 +1,173 @@
+import asyncio
+import logging
+from datetime import timedelta
+
+import pytest
+from httpx import AsyncClient
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import async_sessionmaker
+
+from app import crud
+from app.jobs import JobQueue, purge_refresh_tokens
+from app.models import OutboxJob, RefreshToken
+from app.resources import get_resources
+
+
+@pytest.mark.asyncio
+async def test_task_changes_are_audited_through_outbox(
+    client: AsyncClient, create_user_and_get_token: str, session, caplog, monkeypatch
+):
+    headers = {"Authorization": f"Bearer {create_user_and_get_token}"}
+    response = await client.post(
+        "/tasks/", json={"title": "Задача", "description": "Описание"}, headers=headers
+    )
+    task_id = response.json()["id"]
+
+    jobs = (await session.scalars(select(OutboxJob))).all()
+    assert [(job.kind, job.payload) for job in jobs] == [
+        ("audit", {"op": "create", "task_ids": [task_id]})
+    ]
+
+    job_queue = get_resources().job_queue
+    monkeypatch.setattr(
+        job_queue, "session_factory", async_sessionmaker(session.bind, expire_on_commit=False)
+    )
+    with caplog.at_level(logging.INFO, logger="app.audit"):
+        assert await job_queue.run_pending(wait=True) == 1
+    assert "'op': 'create'" in caplog.text
+    assert (await session.scalars(select(OutboxJob))).all() == []
+
+
+@pytest.mark.asyncio
+async def test_failing_job_is_retried_then_marked_failed(session):
+    queue = JobQueue(max_attempts=2, retry_backoff=0)
+    queue.session_factory = async_sessionmaker(session.bind, expire_on_commit=False)
+    calls = []
+
+    @queue.handler("flaky")
+    async def flaky(payload, job_session):
+        calls.append(payload)
+        raise RuntimeError("Сбой")
+
+    queue.enqueue(session, "flaky", {"n": 1})
+    queue.enqueue(session, "unknown", {"n": 2})
+    await session.commit()
+
+    assert await queue.run_pending(wait=True) == 1
+    job = await session.scalar(select(OutboxJob).execution_options(populate_existing=True))
+    assert (job.status, job.attempts) == ("pending", 1)
+    assert "Сбой" in job.last_error
+
+    assert await queue.run_pending(wait=True) == 1
+    job = await session.scalar(select(OutboxJob).execution_options(populate_existing=True))
+    assert (job.status, job.attempts) == ("failed", 2)
+    assert await queue.run_pending(wait=True) == 0
+    assert len(calls) == 2
+    assert queue.stats()["failed"] == 1
+
+
+@pytest.mark.asyncio
+async def test_drain_waits_for_running_jobs(session):
+    queue = JobQueue(concurrency=1, poll_interval=0.01)
+    finished = []
+
+    @queue.handler("slow")
+    async def slow(payload, job_session):
+        await asyncio.sleep(0.05)
+        finished.append(payload["n"])
+
+    for n in range(3):
+        queue.enqueue(session, "slow", {"n": n})
+    await session.commit()
+
+    await queue.start(async_sessionmaker(session.bind, expire_on_commit=False))
+    while not finished:
+        await asyncio.sleep(0.01)
+    await queue.drain()
+    # The job running at shutdown completed; the rest wait in the outbox.
+    running_at_shutdown = len(finished)
+    remaining = (await session.scalars(select(OutboxJob))).all()
+    assert running_at_shutdown + len(remaining) == 3
+    assert queue.stats()["running"] == 0
+
+
+@pytest.mark.asyncio
+async def test_job_that_lost_its_lease_stops(session):
+    # Leases expire as soon as they are taken.
+    queue = JobQueue(lease_seconds=-1)
+    queue.session_factory = async_sessionmaker(session.bind, expire_on_commit=False)
+    release = asyncio.Event()
+    steps = []
+
+    @queue.handler("long")
+    async def long(payload, job_session):
+        first = not steps
+        steps.append("start")
+        if first:
+            await release.wait()
+        await queue.renew(job_session)
+        await job_session.commit()
+        steps.append("chunk")
+
+    queue.enqueue(session, "long", {})
+    await session.commit()
+
+    slow_run = asyncio.create_task(queue.run_pending(wait=True))
+    while not steps:
+        await asyncio.sleep(0.01)
+    # The lease has expired: a second run claims the job and completes it.
+    assert await queue.run_pending(wait=True) == 1
+    release.set()
+    await slow_run
+
+    assert steps == ["start", "start", "chunk"]
+    assert (await session.scalars(select(OutboxJob))).all() == []
+    assert queue.stats()["succeeded"] == 1
+
+
+@pytest.mark.asyncio
+async def test_periodic_jobs_are_enqueued_when_due(session):
+    queue = JobQueue()
+    queue.session_factory = async_sessionmaker(session.bind, expire_on_commit=False)
+
+    @queue.handler("tick")
+    async def tick(payload, job_session):
+        pass
+
+    queue.every("tick", 3600)
+    queue.every("off", 0)
+    await queue.enqueue_periodic()
+    # Not due again for an hour.
+    await queue.enqueue_periodic()
+
+    jobs = (await session.scalars(select(OutboxJob))).all()
+    assert [(job.kind, job.payload) for job in jobs] == [("tick", {})]
+    assert "purge_refresh_tokens" in get_resources().job_queue.intervals
+
+
+@pytest.mark.asyncio
+async def test_purge_keeps_only_refresh_tokens_still_needed(client: AsyncClient, session):
+    user_data = {"username": "testuser", "password": "testpassword"}
+    await client.post("/register", json=user_data)
+    settings = get_resources().settings
+    lifetime = timedelta(days=settings.refresh_token_expire_days)
+
+    # A live session, rotated once: the rotated token detects reuse.
+    live = (await client.post("/token", data=user_data)).json()["refresh_token"]
+    await client.post("/token/refresh", json={"refresh_token": live})
+    # Revoked just now: its access tokens are still valid and must stay rejected.
+    recent = (await client.post("/token", data=user_data)).json()["refresh_token"]
+    await client.post("/token/revoke", json={"refresh_token": recent})
+    # Revoked, and its last access token has expired since.
+    old, _ = await crud.create_refresh_token(
+        session, 1, lifetime - timedelta(minutes=settings.access_token_expire_minutes + 1)
+    )
+    await crud.revoke_refresh_token(session, old)
+    # Expired.
+    await crud.create_refresh_token(session, 1, timedelta(seconds=-1))
+
+    await purge_refresh_tokens({}, session)
+
+    rows = (await session.scalars(select(RefreshToken))).all()
+    assert len(rows) == 3
+    assert sorted(row.revoked for row in rows) == [False, True, True]
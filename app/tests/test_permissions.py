@@ -1,5 +1,9 @@
 import pytest
 from httpx import AsyncClient
+from sqlalchemy import func, select
+
+from app import crud
+from app.models import TaskChange
 
 @pytest.mark.asyncio
 async def test_get_task_permissions(client: AsyncClient, create_users_and_get_token: str):
@@ -154,3 +158,390 @@ async def test_delete_task_permission(client: AsyncClient, create_users_and_get_
         headers={"Authorization": f"Bearer {token}"}
     )
     assert response.status_code == 404
+
+@pytest.mark.asyncio
+async def test_permissions_apply_to_other_user(client: AsyncClient, create_users_and_get_token: str):
+    token = create_users_and_get_token
+    response = await client.post(
+        "/token", data={"username": "testuser2", "password": "testpassword2"}
+    )
+    assert response.status_code == 200
+    other_token = response.json()["access_token"]
+
+    response = await client.post(
+        "/tasks/",
+        json={"title": "Это тест", "description": "Тестовая задача"},
+        headers={"Authorization": f"Bearer {token}"}
+    )
+    assert response.status_code == 201
+    task_id = response.json()["id"]
+
+    response = await client.get(
+        f"/tasks/{task_id}", headers={"Authorization": f"Bearer {other_token}"}
+    )
+    assert response.status_code == 403
+    response = await client.patch(
+        f"/tasks/{task_id}",
+        json={"title": "Чужое изменение"},
+        headers={"Authorization": f"Bearer {other_token}"}
+    )
+    assert response.status_code == 403
+
+    response = await client.post(
+        f"/tasks/{task_id}/permissions",
+        json={"user_id": 2, "can_read": True, "can_update": False},
+        headers={"Authorization": f"Bearer {token}"})
+    assert response.status_code == 201
+
+    response = await client.get(
+        f"/tasks/{task_id}", headers={"Authorization": f"Bearer {other_token}"}
+    )
+    assert response.status_code == 200
+    response = await client.patch(
+        f"/tasks/{task_id}",
+        json={"title": "Чужое изменение"},
+        headers={"Authorization": f"Bearer {other_token}"}
+    )
+    assert response.status_code == 403
+    response = await client.delete(
+        f"/tasks/{task_id}", headers={"Authorization": f"Bearer {other_token}"}
+    )
+    assert response.status_code == 403
+
+    response = await client.patch(
+        f"/tasks/{task_id}/permissions/2",
+        json={"can_update": True},
+        headers={"Authorization": f"Bearer {token}"}
+    )
+    assert response.status_code == 200
+
+    response = await client.patch(
+        f"/tasks/{task_id}",
+        json={"title": "Чужое изменение"},
+        headers={"Authorization": f"Bearer {other_token}"}
+    )
+    assert response.status_code == 200
+    assert response.json()["title"] == "Чужое изменение"
+    assert response.json()["description"] == "Тестовая задача"
+
+    response = await client.patch(
+        "/tasks/100500",
+        json={"title": "Нет такой задачи"},
+        headers={"Authorization": f"Bearer {other_token}"}
+    )
+    assert response.status_code == 404
+
+@pytest.mark.asyncio
+async def test_bulk_task_permissions(client: AsyncClient, create_users_and_get_token: str):
+    token = create_users_and_get_token
+    response = await client.post(
+        "/register", json={"username": "testuser3", "password": "testpassword3"}
+    )
+    assert response.status_code == 201
+
+    response = await client.post(
+        "/tasks/",
+        json={"title": "Это тест", "description": "Тестовая задача"},
+        headers={"Authorization": f"Bearer {token}"}
+    )
+    assert response.status_code == 201
+    task_id = response.json()["id"]
+
+    response = await client.post(
+        f"/tasks/{task_id}/permissions",
+        json={"user_id": 2, "can_read": True, "can_update": False},
+        headers={"Authorization": f"Bearer {token}"})
+    assert response.status_code == 201
+
+    response = await client.post(
+        f"/tasks/{task_id}/permissions/bulk",
+        json={
+            "grants": [
+                {"user_id": 2, "can_read": True, "can_update": True},
+                {"user_id": 3, "can_read": True, "can_update": False},
+            ],
+        },
+        headers={"Authorization": f"Bearer {token}"}
+    )
+    assert response.status_code == 200
+    data = response.json()
+    assert [(p["user_id"], p["can_update"]) for p in data] == [(2, True), (3, False)]
+
+    response = await client.post(
+        f"/tasks/{task_id}/permissions/bulk",
+        json={"revoke": [2]},
+        headers={"Authorization": f"Bearer {token}"}
+    )
+    assert response.status_code == 200
+
+    response = await client.get(
+        f"/tasks/{task_id}/permissions",
+        headers={"Authorization": f"Bearer {token}"}
+    )
+    assert [p["user_id"] for p in response.json()] == [3]
+
+    response = await client.put(
+        f"/tasks/{task_id}/permissions",
+        json=[{"user_id": 2, "can_read": True, "can_update": False}],
+        headers={"Authorization": f"Bearer {token}"}
+    )
+    assert response.status_code == 200
+
+    response = await client.get(
+        f"/tasks/{task_id}/permissions",
+        headers={"Authorization": f"Bearer {token}"}
+    )
+    permissions = response.json()
+    assert [(p["user_id"], p["can_read"]) for p in permissions] == [(2, True)]
+
+@pytest.mark.asyncio
+async def test_shared_tasks_are_listed(client: AsyncClient, create_users_and_get_token: str):
+    token = create_users_and_get_token
+    response = await client.post(
+        "/token", data={"username": "testuser2", "password": "testpassword2"}
+    )
+    other_token = response.json()["access_token"]
+
+    task_ids = []
+    for owner_token in (token, other_token, token, token):
+        response = await client.post(
+            "/tasks/",
+            json={"title": "Это тест", "description": "Тестовая задача"},
+            headers={"Authorization": f"Bearer {owner_token}"}
+        )
+        assert response.status_code == 201
+        task_ids.append(response.json()["id"])
+
+    response = await client.put(
+        f"/tasks/{task_ids[2]}/permissions",
+        json=[{"user_id": 2, "can_read": True, "can_update": False}],
+        headers={"Authorization": f"Bearer {token}"}
+    )
+    assert response.status_code == 200
+    response = await client.put(
+        f"/tasks/{task_ids[3]}/permissions",
+        json=[{"user_id": 2, "can_read": False, "can_update": False}],
+        headers={"Authorization": f"Bearer {token}"}
+    )
+    assert response.status_code == 200
+
+    response = await client.get(
+        "/tasks/", params={"limit": 1}, headers={"Authorization": f"Bearer {other_token}"}
+    )
+    assert [task["id"] for task in response.json()] == [task_ids[1]]
+    cursor = response.headers["X-Next-Cursor"]
+
+    response = await client.get(
+        "/tasks/",
+        params={"limit": 1, "after": cursor},
+        headers={"Authorization": f"Bearer {other_token}"}
+    )
+    assert [task["id"] for task in response.json()] == [task_ids[2]]
+    assert "X-Next-Cursor" not in response.headers
+
+@pytest.mark.asyncio
+async def test_task_permissions_etag(client: AsyncClient, create_users_and_get_token: str):
+    token = create_users_and_get_token
+    response = await client.post(
+        "/tasks/",
+        json={"title": "Это тест", "description": "Тестовая задача"},
+        headers={"Authorization": f"Bearer {token}"}
+    )
+    task_id = response.json()["id"]
+    response = await client.post(
+        f"/tasks/{task_id}/permissions",
+        json={"user_id": 2, "can_read": True, "can_update": True},
+        headers={"Authorization": f"Bearer {token}"})
+    assert response.status_code == 201
+
+    response = await client.get(
+        f"/tasks/{task_id}/permissions",
+        headers={"Authorization": f"Bearer {token}"}
+    )
+    etag = response.headers["ETag"]
+    response = await client.get(
+        f"/tasks/{task_id}/permissions",
+        headers={"Authorization": f"Bearer {token}", "If-None-Match": etag}
+    )
+    assert response.status_code == 304
+
+    response = await client.patch(
+        f"/tasks/{task_id}/permissions/2",
+        json={"can_update": False},
+        headers={"Authorization": f"Bearer {token}"}
+    )
+    assert response.status_code == 200
+
+    response = await client.get(
+        f"/tasks/{task_id}/permissions",
+        headers={"Authorization": f"Bearer {token}", "If-None-Match": etag}
+    )
+    assert response.status_code == 200
+    assert response.headers["ETag"] != etag
+
+@pytest.mark.asyncio
+async def test_task_changes_feed(client: AsyncClient, create_users_and_get_token: str):
+    token = create_users_and_get_token
+    response = await client.post(
+        "/token", data={"username": "testuser2", "password": "testpassword2"}
+    )
+    other_headers = {"Authorization": f"Bearer {response.json()['access_token']}"}
+    headers = {"Authorization": f"Bearer {token}"}
+
+    response = await client.get("/tasks/changes", headers=other_headers)
+    assert response.status_code == 200
+    cursor = response.json()["cursor"]
+
+    response = await client.post(
+        "/tasks/",
+        json={"title": "Это тест", "description": "Тестовая задача"},
+        headers=headers
+    )
+    task_id = response.json()["id"]
+
+    response = await client.get(
+        "/tasks/changes", params={"since": cursor}, headers=other_headers
+    )
+    data = response.json()
+    assert data["upserts"] == [] and data["deleted"] == []
+
+    await client.post(
+        f"/tasks/{task_id}/permissions",
+        json={"user_id": 2, "can_read": True, "can_update": False},
+        headers=headers)
+    await client.patch(f"/tasks/{task_id}", json={"title": "Обновили"}, headers=headers)
+
+    response = await client.get(
+        "/tasks/changes", params={"since": cursor}, headers=other_headers
+    )
+    data = response.json()
+    assert [task["title"] for task in data["upserts"]] == ["Обновили"]
+    assert data["deleted"] == []
+    cursor = data["cursor"]
+
+    response = await client.delete(f"/tasks/{task_id}/permissions/2", headers=headers)
+    assert response.status_code == 204
+    response = await client.get(
+        "/tasks/changes", params={"since": cursor}, headers=other_headers
+    )
+    data = response.json()
+    assert data["upserts"] == []
+    assert data["deleted"] == [task_id]
+
+    response = await client.get(
+        "/tasks/changes", params={"since": cursor}, headers=headers
+    )
+    assert response.json()["upserts"] == []
+
+    response = await client.delete(f"/tasks/{task_id}", headers=headers)
+    assert response.status_code == 204
+    response = await client.get(
+        "/tasks/changes", params={"since": cursor}, headers=headers
+    )
+    assert response.json()["deleted"] == [task_id]
+
+
+@pytest.mark.asyncio
+async def test_task_changes_are_written_at_commit(session):
+    async def logged():
+        return await session.scalar(select(func.count(TaskChange.id)))
+
+    await crud.log_task_changes(session, [1], "update")
+    # Not before the commit: entries must commit in id order.
+    assert await logged() == 0
+    await session.rollback()
+    await crud._commit(session)
+    assert await logged() == 0
+
+    await crud.log_task_changes(session, [1], "update")
+    await crud._commit(session)
+    assert await logged() == 1
+
+
+@pytest.mark.asyncio
+async def test_bulk_grant_to_unknown_users_is_rejected(
+    client: AsyncClient, create_users_and_get_token: str
+):
+    headers = {"Authorization": f"Bearer {create_users_and_get_token}"}
+    response = await client.post(
+        "/tasks/", json={"title": "Это тест", "description": "Тестовая задача"}, headers=headers
+    )
+    task_id = response.json()["id"]
+
+    response = await client.post(
+        f"/tasks/{task_id}/permissions/bulk",
+        json={
+            "grants": [
+                {"user_id": 2, "can_read": True, "can_update": False},
+                {"user_id": 999, "can_read": True, "can_update": False},
+            ],
+        },
+        headers=headers,
+    )
+    assert response.status_code == 404
+    assert "999" in response.json()["detail"]
+
+    response = await client.put(
+        f"/tasks/{task_id}/permissions",
+        json=[{"user_id": 998, "can_read": True, "can_update": False}],
+        headers=headers,
+    )
+    assert response.status_code == 404
+    # Nothing was granted.
+    response = await client.get(f"/tasks/{task_id}/permissions", headers=headers)
+    assert response.status_code == 404
+
+
+@pytest.mark.asyncio
+async def test_grant_to_unknown_user_is_rejected(
+    client: AsyncClient, create_user_and_get_token: str
+):
+    headers = {"Authorization": f"Bearer {create_user_and_get_token}"}
+    response = await client.post(
+        "/tasks/", json={"title": "Это тест", "description": "Тестовая задача"}, headers=headers
+    )
+    task_id = response.json()["id"]
+
+    response = await client.post(
+        f"/tasks/{task_id}/permissions",
+        json={"user_id": 999, "can_read": True, "can_update": False},
+        headers=headers,
+    )
+    assert response.status_code == 404
+    assert "999" in response.json()["detail"]
+
+
+@pytest.mark.asyncio
+async def test_bulk_update_checks_rights_in_the_update(
+    client: AsyncClient, create_users_and_get_token: str
+):
+    headers = {"Authorization": f"Bearer {create_users_and_get_token}"}
+    response = await client.post(
+        "/token", data={"username": "testuser2", "password": "testpassword2"}
+    )
+    other_headers = {"Authorization": f"Bearer {response.json()['access_token']}"}
+    response = await client.post(
+        "/tasks/bulk",
+        json=[{"title": f"Задача {i}", "description": "Описание"} for i in range(3)],
+        headers=headers,
+    )
+    ids = [item["id"] for item in response.json()]
+    for task_id, can_update in zip(ids, (True, False)):
+        await client.post(
+            f"/tasks/{task_id}/permissions",
+            json={"user_id": 2, "can_read": True, "can_update": can_update},
+            headers=headers,
+        )
+
+    response = await client.patch(
+        "/tasks/bulk",
+        json=[{"id": task_id, "title": "Чужая правка"} for task_id in ids]
+        + [{"id": ids[0]}],
+        headers=other_headers,
+    )
+    results = response.json()
+    assert [item["status"] for item in results] == [200, 403, 403, 200]
+    assert results[0]["task"]["title"] == "Чужая правка"
+
+    response = await client.get(f"/tasks/{ids[1]}", headers=headers)
+    assert response.json()["title"] == "Задача 1"
@@ -0,0 +1,59 @@
+from datetime import timedelta
+
+import pytest
+from httpx import AsyncClient
+
+from app.ratelimit import Limit, MemoryStore, RateLimitMiddleware
+from app.utils.tokens import get_token_service
+
+
+def test_limit_parse():
+    limit = Limit.parse("10/minute")
+    assert limit.capacity == 10
+    assert limit.rate == pytest.approx(10 / 60)
+
+
+@pytest.mark.asyncio
+async def test_memory_store_token_bucket(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr("app.ratelimit.time.monotonic", lambda: now[0])
+    store = MemoryStore()
+    limit = Limit(capacity=2, rate=1.0)
+
+    assert await store.acquire("ключ", limit) == 0
+    assert await store.acquire("ключ", limit) == 0
+    assert await store.acquire("ключ", limit) == pytest.approx(1.0)
+    assert await store.acquire("другой", limit) == 0
+
+    now[0] += 1.5
+    assert await store.acquire("ключ", limit) == 0
+    assert await store.acquire("ключ", limit) == pytest.approx(0.5)
+
+
+def test_identity_prefers_user_over_ip():
+    middleware = RateLimitMiddleware(app=None, store=MemoryStore())
+    scope = {"headers": [], "client": ("10.0.0.1", 1234)}
+    assert middleware._identity(scope) == "ip:10.0.0.1"
+
+    token = get_token_service().issue({"sub": "testuser"}, timedelta(minutes=5))
+    scope["headers"] = [(b"authorization", f"Bearer {token}".encode())]
+    assert middleware._identity(scope) == "user:testuser"
+
+    scope["headers"] = [(b"authorization", b"Bearer invalid")]
+    assert middleware._identity(scope) == "ip:10.0.0.1"
+
+
+@pytest.mark.asyncio
+async def test_login_is_rate_limited(client: AsyncClient):
+    user_data = {"username": "неизвестный", "password": "testpassword"}
+    for _ in range(10):
+        response = await client.post("/token", data=user_data)
+        assert response.status_code == 401
+
+    response = await client.post("/token", data=user_data)
+    assert response.status_code == 429
+    assert int(response.headers["Retry-After"]) >= 1
+
+    # Other routes have a budget of their own.
+    response = await client.get("/tasks/")
+    assert response.status_code == 401
@@ -0,0 +1,265 @@
+import time
+from datetime import timedelta
+from types import SimpleNamespace
+
+import jwt
+import pytest
+from httpx import AsyncClient
+from passlib.context import CryptContext
+from sqlalchemy.ext.asyncio import async_sessionmaker
+
+from app import crud
+from app.events import EventBus
+from app.resources import get_resources
+from app.settings import get_settings
+from app.utils.cache import TTLCache
+from app.utils.security import PasswordHasher, invalidate_principal
+from app.utils.tokens import TokenKey, TokenService
+
+
+@pytest.mark.asyncio
+async def test_password_hasher_hash_and_verify():
+    hasher = PasswordHasher(max_workers=2)
+    try:
+        hashed = await hasher.hash("testpassword")
+        assert await hasher.verify("testpassword", hashed)
+        assert not await hasher.verify("wrongpassword", hashed)
+        assert hasher.stats()["completed"] == 3
+        assert hasher.stats()["waiting"] == 0
+    finally:
+        hasher.shutdown()
+
+
+@pytest.mark.asyncio
+async def test_password_hasher_rehashes_outdated_cost():
+    old_context = CryptContext(schemes=["bcrypt"], deprecated="auto", bcrypt__rounds=4)
+    new_context = CryptContext(schemes=["bcrypt"], deprecated="auto", bcrypt__rounds=5)
+    old_hash = old_context.hash("testpassword")
+
+    hasher = PasswordHasher(max_workers=1, rounds=5)
+    try:
+        is_valid, new_hash = await hasher.verify_and_update("testpassword", old_hash)
+    finally:
+        hasher.shutdown()
+
+    assert is_valid
+    assert new_hash is not None
+    assert new_context.identify(new_hash) == "bcrypt"
+    assert not new_context.needs_update(new_hash)
+
+
+def test_ttl_cache_evicts_least_recently_used():
+    cache = TTLCache(maxsize=2, ttl=60)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    assert cache.get("a") == 1
+    cache.set("c", 3)
+
+    assert cache.get("b") is None
+    assert cache.get("a") == 1
+    assert cache.get("c") == 3
+
+
+def test_ttl_cache_expires_entries(monkeypatch):
+    now = 1000.0
+    monkeypatch.setattr(time, "monotonic", lambda: now)
+    cache = TTLCache(maxsize=10, ttl=5)
+    cache.set("a", 1)
+    cache.set("b", 2, ttl=30)
+
+    now += 10
+    assert cache.get("a") is None
+    assert cache.get("b") == 2
+
+
+@pytest.mark.asyncio
+async def test_principal_cache_is_filled_and_invalidated(
+    client: AsyncClient, create_user_and_get_token: str
+):
+    token = create_user_and_get_token
+    principal_cache = get_resources().principal_cache
+    principal_cache.clear()
+
+    response = await client.get("/tasks/", headers={"Authorization": f"Bearer {token}"})
+    assert response.status_code == 200
+    assert "testuser" in principal_cache
+
+    invalidate_principal("testuser")
+    assert "testuser" not in principal_cache
+
+
+def _ed25519_key(kid: str, with_private: bool = True) -> TokenKey:
+    ed25519 = pytest.importorskip("cryptography.hazmat.primitives.asymmetric.ed25519")
+    private_key = ed25519.Ed25519PrivateKey.generate()
+    return TokenKey(
+        kid, "EdDSA", private_key.public_key(), private_key if with_private else None
+    )
+
+
+def test_token_service_rotates_keys():
+    old_key = _ed25519_key("2024-01")
+    service = TokenService([old_key], "2024-01")
+    old_token = service.issue({"sub": "testuser"}, timedelta(minutes=5))
+
+    new_key = _ed25519_key("2024-02")
+    retired = TokenKey(old_key.kid, old_key.algorithm, old_key.verification_key)
+    service = TokenService([retired, new_key], "2024-02")
+    new_token = service.issue({"sub": "testuser"}, timedelta(minutes=5))
+
+    assert jwt.get_unverified_header(new_token)["kid"] == "2024-02"
+    assert service.verify(old_token)["sub"] == "testuser"
+    assert service.verify(new_token)["sub"] == "testuser"
+    assert [key["kid"] for key in service.jwks()["keys"]] == ["2024-01", "2024-02"]
+
+    unknown = TokenService([_ed25519_key("2024-03")], "2024-03")
+    with pytest.raises(jwt.InvalidTokenError):
+        unknown.verify(new_token)
+
+
+def test_token_service_caches_verified_tokens():
+    service = TokenService([TokenKey("default", "HS256", "секрет", "секрет")], "default")
+    token = service.issue({"sub": "testuser"}, timedelta(minutes=5))
+
+    assert service.verify(token) == service.verify(token)
+    assert service.verified.hits == 1
+    # Shared secrets must never be published.
+    assert service.jwks() == {"keys": []}
+
+    expired = service.issue({"sub": "testuser"}, timedelta(seconds=-1))
+    with pytest.raises(jwt.ExpiredSignatureError):
+        service.verify(expired)
+    assert expired not in service.verified
+
+
+@pytest.mark.asyncio
+async def test_legacy_tokens_without_kid_are_accepted(client: AsyncClient):
+    response = await client.post(
+        "/register", json={"username": "testuser", "password": "testpassword"}
+    )
+    assert response.status_code == 201
+    token = jwt.encode(
+        {"sub": "testuser", "exp": time.time() + 60},
+        get_settings().secret_key,
+        algorithm=get_settings().algorithm,
+    )
+    response = await client.get("/tasks/", headers={"Authorization": f"Bearer {token}"})
+    assert response.status_code == 200
+
+    response = await client.get("/.well-known/jwks.json")
+    assert response.json() == {"keys": []}
+
+
+@pytest.mark.asyncio
+async def test_refresh_token_rotation_and_reuse_detection(client: AsyncClient):
+    user_data = {"username": "testuser", "password": "testpassword"}
+    await client.post("/register", json=user_data)
+    response = await client.post("/token", data=user_data)
+    first = response.json()["refresh_token"]
+
+    response = await client.post("/token/refresh", json={"refresh_token": first})
+    assert response.status_code == 200
+    tokens = response.json()
+    assert tokens["refresh_token"] != first
+    headers = {"Authorization": f"Bearer {tokens['access_token']}"}
+    assert (await client.get("/tasks/", headers=headers)).status_code == 200
+
+    # Presenting a rotated token again revokes the whole session.
+    response = await client.post("/token/refresh", json={"refresh_token": first})
+    assert response.status_code == 401
+    response = await client.post(
+        "/token/refresh", json={"refresh_token": tokens["refresh_token"]}
+    )
+    assert response.status_code == 401
+    assert (await client.get("/tasks/", headers=headers)).status_code == 401
+
+
+@pytest.mark.asyncio
+async def test_refresh_token_revoke(client: AsyncClient):
+    user_data = {"username": "testuser", "password": "testpassword"}
+    await client.post("/register", json=user_data)
+    tokens = (await client.post("/token", data=user_data)).json()
+
+    response = await client.post(
+        "/token/revoke", json={"refresh_token": tokens["refresh_token"]}
+    )
+    assert response.status_code == 204
+    response = await client.post(
+        "/token/refresh", json={"refresh_token": tokens["refresh_token"]}
+    )
+    assert response.status_code == 401
+    response = await client.post("/token/refresh", json={"refresh_token": "неизвестный"})
+    assert response.status_code == 401
+    headers = {"Authorization": f"Bearer {tokens['access_token']}"}
+    assert (await client.get("/tasks/", headers=headers)).status_code == 401
+
+
+def test_revocations_reach_every_worker():
+    writer_bus, reader_bus = EventBus("postgres"), EventBus("postgres")
+    revoked = []
+    reader_bus.on_revoke(revoked.extend)
+
+    session = SimpleNamespace(info={})
+    writer_bus.stage_revocation(session, ["b", "a"])
+    # What the writer's commit NOTIFYs, as the reader's listener receives it.
+    for message in session.info["task_events"]:
+        reader_bus.deliver(message)
+
+    assert revoked == ["a", "b"]
+
+
+@pytest.mark.asyncio
+async def test_revoked_sessions_are_reloaded(client: AsyncClient, session, monkeypatch):
+    user_data = {"username": "testuser", "password": "testpassword"}
+    await client.post("/register", json=user_data)
+    revoked = (await client.post("/token", data=user_data)).json()
+    live = (await client.post("/token", data=user_data)).json()
+    live = (await client.post("/token/refresh", json={"refresh_token": live["refresh_token"]})).json()
+    await client.post("/token/revoke", json={"refresh_token": revoked["refresh_token"]})
+
+    # A worker that started, or whose event bus reconnected, after the revocation.
+    resources = get_resources()
+    resources.revoked_sessions.clear()
+    monkeypatch.setattr(resources, "session_factory", async_sessionmaker(session.bind))
+    await crud.reload_revoked_sessions(resources)
+
+    headers = {"Authorization": f"Bearer {revoked['access_token']}"}
+    assert (await client.get("/tasks/", headers=headers)).status_code == 401
+    headers = {"Authorization": f"Bearer {live['access_token']}"}
+    assert (await client.get("/tasks/", headers=headers)).status_code == 200
+
+
+@pytest.mark.asyncio
+async def test_users_listing_pagination_and_prefix(client: AsyncClient):
+    for username in ["анна", "антон", "борис", "ан%на"]:
+        response = await client.post(
+            "/register", json={"username": username, "password": "testpassword"}
+        )
+        assert response.status_code == 201
+
+    response = await client.get("/users", params={"limit": 2})
+    assert [user["username"] for user in response.json()] == ["ан%на", "анна"]
+    assert set(response.json()[0]) == {"id", "username"}
+    cursor = response.headers["X-Next-Cursor"]
+
+    response = await client.get("/users", params={"limit": 2, "after": cursor})
+    assert [user["username"] for user in response.json()] == ["антон", "борис"]
+    assert "X-Next-Cursor" not in response.headers
+
+    response = await client.get("/users", params={"prefix": "ан%"})
+    assert [user["username"] for user in response.json()] == ["ан%на"]
+    response = await client.get("/users", params={"prefix": "ан"})
+    assert len(response.json()) == 3
+
+    # Characters above U+FFFF, where a "\uffff" upper bound would stop.
+    response = await client.post(
+        "/register", json={"username": "ан\U0001F600", "password": "testpassword"}
+    )
+    assert response.status_code == 201
+    response = await client.get("/users", params={"prefix": "ан"})
+    assert len(response.json()) == 4
+
+    response = await client.get("/users/борис")
+    assert response.status_code == 200
+    assert response.json()["username"] == "борис"
+    response = await client.get("/users/никто")
+    assert response.status_code == 404
@@ -1,5 +1,12 @@
+import json
 import pytest
 from httpx import AsyncClient
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import async_sessionmaker
+
+from app import crud
+from app.models import TaskPermission
+from app.resources import get_resources
 
 
 @pytest.mark.asyncio
@@ -145,3 +152,324 @@ async def test_delete_task(
     )
 
     assert response.status_code == 404
+
+
+@pytest.mark.asyncio
+async def test_get_tasks_pagination(
+    client: AsyncClient,
+    create_user_and_get_token: str,
+):
+    token = create_user_and_get_token
+    headers = {"Authorization": f"Bearer {token}"}
+
+    for i in range(5):
+        response = await client.post(
+            "/tasks/",
+            json={"title": f"Задача {i}", "description": "Тестовая задача"},
+            headers=headers,
+        )
+        assert response.status_code == 201
+
+    response = await client.get("/tasks/", params={"limit": 2}, headers=headers)
+    assert response.status_code == 200
+    first_page = response.json()
+    assert len(first_page) == 2
+    cursor = response.headers["X-Next-Cursor"]
+    assert cursor == str(first_page[-1]["id"])
+
+    seen = [task["id"] for task in first_page]
+    while cursor:
+        response = await client.get(
+            "/tasks/", params={"limit": 2, "after": cursor}, headers=headers
+        )
+        assert response.status_code == 200
+        seen.extend(task["id"] for task in response.json())
+        cursor = response.headers.get("X-Next-Cursor")
+
+    assert len(seen) == 5
+    assert seen == sorted(seen)
+
+
+@pytest.mark.asyncio
+async def test_get_tasks_stream(
+    client: AsyncClient,
+    create_user_and_get_token: str,
+):
+    token = create_user_and_get_token
+    headers = {"Authorization": f"Bearer {token}"}
+
+    for i in range(3):
+        response = await client.post(
+            "/tasks/",
+            json={"title": f"Задача {i}", "description": "Тестовая задача"},
+            headers=headers,
+        )
+        assert response.status_code == 201
+
+    response = await client.get("/tasks/", params={"stream": True}, headers=headers)
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("application/x-ndjson")
+    lines = [json.loads(line) for line in response.text.splitlines()]
+    assert [task["title"] for task in lines] == ["Задача 0", "Задача 1", "Задача 2"]
+
+
+@pytest.mark.asyncio
+async def test_bulk_tasks(
+    client: AsyncClient,
+    create_user_and_get_token: str,
+):
+    token = create_user_and_get_token
+    headers = {"Authorization": f"Bearer {token}"}
+
+    response = await client.post(
+        "/tasks/bulk",
+        json=[
+            {"title": f"Задача {i}", "description": "Тестовая задача"}
+            for i in range(3)
+        ],
+        headers=headers,
+    )
+    assert response.status_code == 201
+    created = response.json()
+    assert [item["status"] for item in created] == [201, 201, 201]
+    assert [item["task"]["title"] for item in created] == [
+        "Задача 0",
+        "Задача 1",
+        "Задача 2",
+    ]
+    ids = [item["id"] for item in created]
+
+    response = await client.patch(
+        "/tasks/bulk",
+        json=[
+            {"id": ids[0], "title": "Обновили заголовок"},
+            {"id": ids[1], "description": "Обновили описание."},
+            {"id": 100500, "title": "Нет такой задачи"},
+        ],
+        headers=headers,
+    )
+    assert response.status_code == 200
+    updated = response.json()
+    assert [item["status"] for item in updated] == [200, 200, 404]
+    assert updated[0]["task"]["title"] == "Обновили заголовок"
+    assert updated[0]["task"]["description"] == "Тестовая задача"
+    assert updated[1]["task"]["description"] == "Обновили описание."
+
+    response = await client.request(
+        "DELETE",
+        "/tasks/bulk",
+        json={"ids": [ids[0], ids[1], 100500]},
+        headers=headers,
+    )
+    assert response.status_code == 200
+    assert [item["status"] for item in response.json()] == [204, 204, 404]
+
+    response = await client.get("/tasks/", headers=headers)
+    assert [task["id"] for task in response.json()] == [ids[2]]
+
+
+@pytest.mark.asyncio
+async def test_bulk_create_validates_whole_payload(
+    client: AsyncClient,
+    create_user_and_get_token: str,
+):
+    token = create_user_and_get_token
+    headers = {"Authorization": f"Bearer {token}"}
+
+    response = await client.post(
+        "/tasks/bulk",
+        json=[
+            {"title": "Задача", "description": "Тестовая задача"},
+            {"title": "Без описания"},
+        ],
+        headers=headers,
+    )
+    assert response.status_code == 422
+
+    response = await client.get("/tasks/", headers=headers)
+    assert response.json() == []
+
+
+@pytest.mark.asyncio
+async def test_search_tasks(
+    client: AsyncClient,
+    create_user_and_get_token: str,
+):
+    token = create_user_and_get_token
+    headers = {"Authorization": f"Bearer {token}"}
+
+    for title, description in [
+        ("Купить молоко", "Зайти в магазин после работы"),
+        ("Отчёт", "Подготовить отчёт для магазин"),
+        ("Позвонить маме", "Вечером"),
+    ]:
+        response = await client.post(
+            "/tasks/",
+            json={"title": title, "description": description},
+            headers=headers,
+        )
+        assert response.status_code == 201
+
+    response = await client.get("/tasks/search", params={"q": "магазин"}, headers=headers)
+    assert response.status_code == 200
+    assert {task["title"] for task in response.json()} == {"Купить молоко", "Отчёт"}
+
+    response = await client.get(
+        "/tasks/search", params={"q": 'молоко "магазин'}, headers=headers
+    )
+    assert response.status_code == 200
+    assert [task["title"] for task in response.json()] == ["Купить молоко"]
+
+    task_id = (
+        await client.get("/tasks/search", params={"q": "маме"}, headers=headers)
+    ).json()[0]["id"]
+    response = await client.patch(
+        f"/tasks/{task_id}", json={"title": "Позвонить папе"}, headers=headers
+    )
+    assert response.status_code == 200
+    response = await client.get("/tasks/search", params={"q": "маме"}, headers=headers)
+    assert response.json() == []
+    response = await client.get("/tasks/search", params={"q": "папе"}, headers=headers)
+    assert [task["id"] for task in response.json()] == [task_id]
+
+
+@pytest.mark.asyncio
+async def test_task_etags(
+    client: AsyncClient,
+    create_user_and_get_token: str,
+):
+    token = create_user_and_get_token
+    headers = {"Authorization": f"Bearer {token}"}
+
+    response = await client.post(
+        "/tasks/",
+        json={"title": "Это тест", "description": "Тестовая задача"},
+        headers=headers,
+    )
+    task_id = response.json()["id"]
+
+    response = await client.get(f"/tasks/{task_id}", headers=headers)
+    etag = response.headers["ETag"]
+    response = await client.get(
+        f"/tasks/{task_id}", headers={**headers, "If-None-Match": etag}
+    )
+    assert response.status_code == 304
+    assert response.content == b""
+
+    response = await client.get("/tasks/", headers=headers)
+    list_etag = response.headers["ETag"]
+    response = await client.get("/tasks/", headers={**headers, "If-None-Match": list_etag})
+    assert response.status_code == 304
+
+    response = await client.patch(
+        f"/tasks/{task_id}",
+        json={"title": "Обновили заголовок"},
+        headers={**headers, "If-Match": etag},
+    )
+    assert response.status_code == 200
+    new_etag = response.headers["ETag"]
+    assert new_etag != etag
+
+    response = await client.put(
+        f"/tasks/{task_id}",
+        json={"title": "Потерянное обновление", "description": "Тестовая задача"},
+        headers={**headers, "If-Match": etag},
+    )
+    assert response.status_code == 412
+
+    response = await client.get(
+        f"/tasks/{task_id}", headers={**headers, "If-None-Match": etag}
+    )
+    assert response.status_code == 200
+    assert response.json()["title"] == "Обновили заголовок"
+    assert response.headers["ETag"] == new_etag
+
+    response = await client.get("/tasks/", headers={**headers, "If-None-Match": list_etag})
+    assert response.status_code == 200
+
+
+@pytest.mark.asyncio
+async def test_get_tasks_fast_serialization_matches_schema(
+    client: AsyncClient,
+    create_user_and_get_token: str,
+):
+    token = create_user_and_get_token
+    headers = {"Authorization": f"Bearer {token}"}
+
+    response = await client.post(
+        "/tasks/",
+        json={"title": "Задача", "description": "Описание с \"кавычками\""},
+        headers=headers,
+    )
+    created = response.json()
+
+    response = await client.get("/tasks/", headers=headers)
+    assert response.status_code == 200
+    assert response.headers["content-type"] == "application/json"
+    assert response.json() == [created]
+
+    response = await client.get("/tasks/", params={"stream": True}, headers=headers)
+    assert [json.loads(line) for line in response.text.splitlines()] == [created]
+
+
+@pytest.mark.asyncio
+async def test_delete_all_tasks_in_background(
+    client: AsyncClient,
+    create_users_and_get_token: str,
+    session,
+    monkeypatch,
+):
+    headers = {"Authorization": f"Bearer {create_users_and_get_token}"}
+    task_ids = []
+    for i in range(5):
+        response = await client.post(
+            "/tasks/", json={"title": f"Задача {i}", "description": "Описание"}, headers=headers
+        )
+        task_ids.append(response.json()["id"])
+    response = await client.post(
+        f"/tasks/{task_ids[0]}/permissions",
+        json={"user_id": 2, "can_read": True, "can_update": False},
+        headers=headers,
+    )
+    assert response.status_code == 201
+
+    response = await client.delete("/tasks/", headers=headers)
+    assert response.status_code == 202
+    operation = response.json()
+    assert operation["kind"] == "delete_tasks"
+    assert operation["total"] == 5
+    assert operation["done"] == 0
+    assert response.headers["Location"] == f"/tasks/operations/{operation['id']}"
+
+    monkeypatch.setattr(crud, "TASK_DELETE_CHUNK_SIZE", 2)
+    job_queue = get_resources().job_queue
+    monkeypatch.setattr(
+        job_queue, "session_factory", async_sessionmaker(session.bind, expire_on_commit=False)
+    )
+    while await job_queue.run_pending(wait=True):
+        pass
+
+    response = await client.get(response.headers["Location"], headers=headers)
+    assert response.status_code == 200
+    assert response.json()["status"] == "done"
+    assert response.json()["done"] == 5
+
+    response = await client.get("/tasks/", headers=headers)
+    assert response.json() == []
+    # Permission rows went with their task through ON DELETE CASCADE.
+    assert await session.scalar(select(func.count(TaskPermission.id))) == 0
+
+    response = await client.post("/token", data={"username": "testuser2", "password": "testpassword2"})
+    other = {"Authorization": f"Bearer {response.json()['access_token']}"}
+    response = await client.get(f"/tasks/operations/{operation['id']}", headers=other)
+    assert response.status_code == 404
+
+
+@pytest.mark.asyncio
+async def test_tasks_pagination_contract_is_documented(client: AsyncClient):
+    response = await client.get("/openapi.json")
+    operation = response.json()["paths"]["/tasks/"]["get"]
+    assert "X-Next-Cursor" in operation["responses"]["200"]["headers"]
+    limit = next(p for p in operation["parameters"] if p["name"] == "limit")
+    assert limit["schema"]["default"] == 100
+    assert "X-Next-Cursor" in operation["description"]
@@ -0,0 +1,237 @@
+import itertools
+import json
+import math
+import time
+from collections import OrderedDict
+from typing import Any, Hashable
+
+from app.settings import Settings
+
+
+class TTLCache:
+    """Small in-process LRU cache whose entries also expire after a TTL."""
+
+    def __init__(self, maxsize: int = 1024, ttl: float = 60.0):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data: OrderedDict[Hashable, tuple[float, Any]] = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        item = self._data.get(key)
+        if item is None:
+            self.misses += 1
+            return default
+        expires_at, value = item
+        if expires_at <= time.monotonic():
+            del self._data[key]
+            self.misses += 1
+            return default
+        self._data.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def set(self, key: Hashable, value: Any, ttl: float | None = None) -> None:
+        ttl = self.ttl if ttl is None else ttl
+        if ttl <= 0 or self.maxsize <= 0:
+            return
+        self._data[key] = (time.monotonic() + ttl, value)
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+
+    def invalidate(self, key: Hashable) -> None:
+        self._data.pop(key, None)
+
+    def clear(self) -> None:
+        self._data.clear()
+
+    def __contains__(self, key: Hashable) -> bool:
+        return self.get(key, _MISSING) is not _MISSING
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+
+_MISSING = object()
+
+
+class MemoryBackend:
+    """Per-worker storage for GenerationalCache."""
+
+    def __init__(self, maxsize: int = 10_000):
+        self._data = TTLCache(maxsize=maxsize)
+        self._clock = itertools.count(1)
+
+    async def get_many(self, keys: list[str]) -> list[Any]:
+        return [self._data.get(key) for key in keys]
+
+    async def set_many(self, items: dict[str, Any], ttl: float) -> None:
+        for key, value in items.items():
+            self._data.set(key, value, ttl=ttl)
+
+    async def delete_many(self, keys: list[str]) -> None:
+        for key in keys:
+            self._data.invalidate(key)
+
+    async def next_generation(self) -> int:
+        return next(self._clock)
+
+    async def clear(self) -> None:
+        self._data.clear()
+
+
+class SharedBackend:
+    """GenerationalCache storage shared by all workers, on top of a client
+    with the redis.asyncio interface (``mget``, ``pipeline``, ``delete``,
+    ``incr``, ``scan_iter``). Values are stored as JSON."""
+
+    def __init__(self, client, prefix: str = "cache:"):
+        self.client = client
+        self.prefix = prefix
+
+    async def get_many(self, keys: list[str]) -> list[Any]:
+        values = await self.client.mget([self.prefix + key for key in keys])
+        return [None if value is None else json.loads(value) for value in values]
+
+    async def set_many(self, items: dict[str, Any], ttl: float) -> None:
+        if not items:
+            return
+        # One round trip however many keys are filled.
+        async with self.client.pipeline(transaction=False) as pipe:
+            for key, value in items.items():
+                pipe.set(self.prefix + key, json.dumps(value), ex=max(1, math.ceil(ttl)))
+            await pipe.execute()
+
+    async def delete_many(self, keys: list[str]) -> None:
+        if keys:
+            await self.client.delete(*[self.prefix + key for key in keys])
+
+    async def next_generation(self) -> int:
+        return await self.client.incr(self.prefix + "clock")
+
+    async def clear(self) -> None:
+        # The clock stays: generations must keep increasing.
+        clock = self.prefix + "clock"
+        keys = [
+            key
+            async for key in self.client.scan_iter(match=self.prefix + "*")
+            if key not in (clock, clock.encode())
+        ]
+        if keys:
+            await self.client.delete(*keys)
+
+
+class GenerationalCache:
+    """Read-through cache whose invalidation cannot be undone by a slow
+    reader.
+
+    With a ``bus`` (the EventBus), staged invalidations are also broadcast
+    to the other workers on commit, which is what keeps per-worker backends
+    coherent. Invalidations missed while the bus was disconnected cannot
+    be replayed, so the cache is cleared when it reconnects.
+
+    Every entry records the generation current when its value was read,
+    and a hit requires that generation to still be current. Invalidating a
+    key moves it to a fresh generation, so a value loaded before the write
+    committed but stored after the invalidation is never served.
+    """
+
+    _STAGED = "cache_invalidations"
+
+    def __init__(self, backend, ttl: float = 60.0, enabled: bool = True, bus=None):
+        self.backend = backend
+        self.ttl = ttl
+        self.enabled = enabled
+        self.bus = bus
+        self.hits = 0
+        self.misses = 0
+        if bus is not None:
+            bus.on_invalidate(self.invalidate)
+            bus.on_reconnect(self.clear)
+
+    async def get_many(self, keys: list[str]) -> dict[str, Any]:
+        """Current values of the cached ``keys``; missing ones are left out."""
+        if not self.enabled:
+            return {}
+        values = await self.backend.get_many(
+            [f"{key}:value" for key in keys] + [f"{key}:gen" for key in keys]
+        )
+        found = {}
+        for key, entry, generation in zip(keys, values, values[len(keys):]):
+            if entry is not None and generation is not None and entry[0] == generation:
+                found[key] = entry[1]
+        self.hits += len(found)
+        self.misses += len(keys) - len(found)
+        return found
+
+    async def reserve(self, keys: list[str]) -> dict[str, int]:
+        """Starts a generation for each key; call before loading the values
+        and pass the result to ``set_many``."""
+        if not self.enabled or not keys:
+            return {}
+        generations = {key: await self.backend.next_generation() for key in keys}
+        # Generations outlive their entries, so an expired generation can
+        # never make an old entry current again.
+        await self.backend.set_many(
+            {f"{key}:gen": generation for key, generation in generations.items()},
+            ttl=self.ttl * 2,
+        )
+        return generations
+
+    async def set_many(self, values: dict[str, Any], generations: dict[str, int]) -> None:
+        entries = {
+            f"{key}:value": [generations[key], value]
+            for key, value in values.items()
+            if key in generations
+        }
+        if entries:
+            await self.backend.set_many(entries, ttl=self.ttl)
+
+    async def invalidate(self, keys) -> None:
+        keys = list(keys)
+        if not self.enabled or not keys:
+            return
+        await self.reserve(keys)
+        await self.backend.delete_many([f"{key}:value" for key in keys])
+
+    def stage(self, session, keys) -> None:
+        """Records keys to invalidate once the session's transaction commits."""
+        keys = set(keys)
+        session.info.setdefault(self._STAGED, set()).update(keys)
+        if self.enabled and self.bus is not None:
+            self.bus.stage_invalidation(session, keys)
+
+    async def flush(self, session) -> None:
+        await self.invalidate(session.info.pop(self._STAGED, ()))
+
+    def stats(self) -> dict:
+        return {"enabled": self.enabled, "hits": self.hits, "misses": self.misses}
+
+    async def clear(self) -> None:
+        await self.backend.clear()
+
+
+def create_response_cache(settings: Settings, bus=None) -> GenerationalCache:
+    backend = settings.response_cache_backend
+    ttl = settings.response_cache_ttl
+    if backend == "memory":
+        store = MemoryBackend(maxsize=settings.response_cache_size)
+        if settings.events_backend == "postgres":
+            return GenerationalCache(store, ttl, bus=bus)
+        if settings.web_concurrency > 1:
+            # Nothing would tell the other workers about a write.
+            raise ValueError(
+                "RESPONSE_CACHE_BACKEND=memory with several workers needs "
+                "EVENTS_BACKEND=postgres; use RESPONSE_CACHE_BACKEND=redis or none"
+            )
+    elif backend == "redis":
+        import redis.asyncio as redis
+
+        store = SharedBackend(redis.from_url(settings.response_cache_redis_url))
+    elif backend == "none":
+        return GenerationalCache(MemoryBackend(maxsize=0), ttl, enabled=False)
+    else:
+        raise ValueError(f"Unknown response cache backend: {backend}")
+    return GenerationalCache(store, ttl)
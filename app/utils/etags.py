@@ -0,0 +1,43 @@
+import hashlib
+
+
+def task_etag(task) -> str:
+    return f'"{task.id}.{task.version}"'
+
+
+def collection_etag(items) -> str:
+    """Strong ETag for a list of versioned rows; changes whenever any row
+    is added, removed or updated."""
+    digest = hashlib.sha1()
+    for item in items:
+        digest.update(f"{item.id}.{item.version};".encode())
+    return f'"{digest.hexdigest()}"'
+
+
+def _parse(header: str) -> list[str]:
+    return [tag.strip() for tag in header.split(",") if tag.strip()]
+
+
+def etag_matches(if_none_match: str | None, etag: str) -> bool:
+    """If-None-Match check; uses weak comparison as RFC 9110 requires."""
+    if not if_none_match:
+        return False
+    tags = _parse(if_none_match)
+    return "*" in tags or etag in [tag.removeprefix("W/") for tag in tags]
+
+
+def expected_version(if_match: str, task_id: int) -> int | None:
+    """Version of ``task_id`` that an If-Match header asks for.
+
+    Returns None for "*"; raises ValueError when no listed tag can match.
+    """
+    tags = _parse(if_match)
+    if "*" in tags:
+        return None
+    for tag in tags:
+        # Weak tags never match under the strong comparison If-Match uses.
+        if tag.startswith('"') and tag.endswith('"'):
+            tag_task_id, _, version = tag[1:-1].partition(".")
+            if tag_task_id == str(task_id) and version.isdigit():
+                return int(version)
+    raise ValueError("If-Match does not match any version of the task")
@@ -1,9 +1,132 @@
-from passlib.context import CryptContext
+import asyncio
+import hashlib
+import os
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from datetime import datetime, timedelta
+from functools import cache
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+from app.resources import get_resources
+from app.settings import Settings
+
+BCRYPT_ROUNDS = Settings.bcrypt_rounds
+
+
+# Built on the first hash: loading passlib and the bcrypt backend is not
+# paid by processes that never check a password.
+@cache
+def get_pwd_context(rounds: int = BCRYPT_ROUNDS):
+    from passlib.context import CryptContext
+
+    return CryptContext(schemes=["bcrypt"], deprecated="auto", bcrypt__rounds=rounds)
 
 def verify_password(plain_password, hashed_password):
-    return pwd_context.verify(plain_password, hashed_password)
+    return get_pwd_context().verify(plain_password, hashed_password)
+
+def get_password_hash(password, rounds: int = BCRYPT_ROUNDS):
+    return get_pwd_context(rounds).hash(password)
+
+def verify_and_update_password(plain_password, hashed_password, rounds: int = BCRYPT_ROUNDS):
+    """Returns (is_valid, new_hash); new_hash is set when the stored hash
+    was made with outdated settings (e.g. a lower bcrypt cost)."""
+    return get_pwd_context(rounds).verify_and_update(plain_password, hashed_password)
+
+
+class PasswordHasher:
+    """Runs bcrypt in a worker pool so it never blocks the event loop.
+
+    At most ``max_concurrency`` hashes run at once; the rest wait in a queue
+    whose depth is reported by ``stats()``.
+    """
+
+    def __init__(
+        self,
+        executor: str = "thread",
+        max_workers: int | None = None,
+        max_concurrency: int | None = None,
+        rounds: int = BCRYPT_ROUNDS,
+    ):
+        if executor not in ("thread", "process"):
+            raise ValueError(f"Unknown password hash executor: {executor}")
+        self.executor_kind = executor
+        self.max_workers = max_workers or os.cpu_count() or 1
+        self.max_concurrency = max_concurrency or self.max_workers
+        self.rounds = rounds
+        self._executor: Executor | None = None
+        self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        self.waiting = 0
+        self.running = 0
+        self.completed = 0
+
+    def _get_executor(self) -> Executor:
+        if self._executor is None:
+            if self.executor_kind == "process":
+                self._executor = ProcessPoolExecutor(max_workers=self.max_workers)
+            else:
+                self._executor = ThreadPoolExecutor(
+                    max_workers=self.max_workers, thread_name_prefix="bcrypt"
+                )
+        return self._executor
+
+    async def _run(self, fn, *args):
+        self.waiting += 1
+        try:
+            await self._semaphore.acquire()
+        finally:
+            self.waiting -= 1
+        self.running += 1
+        try:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self._get_executor(), fn, *args)
+        finally:
+            self.running -= 1
+            self.completed += 1
+            self._semaphore.release()
+
+    async def hash(self, password: str) -> str:
+        return await self._run(get_password_hash, password, self.rounds)
+
+    async def verify(self, password: str, hashed_password: str) -> bool:
+        return await self._run(verify_password, password, hashed_password)
+
+    async def verify_and_update(
+        self, password: str, hashed_password: str
+    ) -> tuple[bool, str | None]:
+        return await self._run(
+            verify_and_update_password, password, hashed_password, self.rounds
+        )
+
+    def stats(self) -> dict:
+        return {
+            "executor": self.executor_kind,
+            "max_workers": self.max_workers,
+            "max_concurrency": self.max_concurrency,
+            "waiting": self.waiting,
+            "running": self.running,
+            "completed": self.completed,
+        }
+
+    def shutdown(self, wait: bool = True) -> None:
+        if self._executor is not None:
+            self._executor.shutdown(wait=wait)
+            self._executor = None
+
+
+def invalidate_principal(username: str) -> None:
+    """Must be called whenever a user row is changed or deleted."""
+    get_resources().principal_cache.invalidate(username)
+
+
+def hash_refresh_token(token: str) -> str:
+    # Refresh tokens are random and long, so a fast hash is enough.
+    return hashlib.sha256(token.encode()).hexdigest()
+
 
-def get_password_hash(password):
-    return pwd_context.hash(password)
\ No newline at end of file
+def live_session_cutoff(settings: Settings, now: datetime) -> datetime:
+    """Access tokens are only issued together with a refresh token, so a
+    session whose newest refresh token expires before this time has no
+    access token left that is still valid."""
+    return (
+        now
+        + timedelta(days=settings.refresh_token_expire_days)
+        - timedelta(minutes=settings.access_token_expire_minutes)
+    )
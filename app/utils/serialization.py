@@ -0,0 +1,29 @@
+from typing_extensions import TypedDict
+
+from pydantic import TypeAdapter
+
+
+class TaskRow(TypedDict):
+    """Wire shape of schemas.Task for rows selected column by column.
+
+    Rows come straight from the database, so they are serialized without
+    being validated first; keys not listed here (e.g. version) are dropped.
+    """
+
+    id: int
+    title: str
+    description: str
+    owner_id: int
+
+
+# Building an adapter compiles its serializer, so build each one once.
+task_row_adapter = TypeAdapter(TaskRow)
+task_rows_adapter = TypeAdapter(list[TaskRow])
+
+
+def dump_task_rows(rows) -> bytes:
+    return task_rows_adapter.dump_json([row._asdict() for row in rows])
+
+
+def dump_task_row(row) -> bytes:
+    return task_row_adapter.dump_json(row._asdict())
@@ -0,0 +1,136 @@
+import json
+import time
+from dataclasses import dataclass
+from datetime import datetime, timedelta, timezone
+from typing import Any
+
+import jwt
+from jwt.algorithms import get_default_algorithms
+
+from app.resources import get_resources
+from app.settings import Settings
+
+from .cache import TTLCache
+
+LEGACY_KID = "default"
+ASYMMETRIC_ALGORITHMS = {"EdDSA", "ES256", "ES384", "ES512", "RS256", "PS256"}
+
+
+@dataclass(frozen=True)
+class TokenKey:
+    """One signing key. Retired keys keep only ``verification_key`` so the
+    tokens they signed stay valid until they expire."""
+
+    kid: str
+    algorithm: str
+    verification_key: Any
+    signing_key: Any = None
+
+    @property
+    def asymmetric(self) -> bool:
+        return self.algorithm in ASYMMETRIC_ALGORITHMS
+
+
+class TokenService:
+    """Issues and verifies access tokens.
+
+    Tokens carry the ``kid`` of the key that signed them, so several keys can
+    be accepted at once while a new one is rolled out. Verified tokens are
+    remembered until they expire, so hot clients skip the signature check.
+    """
+
+    def __init__(self, keys: list[TokenKey], active_kid: str, cache_size: int = 10_000):
+        self.keys = {key.kid: key for key in keys}
+        if active_kid not in self.keys or self.keys[active_kid].signing_key is None:
+            raise ValueError(f"No signing key with kid {active_kid!r}")
+        self.active_kid = active_kid
+        self.verified = TTLCache(maxsize=cache_size, ttl=0)
+        self._algorithms = get_default_algorithms()
+
+    @property
+    def active_key(self) -> TokenKey:
+        return self.keys[self.active_kid]
+
+    def issue(self, claims: dict, expires_delta: timedelta) -> str:
+        key = self.active_key
+        payload = {**claims, "exp": datetime.now(timezone.utc) + expires_delta}
+        return jwt.encode(
+            payload, key.signing_key, algorithm=key.algorithm, headers={"kid": key.kid}
+        )
+
+    def verify(self, token: str) -> dict:
+        """Returns the claims of a valid token; raises jwt.InvalidTokenError."""
+        payload = self.verified.get(token)
+        if payload is not None:
+            return payload
+
+        # Tokens issued before rotation was introduced carry no kid; they
+        # were signed with what is now the "default" key.
+        kid = jwt.get_unverified_header(token).get("kid", LEGACY_KID)
+        key = self.keys.get(kid)
+        if key is None:
+            raise jwt.InvalidTokenError(f"Unknown signing key {kid!r}")
+        payload = jwt.decode(
+            token,
+            key.verification_key,
+            algorithms=[key.algorithm],
+            options={"require": ["exp"]},
+        )
+        self.verified.set(token, payload, ttl=payload["exp"] - time.time())
+        return payload
+
+    def jwks(self) -> dict:
+        """Public keys as a JSON Web Key Set; shared secrets are never listed."""
+        keys = []
+        for key in self.keys.values():
+            if not key.asymmetric:
+                continue
+            jwk = self._algorithms[key.algorithm].to_jwk(key.verification_key, as_dict=True)
+            keys.append({**jwk, "kid": key.kid, "alg": key.algorithm, "use": "sig"})
+        return {"keys": keys}
+
+
+def _read(path: str) -> str:
+    with open(path) as f:
+        return f.read()
+
+
+def load_keys(config: dict) -> list[TokenKey]:
+    """Builds keys from ``{"kid", "alg", "secret"}`` entries for HMAC, or
+    ``{"kid", "alg", "private_key_file", "public_key_file"}`` for asymmetric
+    algorithms; a key without a private part can only verify."""
+    algorithms = get_default_algorithms()
+    keys = []
+    for entry in config["keys"]:
+        algorithm = algorithms[entry["alg"]]
+        if "secret" in entry:
+            secret = algorithm.prepare_key(entry["secret"])
+            keys.append(TokenKey(entry["kid"], entry["alg"], secret, secret))
+            continue
+        private_key = (
+            algorithm.prepare_key(_read(entry["private_key_file"]))
+            if entry.get("private_key_file")
+            else None
+        )
+        if entry.get("public_key_file"):
+            public_key = algorithm.prepare_key(_read(entry["public_key_file"]))
+        else:
+            public_key = private_key.public_key()
+        keys.append(TokenKey(entry["kid"], entry["alg"], public_key, private_key))
+    return keys
+
+
+def create_token_service(settings: Settings) -> TokenService:
+    cache_size = settings.token_cache_size
+    if settings.jwt_keys_file:
+        config = json.loads(_read(settings.jwt_keys_file))
+        return TokenService(load_keys(config), config["active"], cache_size)
+    # Single shared secret, as configured before key rotation existed.
+    secret = settings.secret_key
+    key = TokenKey(LEGACY_KID, settings.algorithm, secret, secret)
+    return TokenService([key], LEGACY_KID, cache_size)
+
+
+def get_token_service() -> TokenService:
+    """The current app's service; key files are read on first use."""
+    return get_resources().token_service
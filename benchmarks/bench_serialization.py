@@ -0,0 +1,90 @@
+"""Per-item cost of serializing a large GET /tasks page.
+
+Compares the original path (ORM objects -> response_model validation with
+from_attributes -> jsonable_encoder -> json.dumps) with the fast path
+(column rows -> cached TypeAdapter -> JSON bytes).
+
+    python -m benchmarks.bench_serialization [--items 50000] [--repeat 5]
+"""
+import argparse
+import asyncio
+import json
+import os
+import time
+
+os.environ.setdefault("DATABASE_URL", "sqlite+aiosqlite://")
+os.environ.setdefault("SECRET_KEY", "benchmark")
+os.environ.setdefault("ALGORITHM", "HS256")
+
+from fastapi.encoders import jsonable_encoder
+from pydantic import TypeAdapter
+from sqlalchemy import insert
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+
+from app import crud, schemas
+from app.models import Base, Task, User
+from app.utils.serialization import dump_task_rows
+
+tasks_adapter = TypeAdapter(list[schemas.Task])
+
+
+def old_path(tasks) -> bytes:
+    validated = tasks_adapter.validate_python(tasks, from_attributes=True)
+    content = jsonable_encoder(tasks_adapter.dump_python(validated, mode="json"))
+    return json.dumps(content, ensure_ascii=False, separators=(",", ":")).encode()
+
+
+def new_path(rows) -> bytes:
+    return dump_task_rows(rows)
+
+
+async def timed(fn, repeat: int) -> tuple[float, bytes]:
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        body = await fn()
+        best = min(best, time.perf_counter() - start)
+    return best, body
+
+
+async def main(items: int, repeat: int) -> None:
+    engine = create_async_engine("sqlite+aiosqlite://")
+    Session = async_sessionmaker(engine, expire_on_commit=False)
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    async with Session() as session:
+        await session.execute(insert(User), [{"username": "bench", "hashed_password": "-"}])
+        await session.execute(
+            insert(Task),
+            [
+                {"title": f"Задача {i}", "description": f"Описание задачи {i}", "owner_id": 1}
+                for i in range(items)
+            ],
+        )
+        await session.commit()
+
+    async def old():
+        async with Session() as session:
+            return old_path(await crud.get_tasks(session, user_id=1, limit=items))
+
+    async def new():
+        async with Session() as session:
+            return new_path(await crud.get_task_rows(session, user_id=1, limit=items))
+
+    old_time, old_body = await timed(old, repeat)
+    new_time, new_body = await timed(new, repeat)
+    assert json.loads(old_body) == json.loads(new_body)
+
+    print(f"{items} tasks, best of {repeat} (query + serialization)")
+    for name, elapsed in (("orm + response_model", old_time), ("rows + TypeAdapter", new_time)):
+        print(f"  {name:<22} {elapsed * 1000:8.1f} ms  {elapsed / items * 1e6:6.2f} us/item")
+    print(f"  speedup                {old_time / new_time:8.2f}x")
+    await engine.dispose()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--items", type=int, default=50_000)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+    asyncio.run(main(args.items, args.repeat))
@@ -0,0 +1,128 @@
+"""Cold-start cost of a worker: importing app.main, building the app,
+running its startup, and the first requests served after it.
+
+Every run is a fresh interpreter, so nothing is warm in sys.modules; the
+median of the runs is reported per phase.
+
+    python -m benchmarks.bench_startup [--runs 10] [--output startup.json]
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+PASSWORD = "benchpassword"
+PHASES = ("import_ms", "create_app_ms", "startup_ms", "first_login_ms", "first_tasks_ms")
+
+CHILD = """
+import asyncio, json, time
+
+import httpx
+
+start = time.perf_counter()
+import app.main
+imported = time.perf_counter()
+# Trees without the app factory only have the module-level app.
+factory = getattr(app.main, "create_app", None)
+application = factory() if factory else app.main.app
+created = time.perf_counter()
+
+
+async def requests():
+    timings = {}
+    starting = time.perf_counter()
+    async with application.router.lifespan_context(application):
+        started = time.perf_counter()
+        timings["startup_ms"] = started - starting
+        async with httpx.AsyncClient(
+            transport=httpx.ASGITransport(app=application), base_url="http://bench"
+        ) as client:
+            response = await client.post("/token", data={"username": "bench", "password": %(password)r})
+            response.raise_for_status()
+            logged_in = time.perf_counter()
+            timings["first_login_ms"] = logged_in - started
+            headers = {"Authorization": "Bearer " + response.json()["access_token"]}
+            (await client.get("/tasks/", headers=headers)).raise_for_status()
+            timings["first_tasks_ms"] = time.perf_counter() - logged_in
+    return timings
+
+
+timings = {"import_ms": imported - start, "create_app_ms": created - imported}
+timings.update(asyncio.run(requests()))
+print(json.dumps({key: round(value * 1000, 2) for key, value in timings.items()}))
+"""
+
+
+def seed(url: str) -> None:
+    """Creates the schema, stamped at the migration head, and one user."""
+    code = f"""
+import asyncio
+from alembic.runtime.migration import MigrationContext
+from alembic.script import ScriptDirectory
+from app import database
+from app.models import Base, User
+from app.settings import get_settings
+from app.utils.security import get_password_hash
+
+async def main():
+    engine = database.create_engine({url!r})
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+        await conn.run_sync(
+            lambda sync_conn: MigrationContext.configure(sync_conn).stamp(
+                ScriptDirectory(str(database.ALEMBIC_DIR)), "head"
+            )
+        )
+        await conn.execute(
+            User.__table__.insert(),
+            {{"username": "bench", "hashed_password": get_password_hash({PASSWORD!r}, get_settings().bcrypt_rounds)}},
+        )
+    await engine.dispose()
+
+asyncio.run(main())
+"""
+    subprocess.run([sys.executable, "-c", code], check=True)
+
+
+def run_once() -> dict:
+    result = subprocess.run(
+        [sys.executable, "-c", CHILD % {"password": PASSWORD}],
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def main(argv=None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--runs", type=int, default=10)
+    parser.add_argument("--output", help="write the medians and every run as JSON")
+    args = parser.parse_args(argv)
+
+    with tempfile.TemporaryDirectory() as directory:
+        os.environ.update(
+            DATABASE_URL=f"sqlite+aiosqlite:///{directory}/startup.db",
+            SECRET_KEY=os.environ.get("SECRET_KEY") or "benchmark",
+            ALGORITHM=os.environ.get("ALGORITHM") or "HS256",
+            ACCESS_TOKEN_EXPIRE_MINUTES=os.environ.get("ACCESS_TOKEN_EXPIRE_MINUTES") or "30",
+            # A cheap hash, so the first login measures start-up and not bcrypt.
+            BCRYPT_ROUNDS="4",
+        )
+        seed(os.environ["DATABASE_URL"])
+        runs = [run_once() for _ in range(args.runs)]
+
+    medians = {phase: round(statistics.median(run[phase] for run in runs), 2) for phase in PHASES}
+    medians["total_ms"] = round(sum(medians.values()), 2)
+    for phase, value in medians.items():
+        print(f"{phase:<16} {value:>9.2f}")
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({"median": medians, "runs": runs}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
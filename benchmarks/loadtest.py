@@ -0,0 +1,393 @@
+"""Load test for the API: seeds a database, drives the main endpoints and
+reports req/s and latency percentiles per endpoint as JSON.
+
+In-process, against the real ``app`` through httpx's ASGI transport:
+
+    python -m benchmarks.loadtest --users 50 --tasks 20000 --permissions 5000 \\
+        --output results.json
+
+Against a running server (seed the database that server uses, and start
+the server with RATE_LIMIT_ENABLED=false):
+
+    DATABASE_URL=postgresql+asyncpg://... python -m benchmarks.loadtest \\
+        --base-url http://localhost:8000 --output results.json
+
+Seeding refuses a database that already holds users or tasks; --reset
+wipes it first (it downgrades every migration), --no-seed reuses the data.
+
+Compare with an earlier run:
+
+    python -m benchmarks.loadtest --compare baseline.json --output results.json
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import statistics
+import subprocess
+import time
+from collections import defaultdict
+from datetime import datetime, timezone
+
+os.environ.setdefault("DATABASE_URL", "sqlite+aiosqlite:///./bench.db")
+os.environ.setdefault("SECRET_KEY", "benchmark")
+os.environ.setdefault("ALGORITHM", "HS256")
+os.environ.setdefault("ACCESS_TOKEN_EXPIRE_MINUTES", "60")
+# The load is the point: the /token budget alone would turn it into 429s.
+os.environ.setdefault("RATE_LIMIT_ENABLED", "false")
+
+import httpx
+from sqlalchemy import inspect, insert, select
+
+from alembic import command
+from alembic.config import Config
+
+from app.database import ALEMBIC_DIR, SessionLocal, engine
+from app.models import Base, Task, TaskPermission, User
+from app.settings import get_settings
+from app.utils.security import get_password_hash
+
+PASSWORD = "benchpassword"
+CHUNK_SIZE = 5000
+
+
+def _chunks(rows: list[dict], size: int = CHUNK_SIZE):
+    for start in range(0, len(rows), size):
+        yield rows[start:start + size]
+
+
+def alembic_config() -> Config:
+    config = Config()
+    config.set_main_option("script_location", str(ALEMBIC_DIR))
+    config.set_main_option("sqlalchemy.url", engine.url.render_as_string(hide_password=False))
+    return config
+
+
+async def has_data() -> bool:
+    def check(sync_conn) -> bool:
+        tables = inspect(sync_conn).get_table_names()
+        return any(
+            sync_conn.execute(select(model.id).limit(1)).first() is not None
+            for model in (User, Task)
+            if model.__tablename__ in tables
+        )
+
+    async with engine.connect() as conn:
+        return await conn.run_sync(check)
+
+
+async def prepare_schema(reset: bool) -> None:
+    """Brings the database to the migration head, the way a deployment
+    does. Refuses a database that already holds users or tasks unless
+    ``reset``, which wipes it first."""
+    if not reset and await has_data():
+        raise SystemExit(
+            f"{engine.url.render_as_string(hide_password=True)} already holds users "
+            "or tasks; pass --reset to wipe it or --no-seed to reuse them"
+        )
+    config = alembic_config()
+    # alembic runs its own event loop, so it gets a thread of its own.
+    if reset:
+        async with engine.connect() as conn:
+            migrated = await conn.run_sync(
+                lambda sync_conn: inspect(sync_conn).has_table("alembic_version")
+            )
+        if migrated:
+            await asyncio.to_thread(command.downgrade, config, "base")
+        else:
+            async with engine.begin() as conn:
+                await conn.run_sync(Base.metadata.drop_all)
+    await asyncio.to_thread(command.upgrade, config, "head")
+
+
+async def seed(
+    users: int, tasks: int, permissions: int, rng: random.Random, reset: bool = False
+) -> dict:
+    """Migrates the schema and bulk-loads users, tasks and permission rows.
+
+    Returns the task ids owned by each user id, which the scenarios need.
+    """
+    await prepare_schema(reset)
+
+    # One bcrypt hash for everybody: hashing N passwords would dominate seeding.
+    hashed_password = get_password_hash(PASSWORD, get_settings().bcrypt_rounds)
+    async with SessionLocal() as session:
+        await session.execute(
+            insert(User),
+            [
+                {"username": f"bench{i}", "hashed_password": hashed_password}
+                for i in range(users)
+            ],
+        )
+        user_ids = (await session.scalars(select(User.id).order_by(User.id))).all()
+        for chunk in _chunks(
+            [
+                {
+                    "title": f"Задача {i}",
+                    "description": f"Описание задачи {i}",
+                    "owner_id": user_ids[i % users],
+                }
+                for i in range(tasks)
+            ]
+        ):
+            await session.execute(insert(Task), chunk)
+        owned = defaultdict(list)
+        for task_id, owner_id in await session.execute(select(Task.id, Task.owner_id)):
+            owned[owner_id].append(task_id)
+
+        task_owners = [(task_id, owner) for owner, ids in owned.items() for task_id in ids]
+        pairs = set()
+        while len(pairs) < min(permissions, len(task_owners) * (users - 1)):
+            task_id, owner_id = rng.choice(task_owners)
+            user_id = rng.choice(user_ids)
+            if user_id != owner_id:
+                pairs.add((task_id, user_id))
+        for chunk in _chunks(
+            [
+                {"task_id": task_id, "user_id": user_id, "can_read": True, "can_update": rng.random() < 0.5}
+                for task_id, user_id in sorted(pairs)
+            ]
+        ):
+            await session.execute(insert(TaskPermission), chunk)
+        await session.commit()
+    return {"user_ids": list(user_ids), "owned": dict(owned)}
+
+
+async def login(client: httpx.AsyncClient, username: str) -> httpx.Response:
+    return await client.post("/token", data={"username": username, "password": PASSWORD})
+
+
+async def run_scenario(name, make_request, requests: int, concurrency: int) -> dict:
+    latencies: list[float] = []
+    errors = 0
+    counter = iter(range(requests))
+
+    async def worker():
+        nonlocal errors
+        for i in counter:
+            start = time.perf_counter()
+            try:
+                response = await make_request(i)
+                ok = response.status_code < 400
+            except httpx.HTTPError:
+                ok = False
+            latencies.append(time.perf_counter() - start)
+            if not ok:
+                errors += 1
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - start
+    return summarize(name, latencies, errors, elapsed)
+
+
+def percentile(sorted_values: list[float], q: float) -> float:
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, max(0, round(q / 100 * len(sorted_values)) - 1))
+    return sorted_values[index]
+
+
+def summarize(name: str, latencies: list[float], errors: int, elapsed: float) -> dict:
+    values = sorted(latencies)
+    ms = 1000
+    result = {
+        "endpoint": name,
+        "requests": len(values),
+        "errors": errors,
+        "seconds": round(elapsed, 3),
+        "rps": round(len(values) / elapsed, 1) if elapsed else 0.0,
+        "mean_ms": round(statistics.fmean(values) * ms, 2) if values else 0.0,
+    }
+    for q in (50, 95, 99):
+        result[f"p{q}_ms"] = round(percentile(values, q) * ms, 2)
+    result["max_ms"] = round(values[-1] * ms, 2) if values else 0.0
+    return result
+
+
+async def run(args, data: dict) -> list[dict]:
+    rng = random.Random(args.seed)
+    if args.base_url:
+        client = httpx.AsyncClient(base_url=args.base_url, timeout=args.timeout)
+    else:
+        from app.main import app
+
+        client = httpx.AsyncClient(
+            transport=httpx.ASGITransport(app=app), base_url="http://bench", timeout=args.timeout
+        )
+
+    user_ids = data["user_ids"]
+    owners = [user_id for user_id in user_ids if data["owned"].get(user_id)]
+    usernames = {user_id: f"bench{index}" for index, user_id in enumerate(user_ids)}
+    results = []
+    async with client:
+        results.append(
+            await run_scenario(
+                "POST /token",
+                lambda i: login(client, usernames[rng.choice(user_ids)]),
+                args.login_requests,
+                args.concurrency,
+            )
+        )
+
+        headers = {}
+        for user_id in owners:
+            response = await login(client, usernames[user_id])
+            response.raise_for_status()
+            headers[user_id] = {"Authorization": f"Bearer {response.json()['access_token']}"}
+
+        results.append(
+            await run_scenario(
+                "GET /tasks/",
+                lambda i: client.get(
+                    "/tasks/",
+                    params={"limit": args.page_size},
+                    headers=headers[rng.choice(owners)],
+                ),
+                args.requests,
+                args.concurrency,
+            )
+        )
+
+        def patch(i):
+            user_id = rng.choice(owners)
+            task_id = rng.choice(data["owned"][user_id])
+            return client.patch(
+                f"/tasks/{task_id}",
+                json={"title": f"Задача {task_id} ({i})"},
+                headers=headers[user_id],
+            )
+
+        results.append(
+            await run_scenario("PATCH /tasks/{id}", patch, args.requests, args.concurrency)
+        )
+
+        def grant(i):
+            user_id = rng.choice(owners)
+            task_id = rng.choice(data["owned"][user_id])
+            grantee = rng.choice(user_ids)
+            if grantee == user_id:
+                grantee = user_ids[(user_ids.index(user_id) + 1) % len(user_ids)]
+            return client.post(
+                f"/tasks/{task_id}/permissions/bulk",
+                json={"grants": [{"user_id": grantee, "can_read": True, "can_update": False}]},
+                headers=headers[user_id],
+            )
+
+        results.append(
+            await run_scenario(
+                "POST /tasks/{id}/permissions/bulk", grant, args.requests, args.concurrency
+            )
+        )
+    return results
+
+
+def git_commit() -> str | None:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(results: list[dict], baseline_path: str) -> None:
+    with open(baseline_path) as f:
+        baseline = {item["endpoint"]: item for item in json.load(f)["results"]}
+    print(f"\nvs {baseline_path}")
+    for item in results:
+        before = baseline.get(item["endpoint"])
+        if before is None:
+            continue
+        deltas = []
+        for key in ("rps", "p50_ms", "p95_ms", "p99_ms"):
+            if before[key]:
+                deltas.append(f"{key} {(item[key] - before[key]) / before[key] * 100:+.1f}%")
+        print(f"  {item['endpoint']:<36} " + "  ".join(deltas))
+
+
+def print_table(results: list[dict]) -> None:
+    print(f"{'endpoint':<36} {'req/s':>8} {'p50':>8} {'p95':>8} {'p99':>8} {'errors':>7}")
+    for item in results:
+        print(
+            f"{item['endpoint']:<36} {item['rps']:>8} {item['p50_ms']:>8} "
+            f"{item['p95_ms']:>8} {item['p99_ms']:>8} {item['errors']:>7}"
+        )
+
+
+async def main(args) -> None:
+    if args.no_seed:
+        async with SessionLocal() as session:
+            owned = defaultdict(list)
+            for task_id, owner_id in await session.execute(select(Task.id, Task.owner_id)):
+                owned[owner_id].append(task_id)
+            user_ids = (
+                await session.scalars(
+                    select(User.id).where(User.username.like("bench%")).order_by(User.id)
+                )
+            ).all()
+        data = {"user_ids": list(user_ids), "owned": dict(owned)}
+        seed_seconds = None
+    else:
+        start = time.perf_counter()
+        data = await seed(
+            args.users, args.tasks, args.permissions, random.Random(args.seed), reset=args.reset
+        )
+        seed_seconds = round(time.perf_counter() - start, 3)
+        print(f"seeded {args.users} users, {args.tasks} tasks, {args.permissions} permissions in {seed_seconds}s")
+
+    results = await run(args, data)
+    await engine.dispose()
+
+    print_table(results)
+    report = {
+        "meta": {
+            "commit": git_commit(),
+            "timestamp": datetime.now(timezone.utc).isoformat(),
+            "target": args.base_url or "in-process",
+            "database": engine.url.render_as_string(hide_password=True),
+            "python": platform.python_version(),
+            "seed_seconds": seed_seconds,
+            "config": {
+                "users": len(data["user_ids"]),
+                "tasks": sum(len(ids) for ids in data["owned"].values()),
+                **{
+                    key: getattr(args, key)
+                    for key in ("requests", "login_requests", "concurrency", "page_size", "seed")
+                },
+            },
+        },
+        "results": results,
+    }
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2, ensure_ascii=False)
+    if args.compare:
+        compare(results, args.compare)
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--base-url", help="running server to target; in-process when omitted")
+    parser.add_argument("--users", type=int, default=20)
+    parser.add_argument("--tasks", type=int, default=10_000)
+    parser.add_argument("--permissions", type=int, default=2_000)
+    parser.add_argument("--requests", type=int, default=500, help="requests per endpoint")
+    parser.add_argument("--login-requests", type=int, default=50, help="POST /token is bcrypt-bound")
+    parser.add_argument("--concurrency", type=int, default=10)
+    parser.add_argument("--page-size", type=int, default=100)
+    parser.add_argument("--timeout", type=float, default=30.0)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--no-seed", action="store_true", help="reuse previously seeded data")
+    parser.add_argument(
+        "--reset", action="store_true", help="wipe a database that already holds data before seeding"
+    )
+    parser.add_argument("--output", help="write results as JSON to this file")
+    parser.add_argument("--compare", help="earlier JSON results to diff against")
+    return parser.parse_args(argv)
+
+
+if __name__ == "__main__":
+    asyncio.run(main(parse_args()))